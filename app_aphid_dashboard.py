@@ -1,14 +1,28 @@
 from __future__ import annotations
 
+import csv
 import json
+import math
 import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 import cv2
 import gradio as gr
+import numpy as np
+import pandas as pd
+import torch
 from ultralytics import YOLO
+from ultralytics.engine.results import Results
 
 
 # Avoid localhost proxy hijacking in some Windows setups.
@@ -20,6 +34,25 @@ os.environ.pop("http_proxy", None)
 os.environ.pop("https_proxy", None)
 
 BASE_DIR = Path(__file__).resolve().parent
+TILE_MAX_TILES = 32
+TILE_MATCH_THRESHOLD = 0.5
+MODEL_CACHE_SIZE = int(os.getenv("DASHBOARD_MODEL_CACHE_SIZE", "3"))
+# Evict cached GPU models before loading another one while less than this
+# fraction of GPU memory is free.
+MODEL_CACHE_MIN_FREE_GPU = float(os.getenv("DASHBOARD_MIN_FREE_GPU", "0.2"))
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm"}
+BATCH_EXPORT_DIR = BASE_DIR / "batch_exports"
+BATCH_SAMPLES_KEPT = 12
+BATCH_PLOT_POINTS = 2000
+RUN_INDEX_NAME = ".run_index.sqlite"
+# Seconds a run index scan stays fresh; "Refresh Runs" always rescans.
+RUN_INDEX_TTL = float(os.getenv("DASHBOARD_RUN_INDEX_TTL", "10"))
+RUN_TABLE_METRICS = 8
+METRIC_PLOT_POINTS = 400
+METRIC_POLL_SECONDS = 5.0
+METRIC_DEFAULTS = ("metrics/mAP50-95(B)", "metrics/mAP50(B)", "train/box_loss", "val/box_loss")
+RUN_FILTER_TERM = re.compile(r"^(.+?)(>=|<=|==|>|<)(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)$")
 
 
 def _read_text_if_exists(path: Path) -> str:
@@ -31,23 +64,231 @@ def _read_text_if_exists(path: Path) -> str:
         return path.read_text(encoding="latin-1", errors="replace")
 
 
+def _list_dir(path: Path) -> tuple[list[str], list[str]]:
+    dirs: list[str] = []
+    files: list[str] = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    (dirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return sorted(dirs), sorted(files)
+
+
+def _numeric_leaves(payload: Any, prefix: str = "") -> dict[str, float]:
+    if isinstance(payload, bool):
+        return {}
+    if isinstance(payload, (int, float)):
+        return {prefix: float(payload)} if prefix and math.isfinite(payload) else {}
+    if isinstance(payload, dict):
+        out: dict[str, float] = {}
+        for key, value in payload.items():
+            out.update(_numeric_leaves(value, f"{prefix}.{key}" if prefix else str(key)))
+        return out
+    return {}
+
+
+def _stat_mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+@dataclass
+class RunRecord:
+    path: Path
+    mtime: float
+    best_mtime: float | None
+    last_mtime: float | None
+    metrics: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def best_pt(self) -> Path | None:
+        return self.path / "weights" / "best.pt" if self.best_mtime is not None else None
+
+    @property
+    def last_pt(self) -> Path | None:
+        return self.path / "weights" / "last.pt" if self.last_mtime is not None else None
+
+
+class RunIndex:
+    # Persistent catalog of runs/**/weights/{best,last}.pt. A rescan stats every
+    # directory but only re-lists those whose mtime changed, and re-parses
+    # results_summary.json only when the file itself changed.
+
+    def __init__(self, root: Path, ttl: float) -> None:
+        self.root = root
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._scanned_at: float | None = None
+        self._db = self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        db_path = ":memory:"
+        if self.root.is_dir() and os.access(self.root, os.W_OK):
+            db_path = str(self.root / RUN_INDEX_NAME)
+        try:
+            return self._connect(db_path)
+        except sqlite3.DatabaseError:
+            # The index is only a cache of the tree, so a broken file is dropped.
+            if db_path != ":memory:":
+                for suffix in ("", "-wal", "-shm"):
+                    Path(db_path + suffix).unlink(missing_ok=True)
+            return self._connect(db_path)
+
+    @staticmethod
+    def _connect(db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS dirs ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, entries TEXT NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, best_mtime_ns INTEGER, "
+            "last_mtime_ns INTEGER, summary_mtime_ns INTEGER, metrics TEXT NOT NULL)"
+        )
+        db.commit()
+        return db
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._scanned_at is not None and now - self._scanned_at < self.ttl:
+                return
+            self._scan()
+            self._scanned_at = time.monotonic()
+
+    def _scan(self) -> None:
+        known = {
+            path: (mtime_ns, entries)
+            for path, mtime_ns, entries in self._db.execute("SELECT path, mtime_ns, entries FROM dirs")
+        }
+        known_runs = {
+            row[0]: row[1:]
+            for row in self._db.execute("SELECT path, summary_mtime_ns, metrics FROM runs")
+        }
+        dir_mtimes: dict[str, int] = {}
+        dir_updates: list[tuple[str, int, str]] = []
+        weight_dirs: list[tuple[Path, list[str]]] = []
+        run_files: dict[str, list[str]] = {}
+
+        stack = [self.root]
+        while stack:
+            d = stack.pop()
+            mtime_ns = _stat_mtime_ns(d)
+            if mtime_ns is None:
+                continue
+            key = str(d)
+            dir_mtimes[key] = mtime_ns
+            cached = known.get(key)
+            if cached is not None and cached[0] == mtime_ns:
+                dirs, files = json.loads(cached[1])
+            else:
+                dirs, files = _list_dir(d)
+                dir_updates.append((key, mtime_ns, json.dumps([dirs, files])))
+            run_files[key] = files
+            if d.name == "weights" and ("best.pt" in files or "last.pt" in files):
+                weight_dirs.append((d, files))
+            stack.extend(d / name for name in dirs)
+
+        run_rows: list[tuple[str, int, int | None, int | None, int | None, str]] = []
+        for weights, files in weight_dirs:
+            run_dir = weights.parent
+            key = str(run_dir)
+            if key not in dir_mtimes:
+                continue
+            # best.pt is overwritten in place, which leaves the directory mtime alone.
+            best_ns = _stat_mtime_ns(weights / "best.pt") if "best.pt" in files else None
+            last_ns = _stat_mtime_ns(weights / "last.pt") if "last.pt" in files else None
+            if best_ns is None and last_ns is None:
+                continue
+            summary_ns = None
+            metrics = "{}"
+            if "results_summary.json" in run_files.get(key, []):
+                summary_ns = _stat_mtime_ns(run_dir / "results_summary.json")
+                previous = known_runs.get(key)
+                if previous is not None and previous[0] == summary_ns:
+                    metrics = previous[1]
+                elif summary_ns is not None:
+                    try:
+                        payload = json.loads(_read_text_if_exists(run_dir / "results_summary.json"))
+                    except ValueError:
+                        payload = {}
+                    metrics = json.dumps(_numeric_leaves(payload))
+            run_rows.append((key, dir_mtimes[key], best_ns, last_ns, summary_ns, metrics))
+
+        stale_dirs = [(path,) for path in known if path not in dir_mtimes]
+        live_runs = {row[0] for row in run_rows}
+        stale_runs = [(path,) for path in known_runs if path not in live_runs]
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", dir_updates)
+            self._db.executemany("DELETE FROM dirs WHERE path = ?", stale_dirs)
+            self._db.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)", run_rows)
+            self._db.executemany("DELETE FROM runs WHERE path = ?", stale_runs)
+
+    def runs(self) -> list[RunRecord]:
+        self.refresh()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, mtime_ns, best_mtime_ns, last_mtime_ns, metrics FROM runs ORDER BY mtime_ns DESC"
+            ).fetchall()
+        return [
+            RunRecord(
+                path=Path(path),
+                mtime=mtime_ns / 1e9,
+                best_mtime=best_ns / 1e9 if best_ns is not None else None,
+                last_mtime=last_ns / 1e9 if last_ns is not None else None,
+                metrics=json.loads(metrics),
+            )
+            for path, mtime_ns, best_ns, last_ns, metrics in rows
+        ]
+
+    def files(self, path: Path) -> list[str] | None:
+        self.refresh()
+        with self._lock:
+            row = self._db.execute("SELECT entries FROM dirs WHERE path = ?", (str(path),)).fetchone()
+        return json.loads(row[0])[1] if row else None
+
+
+_run_indexes: dict[Path, RunIndex] = {}
+_run_indexes_lock = threading.Lock()
+
+
+def get_run_index(base_dir: Path) -> RunIndex:
+    root = (base_dir / "runs").resolve()
+    with _run_indexes_lock:
+        index = _run_indexes.get(root)
+        if index is None:
+            index = RunIndex(root, RUN_INDEX_TTL)
+            _run_indexes[root] = index
+        return index
+
+
 def find_run_dirs(base_dir: Path) -> list[Path]:
-    run_dirs: dict[str, Path] = {}
-    for best in base_dir.glob("runs/**/weights/best.pt"):
-        run_dir = best.parent.parent
-        run_dirs[str(run_dir)] = run_dir
-    return sorted(run_dirs.values(), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [run.path for run in get_run_index(base_dir).runs() if run.best_pt is not None]
 
 
 def find_model_candidates(base_dir: Path) -> list[str]:
-    models: list[Path] = []
-    models.extend(base_dir.glob("*.pt"))
-    models.extend(base_dir.glob("runs/**/weights/best.pt"))
-    models.extend(base_dir.glob("runs/**/weights/last.pt"))
+    models: list[tuple[float, Path]] = []
+    for p in base_dir.glob("*.pt"):
+        mtime_ns = _stat_mtime_ns(p)
+        models.append((mtime_ns / 1e9 if mtime_ns is not None else 0.0, p))
+    for run in get_run_index(base_dir).runs():
+        if run.best_pt is not None:
+            models.append((run.best_mtime, run.best_pt))
+        if run.last_pt is not None:
+            models.append((run.last_mtime, run.last_pt))
 
     seen: set[str] = set()
     out: list[str] = []
-    for p in sorted(models, key=lambda x: x.stat().st_mtime if x.exists() else 0, reverse=True):
+    for _, p in sorted(models, key=lambda item: item[0], reverse=True):
         sp = str(p)
         if sp not in seen:
             seen.add(sp)
@@ -56,8 +297,10 @@ def find_model_candidates(base_dir: Path) -> list[str]:
 
 
 def find_latest_best_pt(base_dir: Path) -> str:
-    bests = sorted(base_dir.glob("runs/**/weights/best.pt"), key=lambda p: p.stat().st_mtime, reverse=True)
-    return str(bests[0]) if bests else ""
+    bests = [run for run in get_run_index(base_dir).runs() if run.best_pt is not None]
+    if not bests:
+        return ""
+    return str(max(bests, key=lambda run: run.best_mtime).best_pt)
 
 
 def _to_pretty_json(payload: Any) -> str:
@@ -72,6 +315,185 @@ def refresh_model_choices():
     return gr.update(choices=choices, value=default_value)
 
 
+def _run_device(device: str) -> int | str:
+    return 0 if device == "gpu" else "cpu"
+
+
+class CachedModel:
+    # A cached YOLO plus the lock that serialises predict() on it. Ultralytics
+    # predictors keep per-call state, and the Inference click, a running batch
+    # and warm-up can all reach the same instance at once.
+
+    def __init__(self, model: YOLO) -> None:
+        self.model = model
+        self._lock = threading.Lock()
+
+    def predict(self, **kwargs: Any) -> list[Results]:
+        with self._lock:
+            return self.model.predict(**kwargs)
+
+
+class ModelCache:
+    # Loaded YOLO models keyed on (path, mtime, device), least recently used
+    # evicted first. A changed file has a new mtime, so it is reloaded and its
+    # old entry dropped. Loading includes one warm-up predict, so the first
+    # click after selecting a model only pays for inference. Loads run outside
+    # the cache lock, so hits on other models are not held up; a second caller
+    # for a key that is still loading waits on the first caller's future.
+
+    def __init__(self, max_models: int, min_free_gpu: float) -> None:
+        self.max_models = max(1, max_models)
+        self.min_free_gpu = min_free_gpu
+        self._models: OrderedDict[tuple[str, float, str], CachedModel] = OrderedDict()
+        self._loading: dict[tuple[str, float, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_path: str, device: str) -> tuple[CachedModel, bool, float]:
+        # Returns (model, cache_hit, load_seconds).
+        path = Path(model_path).resolve()
+        key = (str(path), path.stat().st_mtime, device)
+        started = time.perf_counter()
+        with self._lock:
+            cached = self._models.get(key)
+            if cached is not None:
+                self._models.move_to_end(key)
+                return cached, True, 0.0
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = Future()
+                for stale in [k for k in self._models if k[0] == key[0] and k[2] == device]:
+                    self._evict(stale)
+                while self._models and len(self._models) + len(self._loading) > self.max_models:
+                    self._evict(next(iter(self._models)))
+                if device == "gpu":
+                    self._make_gpu_room()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return loading.result(), False, time.perf_counter() - started
+
+        try:
+            model = YOLO(str(path))
+            model.predict(source=np.zeros((64, 64, 3), dtype=np.uint8), imgsz=64, device=_run_device(device), verbose=False)
+        except BaseException as exc:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(exc)
+            raise
+        cached = CachedModel(model)
+        with self._lock:
+            del self._loading[key]
+            self._models[key] = cached
+            while len(self._models) > self.max_models:
+                self._evict(next(iter(self._models)))
+        loading.set_result(cached)
+        return cached, False, time.perf_counter() - started
+
+    def _make_gpu_room(self) -> None:
+        if not torch.cuda.is_available():
+            return
+        while True:
+            free, total = torch.cuda.mem_get_info()
+            gpu_keys = [k for k in self._models if k[2] == "gpu"]
+            if free / total >= self.min_free_gpu or not gpu_keys:
+                return
+            self._evict(gpu_keys[0])
+
+    def _evict(self, key: tuple[str, float, str]) -> None:
+        del self._models[key]
+        if key[2] == "gpu" and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def describe(self) -> str:
+        return ", ".join(f"{Path(k[0]).name}@{k[2]}" for k in self._models) or "empty"
+
+
+model_cache = ModelCache(MODEL_CACHE_SIZE, MODEL_CACHE_MIN_FREE_GPU)
+
+
+def warm_model(model_path: str, device: str) -> str:
+    # Loads the selected model into the cache as soon as it is picked.
+    if not model_path or not Path(model_path).exists():
+        return f"Model file not found: {model_path}"
+    try:
+        _, hit, load_s = model_cache.get(model_path, device)
+    except Exception as exc:
+        return f"Failed to load {model_path}: {exc}"
+    state = "already cached" if hit else f"loaded and warmed up in {load_s:.2f} s"
+    return f"Model ready: {model_path} on {device} ({state})\nCached models: {model_cache.describe()}"
+
+
+def _tile_grid(width: int, height: int, tile: int, overlap: float) -> list[tuple[int, int, int, int]]:
+    # Evenly spaced starts, the fewest that still overlap by at least `overlap`.
+    def starts(length: int) -> list[int]:
+        if length <= tile:
+            return [0]
+        count = math.ceil((length - tile) / max(1.0, tile * (1.0 - overlap))) + 1
+        return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+    return [(x, y, min(x + tile, width), min(y + tile, height)) for y in starts(height) for x in starts(width)]
+
+
+def _plan_tiles(width: int, height: int, imgsz: int, overlap: float) -> list[tuple[int, int, int, int]]:
+    # Same "auto" plan as /predict?tiles=auto: native-resolution tiles of imgsz
+    # px, grown until the grid fits TILE_MAX_TILES.
+    tile = imgsz
+    grid = _tile_grid(width, height, tile, overlap)
+    while len(grid) > TILE_MAX_TILES:
+        tile = int(tile * 1.25) + 1
+        grid = _tile_grid(width, height, tile, overlap)
+    return grid
+
+
+def _merge_tile_boxes(dets: np.ndarray, threshold: float) -> np.ndarray:
+    # Greedy class-aware NMS on intersection-over-smaller, matching the server's
+    # cross-tile merge. dets is (n, 6) [x1, y1, x2, y2, conf, cls].
+    dets = dets[np.argsort(-dets[:, 4], kind="stable")]
+    areas = (dets[:, 2] - dets[:, 0]) * (dets[:, 3] - dets[:, 1])
+    suppressed = np.zeros(len(dets), dtype=bool)
+    keep: list[int] = []
+    for i in range(len(dets)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = np.nonzero(~suppressed[i + 1 :])[0] + i + 1
+        if len(rest) == 0:
+            continue
+        tl = np.maximum(dets[i, :2], dets[rest, :2])
+        br = np.minimum(dets[i, 2:4], dets[rest, 2:4])
+        inter = np.clip(br - tl, 0, None).prod(axis=1)
+        ios = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9)
+        suppressed[rest[(ios >= threshold) & (dets[rest, 5] == dets[i, 5])]] = True
+    return dets[keep]
+
+
+def _predict_tiled(model, image_rgb, tile_overlap: float, predict_kwargs: dict[str, Any]):
+    height, width = image_rgb.shape[:2]
+    tile_boxes = _plan_tiles(width, height, int(predict_kwargs["imgsz"]), float(tile_overlap))
+    crops = [image_rgb[y0:y1, x0:x1] for x0, y0, x1, y1 in tile_boxes]
+    results = model.predict(source=crops, **predict_kwargs)
+
+    all_dets = []
+    per_tile = []
+    for (x0, y0, x1, y1), result in zip(tile_boxes, results):
+        dets = result.boxes.data[:, :6].detach().cpu().numpy() if result.boxes is not None else np.zeros((0, 6))
+        dets[:, :4] += np.array([x0, y0, x0, y0], dtype=dets.dtype)
+        all_dets.append(dets)
+        per_tile.append({"box": [x0, y0, x1, y1], "count": int(len(dets)), "speed_ms": result.speed})
+
+    merge_started = time.perf_counter()
+    merged = _merge_tile_boxes(np.concatenate(all_dets), TILE_MATCH_THRESHOLD)[: int(predict_kwargs["max_det"])]
+    tiles_info = {
+        "count": len(tile_boxes),
+        "overlap": float(tile_overlap),
+        "raw_detections": int(sum(t["count"] for t in per_tile)),
+        "merge_ms": round((time.perf_counter() - merge_started) * 1000.0, 3),
+        "per_tile": per_tile,
+    }
+    return Results(image_rgb, path="", names=results[0].names, boxes=torch.from_numpy(merged)), tiles_info
+
+
 def predict_image(
     image_rgb,
     model_path: str,
@@ -80,26 +502,33 @@ def predict_image(
     imgsz: int,
     max_det: int,
     device: str,
+    tiles: str = "off",
+    tile_overlap: float = 0.2,
 ):
     if image_rgb is None:
         return None, "Please upload an image first.", "", ""
     if not model_path or not Path(model_path).exists():
         return None, f"Model file not found: {model_path}", "", ""
 
-    model = YOLO(model_path)
-    run_device = 0 if device == "gpu" else "cpu"
-
-    results = model.predict(
-        source=image_rgb,
-        conf=float(conf),
-        iou=float(iou),
-        imgsz=int(imgsz),
-        max_det=int(max_det),
-        device=run_device,
-        verbose=False,
-    )
+    model, cache_hit, load_s = model_cache.get(model_path, device)
+    run_device = _run_device(device)
+    predict_kwargs = {
+        "conf": float(conf),
+        "iou": float(iou),
+        "imgsz": int(imgsz),
+        "max_det": int(max_det),
+        "device": run_device,
+        "verbose": False,
+    }
+
+    tiles_info = None
+    infer_started = time.perf_counter()
+    if tiles == "auto":
+        r0, tiles_info = _predict_tiled(model, image_rgb, tile_overlap, predict_kwargs)
+    else:
+        r0 = model.predict(source=image_rgb, **predict_kwargs)[0]
+    infer_ms = (time.perf_counter() - infer_started) * 1000.0
 
-    r0 = results[0]
     boxes = r0.boxes
     count = 0 if boxes is None else len(boxes)
 
@@ -116,22 +545,562 @@ def predict_image(
             f"Model: {model_path}",
             f"Count: {count}",
             f"conf={conf}, iou={iou}, imgsz={imgsz}, max_det={max_det}, device={device}",
+            f"Model load: {'cache hit' if cache_hit else f'{load_s:.2f} s (cache miss)'}",
+            f"Inference: {infer_ms:.1f} ms",
         ]
     )
+    if tiles_info is not None:
+        meta_text += (
+            f"\nTiles: {tiles_info['count']} (overlap={tiles_info['overlap']}), "
+            f"raw detections={tiles_info['raw_detections']}, merge={tiles_info['merge_ms']} ms"
+        )
 
     detail_payload = {
         "count": int(count),
         "confidence_list": conf_list,
         "mean_confidence": round(sum(conf_list) / len(conf_list), 4) if conf_list else None,
     }
+    if tiles_info is not None:
+        detail_payload["tiles"] = tiles_info
     return plotted_rgb, f"Aphid count: {count}", meta_text, _to_pretty_json(detail_payload)
 
 
-def refresh_runs():
-    run_dirs = find_run_dirs(BASE_DIR)
-    choices = [str(p) for p in run_dirs]
+def _iter_image_files(paths: list[Path], workers: int, prefetch: int) -> Iterator[tuple[str, np.ndarray | None]]:
+    # Decodes ahead on a thread pool, in order, with at most `prefetch`
+    # images decoded but not yet consumed.
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending: deque = deque()
+        files = iter(paths)
+        for path in files:
+            pending.append((path, pool.submit(cv2.imread, str(path))))
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(files, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(cv2.imread, str(next_path))))
+            yield path.name, future.result()
+
+
+def _iter_video(path: Path, stride: int, prefetch: int) -> Iterator[tuple[str, np.ndarray | None]]:
+    # A reader thread decodes into a bounded queue; skipped frames are only
+    # grabbed, not decoded.
+    frames: queue.Queue = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+
+    def reader() -> None:
+        cap = cv2.VideoCapture(str(path))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        index = 0
+        try:
+            while not stop.is_set():
+                if index % stride and cap.grab():
+                    index += 1
+                    continue
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                name = f"frame_{index:07d}" + (f"_{index / fps:.2f}s" if fps > 0 else "")
+                while not stop.is_set():
+                    try:
+                        frames.put((name, frame), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                index += 1
+        finally:
+            cap.release()
+            frames.put(None)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while (item := frames.get()) is not None:
+            yield item
+    finally:
+        stop.set()
+        # Unblock the reader if it is waiting on a full queue.
+        while thread.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def _batched(items: Iterator[Any], size: int) -> Iterator[list[Any]]:
+    batch: list[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _sample_thumbnail(plotted_bgr: np.ndarray, max_width: int = 640) -> np.ndarray:
+    height, width = plotted_bgr.shape[:2]
+    if width > max_width:
+        plotted_bgr = cv2.resize(plotted_bgr, (max_width, round(height * max_width / width)), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(plotted_bgr, cv2.COLOR_BGR2RGB)
+
+
+def _count_series(indices: list[int], counts: list[int]) -> pd.DataFrame:
+    # Long runs are thinned to BATCH_PLOT_POINTS so redrawing stays cheap.
+    step = max(1, len(indices) // BATCH_PLOT_POINTS)
+    return pd.DataFrame({"image": indices[::step], "count": counts[::step]})
+
+
+def predict_batch(
+    source: str,
+    video_upload: Any,
+    model_path: str,
+    conf: float,
+    iou: float,
+    imgsz: int,
+    max_det: int,
+    device: str,
+    batch_size: int,
+    frame_stride: int,
+    sample_every: int,
+    export_parquet: bool,
+):
+    # Generator: every batch yields (status, count series, sampled frames, exports).
+    # Per-image rows go straight to the CSV; only the count series and the
+    # last BATCH_SAMPLES_KEPT annotated frames stay in memory.
+    empty = _count_series([], [])
+    uploaded = getattr(video_upload, "name", video_upload) if video_upload else ""
+    src = Path(uploaded or (source or "").strip())
+    if not str(src) or not src.exists():
+        yield f"Source not found: {src}", empty, [], None
+        return
+    if not model_path or not Path(model_path).exists():
+        yield f"Model file not found: {model_path}", empty, [], None
+        return
+
+    batch_size = max(1, int(batch_size))
+    prefetch = batch_size * 2
+    if src.is_dir():
+        paths = sorted(p for p in src.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+        if not paths:
+            yield f"No images found in: {src}", empty, [], None
+            return
+        total: int | None = len(paths)
+        frames = _iter_image_files(paths, workers=min(8, os.cpu_count() or 1), prefetch=prefetch)
+    elif src.suffix.lower() in VIDEO_SUFFIXES:
+        cap = cv2.VideoCapture(str(src))
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        stride = max(1, int(frame_stride))
+        total = -(-frame_count // stride) if frame_count > 0 else None
+        frames = _iter_video(src, stride, prefetch)
+    else:
+        yield f"Not a folder or a supported video file: {src}", empty, [], None
+        return
+
+    model, cache_hit, load_s = model_cache.get(model_path, device)
+    predict_kwargs = {
+        "conf": float(conf),
+        "iou": float(iou),
+        "imgsz": int(imgsz),
+        "max_det": int(max_det),
+        "device": _run_device(device),
+        "verbose": False,
+    }
+
+    BATCH_EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = BATCH_EXPORT_DIR / f"counts_{stamp}_{src.stem or 'batch'}.csv"
+    indices: list[int] = []
+    counts: list[int] = []
+    samples: deque = deque(maxlen=BATCH_SAMPLES_KEPT)
+    position = 0
+    failed = 0
+    started = time.perf_counter()
+    infer_s = 0.0
+    load_note = "cache hit" if cache_hit else f"loaded in {load_s:.2f} s"
+
+    with csv_path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["index", "name", "count", "mean_confidence", "inference_ms"])
+        for batch in _batched(frames, batch_size):
+            good = []
+            for name, img in batch:
+                if img is None:
+                    writer.writerow([position, name, "", "", ""])
+                    failed += 1
+                else:
+                    good.append((position, name, img))
+                position += 1
+            if not good:
+                continue
+            # Frames come from cv2, i.e. BGR, which is what ultralytics expects for arrays.
+            infer_started = time.perf_counter()
+            results = model.predict(source=[img for _, _, img in good], **predict_kwargs)
+            batch_s = time.perf_counter() - infer_started
+            infer_s += batch_s
+            for (index, name, _), result in zip(good, results):
+                boxes = result.boxes
+                count = 0 if boxes is None else len(boxes)
+                mean_conf = round(float(boxes.conf.mean()), 4) if count else ""
+                writer.writerow([index, name, count, mean_conf, round(batch_s * 1000.0 / len(good), 2)])
+                indices.append(index)
+                counts.append(count)
+                if index % max(1, int(sample_every)) == 0:
+                    samples.append((_sample_thumbnail(result.plot()), f"{name}: {count}"))
+            f.flush()
+
+            elapsed = time.perf_counter() - started
+            progress = f"{position}/{total}" if total else f"{position}"
+            status = (
+                f"Processed {progress} images ({position / elapsed:.1f} img/s, inference {infer_s:.1f} s), "
+                f"model {load_note}\nTotal aphids: {sum(counts)}, failed to decode: {failed}"
+            )
+            yield status, _count_series(indices, counts), list(samples), None
+
+    exports = [str(csv_path)]
+    notes = []
+    if export_parquet:
+        try:
+            parquet_path = csv_path.with_suffix(".parquet")
+            pd.read_csv(csv_path).to_parquet(parquet_path, index=False)
+            exports.append(str(parquet_path))
+        except ImportError as exc:
+            notes.append(f"Parquet export skipped: {str(exc).splitlines()[0]}")
+    elapsed = time.perf_counter() - started
+    mean = sum(counts) / len(counts) if counts else 0.0
+    status = "\n".join(
+        [
+            f"Done: {position} images in {elapsed:.1f} s ({position / max(elapsed, 1e-9):.1f} img/s), model {load_note}",
+            f"Total aphids: {sum(counts)}, mean per image: {mean:.2f}, failed to decode: {failed}",
+            f"Exported: {', '.join(exports)}",
+            *notes,
+        ]
+    )
+    yield status, _count_series(indices, counts), list(samples), exports
+
+
+BENCH_COLUMNS = [
+    "pareto",
+    "model",
+    "backend",
+    "device",
+    "imgsz",
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "mean_ms",
+    "peak_mem_mb",
+    "count_mae",
+    "map50",
+    "map50_95",
+    "cached",
+    "error",
+]
+
+
+def _bench_table(rows: list[dict[str, Any]]) -> pd.DataFrame:
+    ips = sorted({key for row in rows for key in row if key.startswith("ips_b")}, key=lambda k: int(k[5:]))
+    columns = BENCH_COLUMNS[:9] + ips + BENCH_COLUMNS[9:]
+    return pd.DataFrame([{key: row.get(key) for key in columns} for row in rows], columns=columns)
+
+
+def benchmark_checkpoints(
+    models: list[str],
+    images_dir: str,
+    imgsz_values: list[str],
+    devices: list[str],
+    backends: list[str],
+    batch_sizes: str,
+    conf: float,
+    iou: float,
+    max_det: int,
+    limit: int,
+    use_cache: bool,
+):
+    # Imported lazily: the benchmark pulls in onnx/onnxruntime via model_quantization.
+    from benchmark_models import DEFAULT_CACHE_DIR, mark_pareto, run_benchmarks
+
+    empty_plot = pd.DataFrame({"p95_ms": [], "map50_95": [], "model": []})
+    folder = Path((images_dir or "").strip())
+    if not str(folder) or not folder.is_dir():
+        yield "Please enter a labeled validation folder.", _bench_table([]), empty_plot
+        return
+    if not models or not imgsz_values or not devices or not backends:
+        yield "Pick at least one model, imgsz, device and backend.", _bench_table([]), empty_plot
+        return
+    try:
+        sizes = sorted({int(v) for v in batch_sizes.replace(",", " ").split()} or {1})
+    except ValueError:
+        yield f"Invalid batch sizes: {batch_sizes}", _bench_table([]), empty_plot
+        return
+
+    total = len(models) * len(imgsz_values) * len(devices) * len(backends)
+    started = time.perf_counter()
+    rows: list[dict[str, Any]] = []
+    try:
+        for row in run_benchmarks(
+            models=[Path(m) for m in models],
+            images_dir=folder,
+            imgsz_values=sorted(int(v) for v in imgsz_values),
+            devices=devices,
+            backends=backends,
+            batch_sizes=sizes,
+            conf=float(conf),
+            iou=float(iou),
+            max_det=int(max_det),
+            limit=int(limit),
+            cache_dir=DEFAULT_CACHE_DIR,
+            use_cache=use_cache,
+        ):
+            rows.append(row)
+            ranked = mark_pareto([dict(r) for r in rows])
+            measured = [r for r in ranked if "error" not in r]
+            cached = sum(1 for r in rows if r.get("cached"))
+            status = (
+                f"{len(rows)}/{total} configurations ({cached} from cache) in {time.perf_counter() - started:.1f} s\n"
+                f"Last: {Path(row['model']).name} {row['backend']}/{row['device']}/{row['imgsz']}"
+                + (f" failed: {row['error']}" if "error" in row else "")
+            )
+            plot = pd.DataFrame(
+                {
+                    "p95_ms": [r["p95_ms"] for r in measured],
+                    "map50_95": [r["map50_95"] for r in measured],
+                    "model": [f"{Path(r['model']).name} {r['backend']}/{r['device']}/{r['imgsz']}" for r in measured],
+                }
+            )
+            yield status, _bench_table(ranked), plot
+    except FileNotFoundError as exc:
+        yield str(exc), _bench_table(rows), empty_plot
+
+
+def _run_matches(run: RunRecord, terms: list[str]) -> bool:
+    for term in terms:
+        match = RUN_FILTER_TERM.match(term)
+        if match is None:
+            if term.lower() not in str(run.path).lower():
+                return False
+            continue
+        key, op, raw = match.groups()
+        value = run.metrics.get(key)
+        if value is None:
+            return False
+        target = float(raw)
+        ok = {
+            ">=": value >= target,
+            "<=": value <= target,
+            "==": value == target,
+            ">": value > target,
+            "<": value < target,
+        }[op]
+        if not ok:
+            return False
+    return True
+
+
+def _select_runs(run_filter: str, sort_by: str, descending: bool) -> tuple[list[RunRecord], list[str]]:
+    runs = [run for run in get_run_index(BASE_DIR).runs() if run.best_pt is not None]
+    metric_keys = sorted({key for run in runs for key in run.metrics})
+    terms = (run_filter or "").split()
+    if terms:
+        runs = [run for run in runs if _run_matches(run, terms)]
+    if sort_by and sort_by != "modified":
+        # Runs without the metric go last in either direction.
+        present = [run for run in runs if sort_by in run.metrics]
+        missing = [run for run in runs if sort_by not in run.metrics]
+        present.sort(key=lambda run: run.metrics[sort_by], reverse=descending)
+        runs = present + missing
+    elif not descending:
+        runs = list(reversed(runs))
+    return runs, metric_keys
+
+
+def _runs_table(runs: list[RunRecord], sort_by: str) -> pd.DataFrame:
+    keys: list[str] = []
+    if sort_by and sort_by != "modified":
+        keys.append(sort_by)
+    for run in runs:
+        for key in run.metrics:
+            if len(keys) >= RUN_TABLE_METRICS:
+                break
+            if key not in keys:
+                keys.append(key)
+    rows = []
+    for run in runs:
+        row: dict[str, Any] = {
+            "run": str(run.path),
+            "modified": datetime.fromtimestamp(run.mtime).strftime("%Y-%m-%d %H:%M"),
+        }
+        for key in keys:
+            row[key] = run.metrics.get(key)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["run", "modified", *keys])
+
+
+def list_runs(run_filter: str, sort_by: str, descending: bool):
+    runs, metric_keys = _select_runs(run_filter, sort_by, descending)
+    choices = [str(run.path) for run in runs]
     default_value = choices[0] if choices else ""
-    return gr.update(choices=choices, value=default_value)
+    sort_choices = ["modified", *metric_keys]
+    sort_value = sort_by if sort_by in sort_choices else "modified"
+    return (
+        gr.update(choices=choices, value=default_value),
+        gr.update(choices=sort_choices, value=sort_value),
+        _runs_table(runs, sort_value),
+        gr.update(choices=choices),
+    )
+
+
+def refresh_runs(run_filter: str, sort_by: str, descending: bool):
+    get_run_index(BASE_DIR).refresh(force=True)
+    return list_runs(run_filter, sort_by, descending)
+
+
+def select_run_row(table: pd.DataFrame, evt: gr.SelectData):
+    row = evt.index[0] if isinstance(evt.index, (list, tuple)) else evt.index
+    if table is None or row is None or row >= len(table):
+        return gr.update()
+    return gr.update(value=str(table.iloc[row]["run"]))
+
+
+@dataclass
+class _CsvState:
+    inode: int
+    offset: int
+    header: list[str]
+    columns: dict[str, np.ndarray]
+    pending: bytes = b""
+
+
+class MetricsCache:
+    # Columnar view of results.csv files. Training appends one row per epoch,
+    # so a file that only grew is tailed from the last offset; a file that
+    # shrank or was replaced is parsed again from the start.
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._states: dict[str, _CsvState] = {}
+
+    def load(self, path: Path) -> dict[str, np.ndarray]:
+        key = str(path)
+        with self._lock:
+            try:
+                st = path.stat()
+            except OSError:
+                self._states.pop(key, None)
+                return {}
+            state = self._states.get(key)
+            if state is None or state.inode != st.st_ino or st.st_size < state.offset:
+                state = _CsvState(inode=st.st_ino, offset=0, header=[], columns={})
+                self._states[key] = state
+            if st.st_size > state.offset:
+                self._tail(path, state)
+            return dict(state.columns)
+
+    @staticmethod
+    def _tail(path: Path, state: _CsvState) -> None:
+        with path.open("rb") as fh:
+            fh.seek(state.offset)
+            chunk = fh.read()
+        state.offset += len(chunk)
+        data = state.pending + chunk
+        # A row still being written stays pending until its newline arrives.
+        cut = data.rfind(b"\n") + 1
+        state.pending = data[cut:]
+        lines = data[:cut].decode("utf-8", errors="replace").splitlines()
+        rows = list(csv.reader(line for line in lines if line.strip()))
+        if not state.header and rows:
+            state.header = [name.strip() for name in rows.pop(0)]
+            state.columns = {name: np.empty(0, dtype=np.float64) for name in state.header}
+        width = len(state.header)
+        values = []
+        for row in rows:
+            if len(row) != width:
+                continue
+            parsed = []
+            for cell in row:
+                try:
+                    parsed.append(float(cell))
+                except ValueError:
+                    parsed.append(np.nan)
+            values.append(parsed)
+        if not values:
+            return
+        block = np.asarray(values, dtype=np.float64)
+        for i, name in enumerate(state.header):
+            state.columns[name] = np.concatenate([state.columns[name], block[:, i]])
+
+
+metrics_cache = MetricsCache()
+
+
+def _downsample(x: np.ndarray, y: np.ndarray, points: int) -> tuple[np.ndarray, np.ndarray]:
+    # Keep each bucket's min and max so loss spikes survive thinning.
+    n = len(x)
+    if n <= points:
+        return x, y
+    buckets = max(1, points // 2)
+    width = -(-n // buckets)
+    grid = np.full(buckets * width, np.nan)
+    grid[:n] = y
+    grid = grid.reshape(buckets, width)
+    starts = np.arange(buckets) * width
+    lows = np.where(np.isnan(grid), np.inf, grid).argmin(axis=1) + starts
+    highs = np.where(np.isnan(grid), -np.inf, grid).argmax(axis=1) + starts
+    idx = np.unique(np.concatenate([[0, n - 1], lows, highs]))
+    idx = idx[idx < n]
+    return x[idx], y[idx]
+
+
+def _run_label(run_dir: Path) -> str:
+    try:
+        return str(run_dir.resolve().relative_to(get_run_index(BASE_DIR).root))
+    except ValueError:
+        return str(run_dir)
+
+
+def metric_choices(run_dirs: list[str], selected: list[str] | None = None):
+    names: list[str] = []
+    for run_dir in run_dirs or []:
+        for name in metrics_cache.load(Path(run_dir) / "results.csv"):
+            if name != "epoch" and name not in names:
+                names.append(name)
+    value = [name for name in selected or [] if name in names]
+    if not value:
+        value = [name for name in METRIC_DEFAULTS if name in names][:1] or names[:1]
+    return gr.update(choices=names, value=value)
+
+
+def plot_metrics(run_dirs: list[str], metric_names: list[str]):
+    t0 = time.perf_counter()
+    frames = []
+    missing = []
+    points = 0
+    for run_dir in run_dirs or []:
+        columns = metrics_cache.load(Path(run_dir) / "results.csv")
+        if not columns:
+            missing.append(run_dir)
+            continue
+        label = _run_label(Path(run_dir))
+        any_col = next(iter(columns.values()))
+        x = columns.get("epoch", np.arange(1, len(any_col) + 1, dtype=np.float64))
+        for name in metric_names or []:
+            if name not in columns:
+                continue
+            xs, ys = _downsample(x, columns[name], METRIC_PLOT_POINTS)
+            points += len(xs)
+            series = label if len(metric_names) == 1 else f"{label} | {name}"
+            frames.append(pd.DataFrame({"epoch": xs, "value": ys, "series": series}))
+    plot = (
+        pd.concat(frames, ignore_index=True)
+        if frames
+        else pd.DataFrame({"epoch": [], "value": [], "series": []})
+    )
+    lines = [f"Series: {len(frames)}  Points: {points}  Built in {(time.perf_counter() - t0) * 1000:.1f} ms"]
+    if missing:
+        lines.append("No results.csv: " + ", ".join(missing))
+    return plot, "\n".join(lines)
 
 
 def inspect_run(run_dir: str):
@@ -142,17 +1111,29 @@ def inspect_run(run_dir: str):
     if not rd.exists():
         return run_dir, "", f"Directory not found: {run_dir}", [], "No report found.", "No summary found.", "No context found.", "No CSV found."
 
+    # Existence checks come from the run index listing instead of one stat per
+    # artifact; directories outside runs/ are listed once.
+    index = get_run_index(BASE_DIR)
+    files = index.files(rd)
+    if files is None:
+        files = _list_dir(rd)[1]
+    weight_files = index.files(rd / "weights")
+    if weight_files is None:
+        weight_files = _list_dir(rd / "weights")[1]
+    present = set(files)
+
     best_pt = rd / "weights" / "best.pt"
+    has_best = "best.pt" in weight_files
     summary_path = rd / "results_summary.json"
     context_path = rd / "train_context.json"
     report_path = rd / "presentation_report.md"
     csv_path = rd / "results.csv"
 
-    summary_text = _read_text_if_exists(summary_path)
-    context_text = _read_text_if_exists(context_path)
-    report_text = _read_text_if_exists(report_path)
+    summary_text = _read_text_if_exists(summary_path) if summary_path.name in present else ""
+    context_text = _read_text_if_exists(context_path) if context_path.name in present else ""
+    report_text = _read_text_if_exists(report_path) if report_path.name in present else ""
     csv_preview = ""
-    if csv_path.exists():
+    if csv_path.name in present:
         csv_lines = _read_text_if_exists(csv_path).splitlines()
         csv_preview = "\n".join(csv_lines[:15])
 
@@ -175,14 +1156,14 @@ def inspect_run(run_dir: str):
         "val_batch0_pred.jpg",
         "val_batch0_labels.jpg",
     ]
-    gallery = [str(rd / name) for name in image_candidates if (rd / name).exists()]
+    gallery = [str(rd / name) for name in image_candidates if name in present]
 
     run_info = "\n".join(
         [
             f"Run Dir: {run_dir}",
-            f"Best Weight: {best_pt if best_pt.exists() else 'Not Found'}",
-            f"Summary JSON: {summary_path if summary_path.exists() else 'Not Found'}",
-            f"Context JSON: {context_path if context_path.exists() else 'Not Found'}",
+            f"Best Weight: {best_pt if has_best else 'Not Found'}",
+            f"Summary JSON: {summary_path if summary_text else 'Not Found'}",
+            f"Context JSON: {context_path if context_text else 'Not Found'}",
         ]
     )
 
@@ -193,7 +1174,7 @@ def inspect_run(run_dir: str):
 
     return (
         run_dir,
-        str(best_pt) if best_pt.exists() else "",
+        str(best_pt) if has_best else "",
         run_info,
         gallery,
         report_display,
@@ -209,8 +1190,8 @@ def build_ui():
     if not default_model and model_choices:
         default_model = model_choices[0]
 
-    run_dirs = find_run_dirs(BASE_DIR)
-    run_choices = [str(p) for p in run_dirs]
+    runs, metric_keys = _select_runs("", "modified", True)
+    run_choices = [str(run.path) for run in runs]
     default_run = run_choices[0] if run_choices else ""
 
     with gr.Blocks(title="Aphid Counter Dashboard") as demo:
@@ -234,22 +1215,127 @@ def build_ui():
                     iou = gr.Slider(0.10, 0.90, value=0.45, step=0.01, label="iou")
                     imgsz = gr.Slider(320, 1280, value=640, step=32, label="imgsz")
                     max_det = gr.Slider(1, 3000, value=1000, step=1, label="max_det")
+                    tiles = gr.Radio(["off", "auto"], value="off", label="Tiled inference")
+                    tile_overlap = gr.Slider(0.0, 0.5, value=0.2, step=0.05, label="tile overlap")
                     img_in = gr.Image(label="Input Image", type="numpy")
                     run_btn = gr.Button("Run Detection")
 
                 with gr.Column(scale=1):
                     img_out = gr.Image(label="Detected Image")
                     count_text = gr.Textbox(label="Count Result")
-                    meta_text = gr.Textbox(label="Runtime Metadata", lines=6)
+                    meta_text = gr.Textbox(label="Runtime Metadata", lines=9)
                     detail_json = gr.Code(label="Detection Detail (JSON)", language="json")
 
             refresh_model_btn.click(fn=refresh_model_choices, outputs=[model_path])
+            model_path.change(fn=warm_model, inputs=[model_path, device], outputs=[meta_text])
+            device.change(fn=warm_model, inputs=[model_path, device], outputs=[meta_text])
             run_btn.click(
                 fn=predict_image,
-                inputs=[img_in, model_path, conf, iou, imgsz, max_det, device],
+                inputs=[img_in, model_path, conf, iou, imgsz, max_det, device, tiles, tile_overlap],
                 outputs=[img_out, count_text, meta_text, detail_json],
             )
 
+        with gr.Tab("Batch Inference"):
+            gr.Markdown(
+                "Runs the model and settings from the Inference tab over a folder of images or a video. "
+                "Per-image counts are written to a CSV as they are produced."
+            )
+            with gr.Row():
+                with gr.Column(scale=1):
+                    batch_source = gr.Textbox(label="Folder or video path")
+                    batch_video = gr.File(label="...or upload a video", file_types=sorted(VIDEO_SUFFIXES))
+                    batch_size = gr.Slider(1, 64, value=8, step=1, label="batch size")
+                    frame_stride = gr.Slider(1, 300, value=1, step=1, label="video frame stride")
+                    sample_every = gr.Slider(1, 500, value=25, step=1, label="keep an annotated sample every N images")
+                    export_parquet = gr.Checkbox(value=False, label="Also export Parquet (needs pyarrow)")
+                    with gr.Row():
+                        batch_run_btn = gr.Button("Run Batch")
+                        batch_stop_btn = gr.Button("Stop")
+
+                with gr.Column(scale=2):
+                    batch_status = gr.Textbox(label="Progress", lines=4)
+                    batch_plot = gr.LinePlot(x="image", y="count", label="Count per image")
+                    batch_gallery = gr.Gallery(label="Sampled annotated frames", columns=4, height=360, object_fit="contain")
+                    batch_files = gr.File(label="Per-image counts", file_count="multiple")
+
+            batch_event = batch_run_btn.click(
+                fn=predict_batch,
+                inputs=[
+                    batch_source,
+                    batch_video,
+                    model_path,
+                    conf,
+                    iou,
+                    imgsz,
+                    max_det,
+                    device,
+                    batch_size,
+                    frame_stride,
+                    sample_every,
+                    export_parquet,
+                ],
+                outputs=[batch_status, batch_plot, batch_gallery, batch_files],
+            )
+            batch_stop_btn.click(fn=None, cancels=[batch_event])
+
+        with gr.Tab("Model Benchmark"):
+            gr.Markdown(
+                "Compares checkpoints on a labeled validation folder (YOLO labels) for latency, throughput, "
+                "peak memory, count MAE and mAP, using conf/iou/max_det from the Inference tab. "
+                "Results are cached per checkpoint hash, so re-runs only measure new combinations."
+            )
+            with gr.Row():
+                with gr.Column(scale=1):
+                    bench_models = gr.Dropdown(
+                        choices=model_choices,
+                        value=model_choices[:2],
+                        multiselect=True,
+                        label="Checkpoints",
+                        allow_custom_value=True,
+                    )
+                    bench_images = gr.Textbox(label="Labeled validation folder")
+                    bench_imgsz = gr.CheckboxGroup(
+                        ["320", "416", "512", "640", "800", "960", "1280"], value=["640"], label="imgsz"
+                    )
+                    bench_devices = gr.CheckboxGroup(["cpu", "gpu"], value=["cpu"], label="Devices")
+                    bench_backends = gr.CheckboxGroup(["torch", "onnx"], value=["torch"], label="Backends")
+                    bench_batches = gr.Textbox(value="1, 4, 8", label="Throughput batch sizes (torch)")
+                    bench_limit = gr.Slider(0, 2000, value=0, step=10, label="image limit (0 = all)")
+                    bench_use_cache = gr.Checkbox(value=True, label="Reuse cached results")
+                    with gr.Row():
+                        bench_run_btn = gr.Button("Run Benchmark")
+                        bench_stop_btn = gr.Button("Stop")
+
+                with gr.Column(scale=2):
+                    bench_status = gr.Textbox(label="Progress", lines=2)
+                    bench_plot = gr.ScatterPlot(
+                        x="p95_ms",
+                        y="map50_95",
+                        color="model",
+                        label="p95 latency vs mAP50-95",
+                        height=360,
+                    )
+            bench_table = gr.Dataframe(label="Results (pareto = on the latency/accuracy front for its device)", interactive=False)
+
+            bench_event = bench_run_btn.click(
+                fn=benchmark_checkpoints,
+                inputs=[
+                    bench_models,
+                    bench_images,
+                    bench_imgsz,
+                    bench_devices,
+                    bench_backends,
+                    bench_batches,
+                    conf,
+                    iou,
+                    max_det,
+                    bench_limit,
+                    bench_use_cache,
+                ],
+                outputs=[bench_status, bench_table, bench_plot],
+            )
+            bench_stop_btn.click(fn=None, cancels=[bench_event])
+
         with gr.Tab("Training Visualization"):
             with gr.Row():
                 with gr.Column(scale=1):
@@ -259,6 +1345,17 @@ def build_ui():
                         label="Run Directory",
                         allow_custom_value=True,
                     )
+                    run_filter = gr.Textbox(
+                        label="Filter Runs",
+                        placeholder="name text and/or metric>=value, e.g. aphid metrics.mAP50>=0.6",
+                    )
+                    with gr.Row():
+                        run_sort = gr.Dropdown(
+                            choices=["modified", *metric_keys],
+                            value="modified",
+                            label="Sort Runs By",
+                        )
+                        run_desc = gr.Checkbox(value=True, label="Descending")
                     refresh_run_btn = gr.Button("Refresh Runs")
                     inspect_btn = gr.Button("Load Run Artifacts")
                     run_info = gr.Textbox(label="Run Info", lines=6)
@@ -268,13 +1365,86 @@ def build_ui():
                     gallery = gr.Gallery(label="Training Plots", columns=3, height=420, object_fit="contain")
                     report_md = gr.Markdown(label="Presentation Report")
 
+            runs_table = gr.Dataframe(
+                value=_runs_table(runs, "modified"),
+                label="Runs (click a row to select it)",
+                interactive=False,
+            )
+
             with gr.Row():
                 summary_json = gr.Code(label="results_summary.json", language="json")
                 context_json = gr.Code(label="train_context.json", language="json")
 
             csv_preview = gr.Textbox(label="results.csv Preview (first 15 lines)", lines=15)
 
-            refresh_run_btn.click(fn=refresh_runs, outputs=[run_dir])
+            gr.Markdown("### Metric Explorer")
+            with gr.Row():
+                with gr.Column(scale=1):
+                    compare_runs = gr.Dropdown(
+                        choices=run_choices,
+                        value=run_choices[:1],
+                        multiselect=True,
+                        label="Runs to Compare",
+                    )
+                    compare_metrics = gr.Dropdown(choices=[], multiselect=True, label="Metrics")
+                    live_metrics = gr.Checkbox(
+                        value=False,
+                        label=f"Live update every {METRIC_POLL_SECONDS:g}s (follows training in progress)",
+                    )
+                    plot_metrics_btn = gr.Button("Plot Metrics")
+                    metrics_status = gr.Textbox(label="Metric Status", lines=2)
+                with gr.Column(scale=2):
+                    metrics_plot = gr.LinePlot(
+                        x="epoch",
+                        y="value",
+                        color="series",
+                        label="Training Curves",
+                        height=420,
+                    )
+            metrics_timer = gr.Timer(METRIC_POLL_SECONDS, active=False)
+
+            run_list_inputs = [run_filter, run_sort, run_desc]
+            run_list_outputs = [run_dir, run_sort, runs_table, compare_runs]
+            refresh_run_btn.click(fn=refresh_runs, inputs=run_list_inputs, outputs=run_list_outputs)
+            run_filter.submit(fn=list_runs, inputs=run_list_inputs, outputs=run_list_outputs)
+            run_sort.input(fn=list_runs, inputs=run_list_inputs, outputs=run_list_outputs)
+            run_desc.input(fn=list_runs, inputs=run_list_inputs, outputs=run_list_outputs)
+            runs_table.select(fn=select_run_row, inputs=[runs_table], outputs=[run_dir])
+
+            compare_runs.change(
+                fn=metric_choices,
+                inputs=[compare_runs, compare_metrics],
+                outputs=[compare_metrics],
+            ).then(
+                fn=plot_metrics,
+                inputs=[compare_runs, compare_metrics],
+                outputs=[metrics_plot, metrics_status],
+            )
+            compare_metrics.input(
+                fn=plot_metrics,
+                inputs=[compare_runs, compare_metrics],
+                outputs=[metrics_plot, metrics_status],
+            )
+            plot_metrics_btn.click(
+                fn=plot_metrics,
+                inputs=[compare_runs, compare_metrics],
+                outputs=[metrics_plot, metrics_status],
+            )
+            live_metrics.change(fn=lambda on: gr.Timer(active=on), inputs=[live_metrics], outputs=[metrics_timer])
+            metrics_timer.tick(
+                fn=plot_metrics,
+                inputs=[compare_runs, compare_metrics],
+                outputs=[metrics_plot, metrics_status],
+            )
+            demo.load(
+                fn=metric_choices,
+                inputs=[compare_runs, compare_metrics],
+                outputs=[compare_metrics],
+            ).then(
+                fn=plot_metrics,
+                inputs=[compare_runs, compare_metrics],
+                outputs=[metrics_plot, metrics_status],
+            )
             inspect_btn.click(
                 fn=inspect_run,
                 inputs=[run_dir],
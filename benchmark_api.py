@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Load-test server.py locally (fake blob backend) and write comparable JSON results.",
+    )
+    parser.add_argument("--images", required=True, help="Folder with the image corpus to replay.")
+    parser.add_argument("--model", default=".container_yolo26/model/best.pt", help="Path to the .pt checkpoint.")
+    parser.add_argument("--context-dir", default=".container_yolo26", help="Directory containing server.py.")
+    parser.add_argument("--port", type=int, default=18100)
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed loop: clients sending back-to-back.")
+    parser.add_argument("--rps", type=float, default=0.0, help="Open loop: fixed request rate (overrides --concurrency).")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds per configuration.")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before each measurement.")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640], help="Sweep: /predict imgsz values.")
+    parser.add_argument("--max-det", type=int, nargs="+", default=[1000], help="Sweep: /predict max_det values.")
+    parser.add_argument("--backend", nargs="+", default=["torch"], choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--batch-max-size", type=int, nargs="+", default=[8], help="Sweep: BATCH_MAX_SIZE.")
+    parser.add_argument("--batch-max-wait-ms", type=float, nargs="+", default=[10.0], help="Sweep: BATCH_MAX_WAIT_MS.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0], help="Sweep: INFERENCE_WORKERS (0 = auto).")
+    parser.add_argument("--blob-latency-ms", type=float, default=20.0, help="Simulated upload time of the fake blob backend.")
+    parser.add_argument("--env", action="append", default=[], help="Extra server env var KEY=VALUE (repeatable).")
+    parser.add_argument("--output", default="", help="JSON results path (default: bench_<commit>_<time>.json).")
+    parser.add_argument("--compare", default="", help="Earlier results JSON to compare against.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+class _FakeContainerClient:
+    # Stands in for the aio ContainerClient: uploads just take --blob-latency-ms.
+
+    def __init__(self, latency_s: float) -> None:
+        self.url = "http://fake-blob.invalid/aphid-images"
+        self.latency_s = latency_s
+
+    async def create_container(self) -> None:
+        return None
+
+    async def get_container_properties(self) -> dict[str, Any]:
+        return {}
+
+    async def upload_blob(self, name: str, data: bytes, **_: Any) -> None:
+        await asyncio.sleep(self.latency_s)
+
+
+class _FakeBlobService:
+    def __init__(self, latency_s: float) -> None:
+        self.latency_s = latency_s
+
+    def get_container_client(self, _: str) -> _FakeContainerClient:
+        return _FakeContainerClient(self.latency_s)
+
+    async def close(self) -> None:
+        return None
+
+
+def _serve(args: argparse.Namespace) -> None:
+    # Child process: server.py with the fake blob backend patched in.
+    sys.path.insert(0, str(Path(args.context_dir).resolve()))
+    import server
+    import uvicorn
+
+    server._create_blob_service = lambda: _FakeBlobService(args.blob_latency_ms / 1000.0)
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def _proc_sample(pid: int) -> dict[str, float]:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_s = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                status[key] = int(value.split()[0]) / 1024.0
+    return {"cpu_s": cpu_s, "rss_mib": status.get("VmRSS", 0.0), "peak_rss_mib": status.get("VmHWM", 0.0)}
+
+
+async def _wait_ready(session: Any, base_url: str, proc: subprocess.Popen, timeout: float = 600.0) -> None:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            async with session.get(f"{base_url}/ready") as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("Server did not become ready.")
+
+
+async def _run_load(
+    session: Any,
+    base_url: str,
+    corpus: list[tuple[str, bytes]],
+    params: dict[str, Any],
+    args: argparse.Namespace,
+    seconds: float,
+) -> dict[str, Any]:
+    import aiohttp
+
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    images = itertools.cycle(corpus)
+    deadline = time.perf_counter() + seconds
+
+    async def one() -> None:
+        name, raw = next(images)
+        form = aiohttp.FormData()
+        form.add_field("image", raw, filename=name, content_type="image/jpeg")
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{base_url}/predict", data=form, params=params) as response:
+                await response.read()
+                status = str(response.status)
+        except Exception as exc:
+            status = type(exc).__name__
+        if status == "200":
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    if args.rps > 0:
+        # Open loop: arrivals follow the schedule whether or not earlier
+        # requests finished, so queueing shows up as latency and 503s.
+        pending: set[asyncio.Task] = set()
+        interval = 1.0 / args.rps
+        next_at = started
+        while next_at < deadline:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            task = asyncio.create_task(one())
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            next_at += interval
+        if pending:
+            await asyncio.gather(*pending)
+    else:
+
+        async def client() -> None:
+            while time.perf_counter() < deadline:
+                await one()
+
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "statuses": statuses, "elapsed_s": elapsed}
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))], 2)
+
+
+async def _bench_server(
+    server_config: dict[str, Any],
+    query_configs: list[dict[str, Any]],
+    corpus: list[tuple[str, bytes]],
+    args: argparse.Namespace,
+) -> list[dict[str, Any]]:
+    import aiohttp
+
+    env = {
+        **os.environ,
+        "MODEL_PATH": str(Path(args.model).resolve()),
+        "MODEL_BACKEND": server_config["backend"],
+        "BATCH_MAX_SIZE": str(server_config["batch_max_size"]),
+        "BATCH_MAX_WAIT_MS": str(server_config["batch_max_wait_ms"]),
+        "INFERENCE_WORKERS": str(server_config["workers"]),
+        "BLOB_CONNECTION_STRING": "fake",
+        # Replaying a small corpus would otherwise measure the result cache.
+        "RESULT_CACHE_MAX_BYTES": "0",
+        "WARMUP_IMGSZ": ",".join(str(q["imgsz"]) for q in query_configs),
+        **dict(item.split("=", 1) for item in args.env),
+    }
+    cmd = [sys.executable, __file__, "--serve", "--images", args.images, "--context-dir", args.context_dir,
+           "--port", str(args.port), "--blob-latency-ms", str(args.blob_latency_ms)]
+    proc = subprocess.Popen(cmd, env=env)
+    base_url = f"http://127.0.0.1:{args.port}"
+    runs = []
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+            await _wait_ready(session, base_url, proc)
+            for query in query_configs:
+                params = {"conf": args.conf, "imgsz": query["imgsz"], "max_det": query["max_det"]}
+                if args.warmup > 0:
+                    await _run_load(session, base_url, corpus, params, args, args.warmup)
+                before = _proc_sample(proc.pid)
+                load = await _run_load(session, base_url, corpus, params, args, args.duration)
+                after = _proc_sample(proc.pid)
+                latencies = load["latencies"]
+                run = {
+                    "config": {**server_config, **query},
+                    "mode": f"rps={args.rps}" if args.rps > 0 else f"concurrency={args.concurrency}",
+                    "requests": sum(load["statuses"].values()),
+                    "statuses": load["statuses"],
+                    "images_per_s": round(len(latencies) / load["elapsed_s"], 2),
+                    "latency_ms": {
+                        "p50": _percentile(latencies, 50),
+                        "p95": _percentile(latencies, 95),
+                        "p99": _percentile(latencies, 99),
+                        "mean": round(statistics.fmean(latencies), 2) if latencies else None,
+                        "max": round(max(latencies), 2) if latencies else None,
+                    },
+                    "cpu_percent": round(100.0 * (after["cpu_s"] - before["cpu_s"]) / load["elapsed_s"], 1),
+                    "rss_mib": round(after["rss_mib"], 1),
+                    "peak_rss_mib": round(after["peak_rss_mib"], 1),
+                }
+                runs.append(run)
+                _print_run(run)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return runs
+
+
+def _config_key(config: dict[str, Any]) -> str:
+    return " ".join(f"{k}={config[k]}" for k in sorted(config))
+
+
+def _print_run(run: dict[str, Any]) -> None:
+    lat = run["latency_ms"]
+    print(
+        f"[run] {_config_key(run['config'])} {run['mode']}: {run['images_per_s']} img/s "
+        f"p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} ms cpu={run['cpu_percent']}% "
+        f"rss={run['rss_mib']} MiB statuses={run['statuses']}",
+        flush=True,
+    )
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "-C", str(Path(__file__).resolve().parent), "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(current: list[dict[str, Any]], baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    previous = {(_config_key(r["config"]), r["mode"]): r for r in baseline["runs"]}
+    print(f"[compare] against {baseline_path} (commit {baseline.get('commit')})")
+    for run in current:
+        old = previous.get((_config_key(run["config"]), run["mode"]))
+        if old is None:
+            print(f"  {_config_key(run['config'])} {run['mode']}: no baseline")
+            continue
+
+        def delta(new: float | None, before: float | None) -> str:
+            if new is None or before in (None, 0):
+                return "n/a"
+            return f"{before} -> {new} ({(new - before) / before * 100.0:+.1f}%)"
+
+        print(
+            f"  {_config_key(run['config'])}: img/s {delta(run['images_per_s'], old['images_per_s'])}, "
+            f"p95 {delta(run['latency_ms']['p95'], old['latency_ms']['p95'])}, "
+            f"p99 {delta(run['latency_ms']['p99'], old['latency_ms']['p99'])}"
+        )
+
+
+def main() -> None:
+    args = parse_args()
+    if args.serve:
+        _serve(args)
+        return
+
+    corpus = [
+        (p.name, p.read_bytes())
+        for p in sorted(Path(args.images).iterdir())
+        if p.suffix.lower() in IMAGE_SUFFIXES
+    ]
+    if not corpus:
+        raise FileNotFoundError(f"No images found in: {args.images}")
+
+    server_configs = [
+        {"backend": b, "batch_max_size": s, "batch_max_wait_ms": w, "workers": n}
+        for b, s, w, n in itertools.product(args.backend, args.batch_max_size, args.batch_max_wait_ms, args.workers)
+    ]
+    query_configs = [{"imgsz": i, "max_det": m} for i, m in itertools.product(args.imgsz, args.max_det)]
+
+    runs = []
+    for server_config in server_configs:
+        runs.extend(asyncio.run(_bench_server(server_config, query_configs, corpus, args)))
+
+    commit = _git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"platform": platform.platform(), "cpu_count": os.cpu_count(), "python": platform.python_version()},
+        "settings": {
+            "images": len(corpus),
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "conf": args.conf,
+            "blob_latency_ms": args.blob_latency_ms,
+        },
+        "runs": runs,
+    }
+    output = Path(args.output or f"bench_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"[ok] Results written to: {output.resolve()}")
+    if args.compare:
+        _compare(runs, Path(args.compare))
+
+
+if __name__ == "__main__":
+    main()
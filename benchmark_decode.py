@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare server.py's full decode path with the JPEG draft-mode fast path (time and peak RSS).",
+    )
+    parser.add_argument("--images", required=True, help="Folder with sample uploads (camera JPEGs).")
+    parser.add_argument("--model", default=".container_yolo26/model/best.pt", help="Path to the .pt checkpoint.")
+    parser.add_argument("--context-dir", default=".container_yolo26", help="Directory containing server.py.")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the image folder per path.")
+    parser.add_argument("--mode", choices=["full", "fast"], help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def _rss_kib() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def _run_mode(args: argparse.Namespace) -> dict[str, Any]:
+    # Runs in its own process so ru_maxrss only reflects one decode path.
+    os.environ["MODEL_PATH"] = str(Path(args.model))
+    sys.path.insert(0, str(Path(args.context_dir).resolve()))
+    server = importlib.import_module("server")
+    import numpy as np
+    from ultralytics.data.augment import LetterBox
+
+    payloads = [p.read_bytes() for p in sorted(Path(args.images).iterdir()) if p.suffix.lower() in IMAGE_SUFFIXES]
+    letterbox = LetterBox((args.imgsz, args.imgsz), auto=False)
+
+    def full(raw: bytes) -> None:
+        # What predict did before: native-resolution decode, then the RGB->BGR
+        # copy and letterbox ultralytics applies to PIL input.
+        img = server._decode_image(raw)
+        letterbox(image=np.ascontiguousarray(np.asarray(img)[:, :, ::-1]))
+
+    def fast(raw: bytes) -> None:
+        prepared = server._prepare_image(raw, args.imgsz)
+        server.letterbox_pool.release(prepared.array)
+
+    decode = full if args.mode == "full" else fast
+    decode(payloads[0])
+    baseline = _rss_kib()
+    timings = []
+    for _ in range(args.repeat):
+        for raw in payloads:
+            started = time.perf_counter()
+            decode(raw)
+            timings.append((time.perf_counter() - started) * 1000.0)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings.sort()
+    return {
+        "mode": args.mode,
+        "images": len(payloads),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "peak_rss_mib": round(peak / 1024, 1),
+        "peak_over_baseline_mib": round(max(0, peak - baseline) / 1024, 1),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    if args.mode:
+        print(json.dumps(_run_mode(args)))
+        return
+
+    image_dir = Path(args.images)
+    if not any(p.suffix.lower() in IMAGE_SUFFIXES for p in image_dir.iterdir()):
+        raise FileNotFoundError(f"No images found in: {image_dir}")
+
+    reports = {}
+    for mode in ("full", "fast"):
+        cmd = [sys.executable, __file__, *sys.argv[1:], "--mode", mode]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        reports[mode] = json.loads(out.strip().splitlines()[-1])
+        r = reports[mode]
+        print(
+            f"[{mode}] {r['images']} images x {args.repeat}: mean={r['mean_ms']} ms p50={r['p50_ms']} ms "
+            f"p95={r['p95_ms']} ms peak RSS={r['peak_rss_mib']} MiB (+{r['peak_over_baseline_mib']} MiB)"
+        )
+
+    full, fast = reports["full"], reports["fast"]
+    speedup = full["mean_ms"] / fast["mean_ms"] if fast["mean_ms"] else float("inf")
+    print(
+        f"[ok] fast path: {speedup:.2f}x decode speedup, "
+        f"peak RSS {full['peak_rss_mib']} -> {fast['peak_rss_mib']} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import hashlib
+import itertools
+import json
+import platform
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+from model_quantization import (
+    iter_images,
+    latency_stats,
+    list_images,
+    mean_average_precision,
+    onnx_detector,
+    read_yolo_labels,
+)
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_CACHE_DIR = BASE_DIR / "model_benchmarks"
+BACKENDS = ("torch", "onnx")
+DEVICES = ("cpu", "gpu")
+# mAP is scored on a low-confidence pass, as ultralytics val does; latency and
+# count MAE use the deployment conf.
+MAP_CONF = 0.001
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark .pt checkpoints on a labeled folder for latency, throughput, memory, count MAE and mAP.",
+    )
+    parser.add_argument("--images", required=True, help="Validation images with YOLO labels (labels/ dir or next to images).")
+    parser.add_argument("--models", nargs="+", default=[], help="Checkpoints to compare (default: *.pt and runs/**/weights/*.pt).")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640])
+    parser.add_argument("--device", nargs="+", default=["cpu"], choices=DEVICES)
+    parser.add_argument("--backend", nargs="+", default=["torch"], choices=BACKENDS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8], help="Throughput batch sizes (torch backend).")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--max-det", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=0, help="Use only the first N images (0 = all).")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Per-model result cache and ONNX exports.")
+    parser.add_argument("--no-cache", action="store_true", help="Re-measure even when a cached result matches.")
+    parser.add_argument("--output", default="", help="Write the result rows as JSON to this path.")
+    return parser.parse_args()
+
+
+def discover_models(base_dir: Path) -> list[Path]:
+    models = list(base_dir.glob("*.pt"))
+    models.extend(base_dir.glob("runs/**/weights/best.pt"))
+    models.extend(base_dir.glob("runs/**/weights/last.pt"))
+    return sorted(set(models), key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+class ResultCache:
+    # One JSON file per checkpoint content hash. Hashes are remembered per
+    # (path, size, mtime) so unchanged multi-MB checkpoints are not re-read.
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.dir = cache_dir
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._hash_path = self.dir / "hashes.json"
+        self._hashes: dict[str, str] = {}
+        if self._hash_path.exists():
+            self._hashes = json.loads(self._hash_path.read_text(encoding="utf-8"))
+
+    def model_hash(self, path: Path) -> str:
+        st = path.stat()
+        key = f"{path.resolve()}|{st.st_size}|{st.st_mtime_ns}"
+        digest = self._hashes.get(key)
+        if digest is None:
+            h = hashlib.sha256()
+            with path.open("rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()[:16]
+            self._hashes[key] = digest
+            self._hash_path.write_text(json.dumps(self._hashes, indent=2), encoding="utf-8")
+        return digest
+
+    def _path(self, model_hash: str) -> Path:
+        return self.dir / f"{model_hash}.json"
+
+    def get(self, model_hash: str, config_key: str) -> dict[str, Any] | None:
+        path = self._path(model_hash)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8")).get(config_key)
+
+    def put(self, model_hash: str, config_key: str, row: dict[str, Any]) -> None:
+        path = self._path(model_hash)
+        entries = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        entries[config_key] = row
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, indent=2), encoding="utf-8")
+        tmp.replace(path)
+
+    def onnx_export(self, model_path: Path, model_hash: str) -> Path:
+        # Export a private copy so nothing is written next to the run's weights.
+        target = self.dir / "exports" / f"{model_hash}.onnx"
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            staged = target.with_suffix(".pt")
+            shutil.copy2(model_path, staged)
+            exported = Path(YOLO(str(staged)).export(format="onnx", dynamic=True, verbose=False))
+            exported.replace(target)
+            staged.unlink(missing_ok=True)
+        return target
+
+
+def load_dataset(images_dir: Path, limit: int) -> tuple[list[Path], str]:
+    # Only paths and a fingerprint are kept; images are decoded again in each
+    # pass, so memory does not grow with the size of the validation set.
+    # Labels are read with shape (1, 1), i.e. still normalised, which is enough
+    # for the fingerprint without decoding the image.
+    paths = list_images(images_dir, limit)
+    fingerprint = hashlib.sha256()
+    labeled = 0
+    for path in paths:
+        label = read_yolo_labels(path, (1, 1))
+        labeled += label is not None
+        st = path.stat()
+        fingerprint.update(f"{path}|{st.st_size}|{st.st_mtime_ns}".encode())
+        if label is not None:
+            fingerprint.update(label.tobytes())
+    if not labeled:
+        raise FileNotFoundError(f"No YOLO label files found for images in: {images_dir}")
+    return paths, fingerprint.hexdigest()[:16]
+
+
+def _image_batches(paths: list[Path], size: int) -> Iterator[list[np.ndarray]]:
+    batch: list[np.ndarray] = []
+    for _, image in iter_images(paths):
+        batch.append(image)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _pixel_labels(path: Path, image: np.ndarray) -> np.ndarray:
+    # Images without a label file are background (no objects), as in YOLO val.
+    label = read_yolo_labels(path, image.shape[:2])
+    return np.zeros((0, 5), dtype=np.float32) if label is None else label
+
+
+def _torch_device(device: str) -> int | str:
+    return 0 if device == "gpu" else "cpu"
+
+
+def _torch_detector(model: YOLO, imgsz: int, device: str, conf: float, iou: float, max_det: int):
+    def detect(batch: list[np.ndarray]) -> list[np.ndarray]:
+        results = model.predict(
+            source=batch,
+            imgsz=imgsz,
+            conf=conf,
+            iou=iou,
+            max_det=max_det,
+            device=_torch_device(device),
+            batch=len(batch),
+            verbose=False,
+        )
+        out = []
+        for result in results:
+            boxes = result.boxes
+            out.append(
+                np.concatenate(
+                    [
+                        boxes.xyxy.cpu().numpy(),
+                        boxes.conf.cpu().numpy()[:, None],
+                        boxes.cls.cpu().numpy()[:, None],
+                    ],
+                    axis=1,
+                )
+            )
+        return out
+
+    return detect
+
+
+def _build_detector(
+    backend: str,
+    model_path: Path,
+    onnx_path: Path | None,
+    imgsz: int,
+    device: str,
+    conf: float,
+    iou: float,
+    max_det: int,
+):
+    model = YOLO(str(model_path))
+    if backend == "torch":
+        return _torch_detector(model, imgsz, device, conf, iou, max_det)
+    stride = int(model.model.stride.max())
+    end2end = bool(getattr(model.model.model[-1], "end2end", False))
+    single = onnx_detector(onnx_path, imgsz, stride, end2end, conf, iou, max_det)
+    return lambda batch: [single(image) for image in batch]
+
+
+def _reset_peak_memory(device: str) -> None:
+    gc.collect()
+    if device == "gpu":
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats()
+        return
+    try:
+        # Linux: writing 5 resets VmHWM (peak RSS) for this process.
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def _peak_memory_mb(device: str) -> float | None:
+    if device == "gpu":
+        return round(torch.cuda.max_memory_allocated() / 2**20, 1)
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _measure(
+    detector,
+    paths: list[Path],
+    batch_sizes: list[int],
+    warmup: int,
+) -> tuple[list[np.ndarray], list[np.ndarray], dict[str, float], dict[str, float]]:
+    # Decoding happens outside the timed calls.
+    for _, image in itertools.islice(iter_images(paths), warmup):
+        detector([image])
+    dets: list[np.ndarray] = []
+    labels: list[np.ndarray] = []
+    latencies: list[float] = []
+    for path, image in iter_images(paths):
+        started = time.perf_counter()
+        dets.extend(detector([image]))
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        labels.append(_pixel_labels(path, image))
+    stats = latency_stats(latencies)
+    stats["p99_ms"] = round(float(np.percentile(latencies, 99)), 3)
+    throughput = {"ips_b1": round(1000.0 * len(latencies) / sum(latencies), 2)}
+    for size in batch_sizes:
+        if size <= 1:
+            continue
+        busy = 0.0
+        done = 0
+        for i, batch in enumerate(_image_batches(paths, size)):
+            if i == 0:
+                detector(batch)
+            started = time.perf_counter()
+            detector(batch)
+            busy += time.perf_counter() - started
+            done += len(batch)
+        throughput[f"ips_b{size}"] = round(done / busy, 2) if busy else 0.0
+    return dets, labels, stats, throughput
+
+
+def _accuracy(dets: list[np.ndarray], labels: list[np.ndarray], map_dets: list[np.ndarray]) -> dict[str, float]:
+    counts = np.array([len(d) for d in dets])
+    truth = np.array([len(label) for label in labels])
+    scores = mean_average_precision(map_dets, labels)
+    return {
+        "count_mae": round(float(np.abs(counts - truth).mean()), 4),
+        "map50": round(scores["map50"], 4),
+        "map50_95": round(scores["map50_95"], 4),
+    }
+
+
+def mark_pareto(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # Per device: a row is on the front when no other row is at least as fast
+    # (p95) and at least as accurate (mAP50-95) while strictly better in one.
+    scored = [r for r in rows if r.get("p95_ms") is not None and r.get("map50_95") is not None]
+    for row in rows:
+        row["pareto"] = False
+    for row in scored:
+        row["pareto"] = not any(
+            other is not row
+            and other["device"] == row["device"]
+            and other["p95_ms"] <= row["p95_ms"]
+            and other["map50_95"] >= row["map50_95"]
+            and (other["p95_ms"] < row["p95_ms"] or other["map50_95"] > row["map50_95"])
+            for other in scored
+        )
+    return sorted(rows, key=lambda r: (r["device"], not r["pareto"], r.get("p95_ms") or float("inf")))
+
+
+def run_benchmarks(
+    models: list[Path],
+    images_dir: Path,
+    imgsz_values: list[int],
+    devices: list[str],
+    backends: list[str],
+    batch_sizes: list[int],
+    conf: float,
+    iou: float,
+    max_det: int,
+    limit: int = 0,
+    warmup: int = 3,
+    cache_dir: Path = DEFAULT_CACHE_DIR,
+    use_cache: bool = True,
+) -> Iterator[dict[str, Any]]:
+    # Yields one row per (model, backend, device, imgsz) as soon as it is
+    # measured or found in the cache.
+    cache = ResultCache(cache_dir)
+    paths, dataset = load_dataset(images_dir, limit)
+    env = {
+        "host": platform.node(),
+        "torch": torch.__version__,
+        "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else "",
+    }
+    for model_path, backend, device, imgsz in itertools.product(models, backends, devices, imgsz_values):
+        row: dict[str, Any] = {
+            "model": str(model_path),
+            "backend": backend,
+            "device": device,
+            "imgsz": imgsz,
+            "images": len(paths),
+            "cached": False,
+        }
+        if model_path.suffix != ".pt":
+            row["error"] = "only .pt checkpoints are supported"
+            yield row
+            continue
+        if device == "gpu" and not torch.cuda.is_available():
+            row["error"] = "CUDA is not available"
+            yield row
+            continue
+        if backend == "onnx" and device == "gpu":
+            row["error"] = "onnx backend runs on CPU only"
+            yield row
+            continue
+
+        model_hash = cache.model_hash(model_path)
+        row["model_sha"] = model_hash
+        config = {
+            "backend": backend,
+            "device": device,
+            "imgsz": imgsz,
+            "batch_sizes": sorted(batch_sizes) if backend == "torch" else [1],
+            "conf": conf,
+            "iou": iou,
+            "max_det": max_det,
+            "map_conf": MAP_CONF,
+            "dataset": dataset,
+            **env,
+        }
+        config_key = json.dumps(config, sort_keys=True)
+        cached = cache.get(model_hash, config_key) if use_cache else None
+        if cached is not None:
+            yield {**cached, "model": str(model_path), "cached": True}
+            continue
+
+        try:
+            onnx_path = cache.onnx_export(model_path, model_hash) if backend == "onnx" else None
+            _reset_peak_memory(device)
+            detector = _build_detector(backend, model_path, onnx_path, imgsz, device, conf, iou, max_det)
+            dets, labels, latency, throughput = _measure(detector, paths, config["batch_sizes"], warmup)
+            row["peak_mem_mb"] = _peak_memory_mb(device)
+            row["images"] = len(dets)
+            map_detector = _build_detector(backend, model_path, onnx_path, imgsz, device, MAP_CONF, iou, max_det)
+            map_dets = [det for _, image in iter_images(paths) for det in map_detector([image])]
+            row.update(latency)
+            row.update(throughput)
+            row.update(_accuracy(dets, labels, map_dets))
+        except Exception as exc:
+            row["error"] = str(exc)
+            yield row
+            continue
+        finally:
+            detector = map_detector = None
+            gc.collect()
+        cache.put(model_hash, config_key, row)
+        yield row
+
+
+def _print_table(rows: list[dict[str, Any]]) -> None:
+    header = f"{'':2}{'model':48} {'backend':7} {'dev':4} {'imgsz':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'img/s':>8} {'mem MB':>8} {'MAE':>7} {'mAP50':>6} {'mAP':>6}"
+    print(header)
+    for r in rows:
+        if "error" in r:
+            print(f"  {r['model'][-48:]:48} {r['backend']:7} {r['device']:4} {r['imgsz']:>5}  {r['error']}")
+            continue
+        best_ips = max(v for k, v in r.items() if k.startswith("ips_b"))
+        mem = "-" if r.get("peak_mem_mb") is None else f"{r['peak_mem_mb']:.0f}"
+        print(
+            f"{'*' if r['pareto'] else ' ':2}{r['model'][-48:]:48} {r['backend']:7} {r['device']:4} {r['imgsz']:>5} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {best_ips:>8.1f} {mem:>8} "
+            f"{r['count_mae']:>7.2f} {r['map50']:>6.3f} {r['map50_95']:>6.3f}"
+        )
+    print("* = Pareto front per device (p95 latency vs mAP50-95)")
+
+
+def main() -> None:
+    args = parse_args()
+    models = [Path(m) for m in args.models] or discover_models(BASE_DIR)
+    if not models:
+        raise FileNotFoundError("No checkpoints given and none found under runs/.")
+
+    rows = []
+    for row in run_benchmarks(
+        models=models,
+        images_dir=Path(args.images),
+        imgsz_values=args.imgsz,
+        devices=args.device,
+        backends=args.backend,
+        batch_sizes=args.batch_sizes,
+        conf=args.conf,
+        iou=args.iou,
+        max_det=args.max_det,
+        limit=args.limit,
+        warmup=args.warmup,
+        cache_dir=Path(args.cache_dir),
+        use_cache=not args.no_cache,
+    ):
+        status = "fail" if "error" in row else ("cached" if row["cached"] else "ok")
+        print(f"[{status}] {row['model']} {row['backend']}/{row['device']}/{row['imgsz']}")
+        rows.append(row)
+
+    rows = mark_pareto(rows)
+    _print_table(rows)
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+        print(f"[ok] Results written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
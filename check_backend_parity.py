@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare ONNX/OpenVINO backend detections against the PyTorch backend of server.py.",
+    )
+    parser.add_argument("--model", default=".container_yolo26/model/best.pt", help="Path to the .pt checkpoint.")
+    parser.add_argument("--images", default="", help="Folder with fixture images (default: generated frames).")
+    parser.add_argument("--context-dir", default=".container_yolo26", help="Directory containing server.py.")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "openvino"], choices=["onnx", "openvino"])
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--max-det", type=int, default=1000)
+    parser.add_argument("--box-tol", type=float, default=2.0, help="Max per-coordinate box difference in pixels.")
+    parser.add_argument("--count-tol", type=int, default=0, help="Allowed per-image count difference.")
+    return parser.parse_args()
+
+
+def _load_server(context_dir: Path, model_path: Path) -> Any:
+    os.environ["MODEL_PATH"] = str(model_path)
+    os.environ["MODEL_BACKEND"] = "torch"
+    sys.path.insert(0, str(context_dir.resolve()))
+    return importlib.import_module("server")
+
+
+def synthetic_frames(count: int = 6, size: int = 640, seed: int = 0) -> list[Any]:
+    # Deterministic stand-ins for field shots: a noisy green leaf with small
+    # dark ellipses, so runs need no fixture folder.
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        base = np.array([60, 140, 70], dtype=np.int16) + rng.integers(0, 30, (size, size, 3))
+        image = Image.fromarray(base.clip(0, 255).astype(np.uint8))
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = rng.integers(20, size - 20, 2)
+            rx, ry = rng.integers(4, 12), rng.integers(3, 8)
+            draw.ellipse((x - rx, y - ry, x + rx, y + ry), fill=(40, 60, 30))
+        frames.append(image)
+    return frames
+
+
+def _match_boxes(ref: list[dict[str, Any]], other: list[dict[str, Any]]) -> float:
+    # Greedy nearest match per reference box; returns the worst coordinate delta.
+    remaining = list(other)
+    worst = 0.0
+    for det in sorted(ref, key=lambda d: -(d["confidence"] or 0.0)):
+        candidates = [d for d in remaining if d["class_id"] == det["class_id"]]
+        if not candidates:
+            return float("inf")
+        best = min(candidates, key=lambda d: max(abs(a - b) for a, b in zip(det["bbox_xyxy"], d["bbox_xyxy"])))
+        remaining.remove(best)
+        worst = max(worst, max(abs(a - b) for a, b in zip(det["bbox_xyxy"], best["bbox_xyxy"])))
+    return worst
+
+
+def _detect(server: Any, model: Any, image: Any, conf: float, iou: float, imgsz: int, max_det: int) -> list[dict[str, Any]]:
+    results = model.predict(
+        source=image,
+        conf=conf,
+        iou=iou,
+        imgsz=imgsz,
+        max_det=max_det,
+        device="cpu",
+        verbose=False,
+    )
+    return server._result_to_detections(results[0])
+
+
+def compare_backends(
+    server: Any,
+    model_path: Path,
+    images: list[tuple[str, Any]],
+    backends: list[str],
+    conf: float = 0.25,
+    iou: float = 0.45,
+    imgsz: int = 640,
+    max_det: int = 1000,
+    box_tol: float = 2.0,
+    count_tol: int = 0,
+) -> list[dict[str, Any]]:
+    # One row per (backend, image) against the torch backend of the same
+    # checkpoint. images are (name, PIL RGB image) pairs.
+    torch_model = server.load_model("torch", model_path)
+    reference = [_detect(server, torch_model, img, conf, iou, imgsz, max_det) for _, img in images]
+
+    rows = []
+    for backend in backends:
+        backend_model = server.load_model(backend, model_path)
+        for (name, img), ref in zip(images, reference):
+            dets = _detect(server, backend_model, img, conf, iou, imgsz, max_det)
+            count_delta = abs(len(dets) - len(ref))
+            box_delta = _match_boxes(ref, dets) if count_delta == 0 else float("nan")
+            rows.append(
+                {
+                    "backend": backend,
+                    "image": name,
+                    "torch_count": len(ref),
+                    "count": len(dets),
+                    "box_delta": box_delta,
+                    "ok": count_delta <= count_tol and (count_delta > 0 or box_delta <= box_tol),
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    args = parse_args()
+    if args.images:
+        image_dir = Path(args.images)
+        paths = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        if not paths:
+            raise FileNotFoundError(f"No fixture images found in: {image_dir}")
+        from PIL import Image
+
+        images = [(p.name, Image.open(p).convert("RGB")) for p in paths]
+    else:
+        images = [(f"synthetic_{i}", img) for i, img in enumerate(synthetic_frames(size=args.imgsz))]
+
+    server = _load_server(Path(args.context_dir), Path(args.model))
+    rows = compare_backends(
+        server,
+        Path(args.model),
+        images,
+        args.backends,
+        conf=args.conf,
+        iou=args.iou,
+        imgsz=args.imgsz,
+        max_det=args.max_det,
+        box_tol=args.box_tol,
+        count_tol=args.count_tol,
+    )
+    failed = False
+    for row in rows:
+        failed = failed or not row["ok"]
+        print(
+            f"[{'ok' if row['ok'] else 'FAIL'}] {row['backend']} {row['image']}: "
+            f"count torch={row['torch_count']} {row['backend']}={row['count']}, max box delta={row['box_delta']:.3f}px"
+        )
+
+    if failed:
+        print("[fail] Backend detections diverge from the PyTorch backend.")
+        raise SystemExit(1)
+    print("[ok] All backends match the PyTorch backend.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import requests
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure time-to-first-prediction of the inference server from a cold start.",
+    )
+    parser.add_argument("--sample", required=True, help="Image sent as the first /predict request.")
+    parser.add_argument("--image", help="Docker image of the generated container; omit to run server.py locally.")
+    parser.add_argument("--context-dir", default=".container_yolo26", help="Directory containing server.py (local mode).")
+    parser.add_argument("--model", default="", help="MODEL_PATH for local mode (default: <context-dir>/model/best.pt).")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--env", action="append", default=[], help="Extra server env var KEY=VALUE (repeatable).")
+    parser.add_argument("--runs", type=int, default=1, help="Cold starts to measure.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for the server per run.")
+    parser.add_argument(
+        "--no-wait-ready",
+        action="store_true",
+        help="Send the first request as soon as /health answers instead of waiting for /ready.",
+    )
+    return parser.parse_args()
+
+
+def _start_server(args: argparse.Namespace, log_lines: list[str]) -> Any:
+    env_pairs = [item.split("=", 1) for item in args.env]
+    if args.image:
+        cmd = ["docker", "run", "--rm", "-d", "-p", f"{args.port}:8000"]
+        for key, value in env_pairs:
+            cmd += ["-e", f"{key}={value}"]
+        container_id = subprocess.run([*cmd, args.image], check=True, capture_output=True, text=True).stdout.strip()
+        return container_id
+
+    context_dir = Path(args.context_dir).resolve()
+    env = {**os.environ, "MODEL_PATH": args.model or str(context_dir / "model" / "best.pt"), **dict(env_pairs)}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--app-dir", str(context_dir), "--port", str(args.port)],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+
+    def drain() -> None:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            log_lines.append(line.rstrip())
+
+    threading.Thread(target=drain, daemon=True).start()
+    return proc
+
+
+def _stop_server(handle: Any, log_lines: list[str]) -> None:
+    if isinstance(handle, str):
+        logs = subprocess.run(["docker", "logs", handle], capture_output=True, text=True)
+        log_lines.extend((logs.stdout + logs.stderr).splitlines())
+        subprocess.run(["docker", "stop", handle], capture_output=True)
+        return
+    handle.terminate()
+    try:
+        handle.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        handle.kill()
+
+
+def _wait_for(url: str, started: float, timeout: float) -> float | None:
+    # Seconds since `started` until `url` answers 200; None if it 404s (an
+    # older server without that endpoint).
+    while time.perf_counter() - started < timeout:
+        try:
+            response = requests.get(url, timeout=2)
+            if response.status_code == 200:
+                return time.perf_counter() - started
+            if response.status_code == 404:
+                return None
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+
+
+def _predict(base_url: str, sample: Path) -> float:
+    started = time.perf_counter()
+    with sample.open("rb") as f:
+        response = requests.post(
+            f"{base_url}/predict",
+            files={"image": (sample.name, f, "image/jpeg")},
+            timeout=120,
+        )
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def _measure(args: argparse.Namespace, sample: Path) -> dict[str, Any]:
+    base_url = f"http://127.0.0.1:{args.port}"
+    log_lines: list[str] = []
+    started = time.perf_counter()
+    handle = _start_server(args, log_lines)
+    try:
+        live_s = _wait_for(f"{base_url}/health", started, args.timeout)
+        ready_s = None if args.no_wait_ready else _wait_for(f"{base_url}/ready", started, args.timeout)
+        first_s = _predict(base_url, sample)
+        ttfp_s = time.perf_counter() - started
+        second_s = _predict(base_url, sample)
+    finally:
+        _stop_server(handle, log_lines)
+    return {
+        "live_s": live_s,
+        "ready_s": ready_s,
+        "first_predict_s": first_s,
+        "second_predict_s": second_s,
+        "ttfp_s": ttfp_s,
+        "timeline": [line for line in log_lines if line.startswith("[startup]")],
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    sample = Path(args.sample)
+    if not sample.is_file():
+        raise FileNotFoundError(f"Sample image not found: {sample}")
+
+    runs = []
+    for index in range(args.runs):
+        run = _measure(args, sample)
+        runs.append(run)
+        ready = f"{run['ready_s']:.2f}s" if run["ready_s"] is not None else "n/a"
+        print(
+            f"[run {index + 1}] live={run['live_s']:.2f}s ready={ready} "
+            f"first /predict={run['first_predict_s'] * 1000:.0f} ms "
+            f"second /predict={run['second_predict_s'] * 1000:.0f} ms "
+            f"time-to-first-prediction={run['ttfp_s']:.2f}s"
+        )
+        for line in run["timeline"]:
+            print(f"    {line}")
+
+    if len(runs) > 1:
+        ttfp = statistics.median(r["ttfp_s"] for r in runs)
+        first = statistics.median(r["first_predict_s"] for r in runs)
+        print(f"[ok] median time-to-first-prediction={ttfp:.2f}s, median first /predict={first * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import itertools
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import cv2
+import numpy as np
+import onnx
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quant_pre_process,
+    quantize_static,
+)
+from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+from ultralytics.utils import ops
+
+try:
+    from ultralytics.utils.nms import non_max_suppression
+except ImportError:  # older ultralytics keeps NMS in ops
+    from ultralytics.utils.ops import non_max_suppression
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_POINTS = np.linspace(0.0, 1.0, 101)
+# mAP needs the full PR curve, so it is scored on a low-confidence pass (as
+# ultralytics val does); counts and latency use the deployment conf.
+MAP_CONF = 0.001
+
+Detector = Callable[[np.ndarray], np.ndarray]
+
+
+def list_images(folder: Path, limit: int = 0) -> list[Path]:
+    images = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not images:
+        raise FileNotFoundError(f"No images found in: {folder}")
+    return images[:limit] if limit > 0 else images
+
+
+def iter_images(paths: list[Path]) -> Iterator[tuple[Path, np.ndarray]]:
+    # Decodes one image at a time; unreadable files are skipped.
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is not None:
+            yield path, image
+
+
+def read_yolo_labels(image_path: Path, shape: tuple[int, int]) -> np.ndarray | None:
+    # Ultralytics dataset layout: .../images/x.jpg -> .../labels/x.txt, or a
+    # label file next to the image. Returns (n, 5) [cls, x1, y1, x2, y2] in pixels.
+    parts = list(image_path.parts)
+    candidates = [image_path.with_suffix(".txt")]
+    if "images" in parts:
+        idx = len(parts) - 1 - parts[::-1].index("images")
+        parts[idx] = "labels"
+        candidates.insert(0, Path(*parts).with_suffix(".txt"))
+    for label_path in candidates:
+        if label_path.exists():
+            rows = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+            if rows.size == 0:
+                return np.zeros((0, 5), dtype=np.float32)
+            h, w = shape
+            xyxy = ops.xywhn2xyxy(rows[:, 1:5], w=w, h=h)
+            return np.concatenate([rows[:, :1], xyxy], axis=1)
+    return None
+
+
+def preprocess(image_bgr: np.ndarray, imgsz: int, stride: int) -> np.ndarray:
+    letterboxed = LetterBox((imgsz, imgsz), auto=False, stride=stride)(image=image_bgr)
+    chw = letterboxed[..., ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(chw[None], dtype=np.float32) / 255.0
+
+
+def onnx_detector(
+    model_path: Path,
+    imgsz: int,
+    stride: int,
+    end2end: bool,
+    conf: float,
+    iou: float,
+    max_det: int,
+) -> Detector:
+    # Same pre/post-processing as the onnx backend in server.py, returning
+    # (n, 6) [x1, y1, x2, y2, conf, cls] in original image pixels.
+    session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+
+    def detect(image_bgr: np.ndarray) -> np.ndarray:
+        batch = preprocess(image_bgr, imgsz, stride)
+        preds = torch.from_numpy(session.run(None, {input_name: batch})[0])
+        if end2end:
+            det = preds[0][preds[0][:, 4] > conf][:max_det]
+        else:
+            det = non_max_suppression(preds, conf, iou, max_det=max_det)[0]
+        det[:, :4] = ops.scale_boxes(batch.shape[2:], det[:, :4], image_bgr.shape)
+        return det.numpy()
+
+    return detect
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_detections(pred: np.ndarray, truth: np.ndarray) -> np.ndarray:
+    # Greedy highest-confidence-first matching per IoU threshold, same class only.
+    # Returns (n_pred, n_thresholds) bool true-positive matrix.
+    tp = np.zeros((len(pred), len(IOU_THRESHOLDS)), dtype=bool)
+    if len(pred) == 0 or len(truth) == 0:
+        return tp
+    iou = box_iou(pred[:, :4], truth[:, 1:5])
+    iou[pred[:, 5][:, None] != truth[:, 0][None, :]] = 0.0
+    order = np.argsort(-pred[:, 4])
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        taken = np.zeros(len(truth), dtype=bool)
+        for i in order:
+            candidates = np.where((iou[i] >= threshold) & ~taken)[0]
+            if len(candidates):
+                j = candidates[np.argmax(iou[i, candidates])]
+                taken[j] = True
+                tp[i, t] = True
+    return tp
+
+
+def _interpolated_ap(recall: np.ndarray, precision: np.ndarray) -> float:
+    if len(recall) == 0:
+        return 0.0
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    idx = np.searchsorted(recall, RECALL_POINTS, side="left")
+    values = np.where(idx < len(envelope), envelope[np.minimum(idx, len(envelope) - 1)], 0.0)
+    return float(values.mean())
+
+
+def mean_average_precision(
+    preds: list[np.ndarray],
+    truths: list[np.ndarray],
+) -> dict[str, float]:
+    # COCO-style 101-point interpolated AP, averaged over classes present in truth.
+    tps = [match_detections(p, t) for p, t in zip(preds, truths)]
+    all_tp = np.concatenate(tps) if tps else np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool)
+    all_conf = np.concatenate([p[:, 4] for p in preds]) if preds else np.zeros(0)
+    all_cls = np.concatenate([p[:, 5] for p in preds]) if preds else np.zeros(0)
+    truth_cls = np.concatenate([t[:, 0] for t in truths]) if truths else np.zeros(0)
+
+    ap = []
+    for cls_id in np.unique(truth_cls):
+        n_truth = int((truth_cls == cls_id).sum())
+        mask = all_cls == cls_id
+        order = np.argsort(-all_conf[mask])
+        tp = all_tp[mask][order].astype(np.float64)
+        tpc = tp.cumsum(axis=0)
+        fpc = (1.0 - tp).cumsum(axis=0)
+        recall = tpc / max(n_truth, 1)
+        precision = tpc / np.maximum(tpc + fpc, 1e-9)
+        ap.append([_interpolated_ap(recall[:, t], precision[:, t]) for t in range(len(IOU_THRESHOLDS))])
+
+    if not ap:
+        return {"map50": float("nan"), "map50_95": float("nan")}
+    ap_arr = np.asarray(ap)
+    return {"map50": float(ap_arr[:, 0].mean()), "map50_95": float(ap_arr.mean())}
+
+
+def latency_stats(latencies_ms: list[float]) -> dict[str, float]:
+    arr = np.asarray(latencies_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+    }
+
+
+class _LetterboxCalibrationReader(CalibrationDataReader):
+    def __init__(self, images: list[Path], input_name: str, imgsz: int, stride: int) -> None:
+        self._images = iter(images)
+        self._input_name = input_name
+        self._imgsz = imgsz
+        self._stride = stride
+
+    def get_next(self) -> dict[str, np.ndarray] | None:
+        for path in self._images:
+            image = cv2.imread(str(path))
+            if image is not None:
+                return {self._input_name: preprocess(image, self._imgsz, self._stride)}
+        return None
+
+
+def quantize_int8(
+    fp32_path: Path,
+    int8_path: Path,
+    calib_images: list[Path],
+    imgsz: int,
+    stride: int,
+    exclude_prefixes: list[str],
+) -> Path:
+    # Static QDQ quantization: int8 per-channel weights, uint8 activations.
+    # Nodes under exclude_prefixes (the detect head) stay FP32 because box
+    # regression and class scores lose the most accuracy when quantized.
+    prepared = int8_path.with_name(f"{fp32_path.stem}_prep.onnx")
+    # Symbolic shape inference cannot resolve the dynamic H/W axes of the export.
+    quant_pre_process(str(fp32_path), str(prepared), skip_symbolic_shape=True)
+    input_name = ort.InferenceSession(str(prepared), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    nodes = [n.name for n in onnx.load(str(prepared)).graph.node]
+    excluded = [name for name in nodes if any(name.startswith(prefix) for prefix in exclude_prefixes)]
+    quantize_static(
+        str(prepared),
+        str(int8_path),
+        _LetterboxCalibrationReader(calib_images, input_name, imgsz, stride),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=excluded,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+    prepared.unlink(missing_ok=True)
+    return int8_path
+
+
+def _time_detector(detector: Detector, paths: list[Path], warmup: int) -> tuple[list[np.ndarray], list[float]]:
+    # Images are decoded outside the timed call, one at a time.
+    for _, image in itertools.islice(iter_images(paths), warmup):
+        detector(image)
+    dets: list[np.ndarray] = []
+    latencies: list[float] = []
+    for _, image in iter_images(paths):
+        started = time.perf_counter()
+        dets.append(detector(image))
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    return dets, latencies
+
+
+def evaluate_int8(
+    fp32_detector: Detector,
+    int8_detector: Detector,
+    eval_images: list[Path],
+    warmup: int = 3,
+    fp32_map_detector: Detector | None = None,
+    int8_map_detector: Detector | None = None,
+) -> dict[str, Any]:
+    # With YOLO labels next to every image, both models are scored against
+    # them; otherwise FP32 detections act as the reference for INT8. The
+    # *_map_detector pair (MAP_CONF) is used for mAP; without it mAP is
+    # scored on the deployment-conf detections. Only paths are kept: each pass
+    # decodes the images again, so memory does not grow with the eval set.
+    fp32_dets, fp32_lat = _time_detector(fp32_detector, eval_images, warmup)
+    int8_dets, int8_lat = _time_detector(int8_detector, eval_images, warmup)
+    fp32_counts = np.array([len(d) for d in fp32_dets])
+    int8_counts = np.array([len(d) for d in int8_dets])
+
+    labels: list[np.ndarray | None] = []
+    fp32_map_dets: list[np.ndarray] = []
+    int8_map_dets: list[np.ndarray] = []
+    for path, image in iter_images(eval_images):
+        labels.append(read_yolo_labels(path, image.shape[:2]))
+        if fp32_map_detector is not None:
+            fp32_map_dets.append(fp32_map_detector(image))
+        if int8_map_detector is not None:
+            int8_map_dets.append(int8_map_detector(image))
+    fp32_map_dets = fp32_map_dets if fp32_map_detector is not None else fp32_dets
+    int8_map_dets = int8_map_dets if int8_map_detector is not None else int8_dets
+
+    report: dict[str, Any] = {
+        "images": len(labels),
+        "count_mae_vs_fp32": round(float(np.abs(int8_counts - fp32_counts).mean()), 4),
+        "latency": {"fp32": latency_stats(fp32_lat), "int8": latency_stats(int8_lat)},
+    }
+    report["latency"]["speedup_p50"] = round(report["latency"]["fp32"]["p50_ms"] / report["latency"]["int8"]["p50_ms"], 3)
+
+    if all(label is not None for label in labels):
+        truth_counts = np.array([len(label) for label in labels])
+        fp32_map = mean_average_precision(fp32_map_dets, labels)
+        int8_map = mean_average_precision(int8_map_dets, labels)
+        report["reference"] = "labels"
+        report["count_mae"] = {
+            "fp32": round(float(np.abs(fp32_counts - truth_counts).mean()), 4),
+            "int8": round(float(np.abs(int8_counts - truth_counts).mean()), 4),
+        }
+        report["map"] = {"fp32": fp32_map, "int8": int8_map}
+    else:
+        # FP32 is its own reference, so its mAP is 1.0 by definition.
+        pseudo_truth = [np.concatenate([d[:, 5:6], d[:, :4]], axis=1) for d in fp32_dets]
+        report["reference"] = "fp32"
+        report["map"] = {"fp32": {"map50": 1.0, "map50_95": 1.0}, "int8": mean_average_precision(int8_map_dets, pseudo_truth)}
+    report["map_delta"] = {
+        key: round(report["map"]["int8"][key] - report["map"]["fp32"][key], 4) for key in ("map50", "map50_95")
+    }
+    return report
+
+
+def run_int8_stage(
+    model_dir: Path,
+    calib_dir: Path,
+    eval_dir: Path,
+    report_path: Path,
+    imgsz: int,
+    calib_count: int,
+    conf: float,
+    iou: float,
+    max_det: int,
+    ship: bool,
+) -> dict[str, Any]:
+    pt_path = model_dir / "best.pt"
+    source = YOLO(str(pt_path))
+    stride = int(source.model.stride.max())
+    end2end = bool(getattr(source.model.model[-1], "end2end", False))
+    head_prefix = f"/model.{len(source.model.model) - 1}/"
+
+    fp32_path = pt_path.with_suffix(".onnx")
+    if not fp32_path.exists():
+        source.export(format="onnx", dynamic=True, imgsz=imgsz, verbose=False)
+    int8_path = model_dir / "best_int8.onnx"
+    calib_images = list_images(calib_dir, calib_count)
+    quantize_int8(fp32_path, int8_path, calib_images, imgsz, stride, [head_prefix])
+
+    detector_args = {"imgsz": imgsz, "stride": stride, "end2end": end2end, "iou": iou, "max_det": max_det}
+    report = evaluate_int8(
+        onnx_detector(fp32_path, conf=conf, **detector_args),
+        onnx_detector(int8_path, conf=conf, **detector_args),
+        list_images(eval_dir),
+        fp32_map_detector=onnx_detector(fp32_path, conf=MAP_CONF, **detector_args),
+        int8_map_detector=onnx_detector(int8_path, conf=MAP_CONF, **detector_args),
+    )
+    report.update(
+        {
+            "calibration_dir": str(calib_dir),
+            "calibration_images": len(calib_images),
+            "eval_dir": str(eval_dir),
+            "imgsz": imgsz,
+            "conf": conf,
+            "map_conf": MAP_CONF,
+            "iou": iou,
+            "fp32_model": fp32_path.name,
+            "int8_model": int8_path.name,
+            "fp32_size_mb": round(fp32_path.stat().st_size / 1e6, 3),
+            "int8_size_mb": round(int8_path.stat().st_size / 1e6, 3),
+            "shipped": ship,
+        }
+    )
+
+    if ship:
+        # MODEL_BACKEND=onnx serves model/best.onnx; keep FP32 next to it.
+        fp32_path.replace(model_dir / "best_fp32.onnx")
+        int8_path.replace(fp32_path)
+        report["fp32_model"] = "best_fp32.onnx"
+        report["int8_model"] = fp32_path.name
+
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
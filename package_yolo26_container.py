@@ -8,33 +8,833 @@ from pathlib import Path
 
 API_SERVER_CODE = r'''from __future__ import annotations
 
+import asyncio
+import hashlib
+import hmac
 import io
+import json
+import math
 import os
+import random
 import re
+import tarfile
+import threading
+import time
 import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Iterator
 
-from azure.storage.blob import BlobServiceClient, ContentSettings
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import Body, FastAPI, File, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import msgpack
+import numpy as np
 from PIL import Image
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+import torch
 from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+from ultralytics.engine.results import Results
+from ultralytics.utils import ops
+
+try:
+    from ultralytics.utils.nms import non_max_suppression
+except ImportError:  # older ultralytics keeps NMS in ops
+    from ultralytics.utils.ops import non_max_suppression
 
 MODEL_PATH = os.getenv("MODEL_PATH", "/app/model/best.pt")
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch").strip().lower()
 DEFAULT_CONF = float(os.getenv("DEFAULT_CONF", "0.25"))
 DEFAULT_IOU = float(os.getenv("DEFAULT_IOU", "0.45"))
 DEFAULT_IMGSZ = int(os.getenv("DEFAULT_IMGSZ", "640"))
 DEFAULT_MAX_DET = int(os.getenv("DEFAULT_MAX_DET", "1000"))
+MAX_IMGSZ = int(os.getenv("MAX_IMGSZ", "4096"))
+RESPONSE_LAYOUTS = ("rows", "columnar")
+BATCH_MAX_SIZE = max(1, int(os.getenv("BATCH_MAX_SIZE", "8")))
+BATCH_MAX_WAIT_MS = max(0.0, float(os.getenv("BATCH_MAX_WAIT_MS", "10")))
+# 0 = the request's imgsz.
+TILE_SIZE = max(0, int(os.getenv("TILE_SIZE", "0")))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_MAX_TILES = max(1, int(os.getenv("TILE_MAX_TILES", "32")))
+TILE_MATCH_THRESHOLD = float(os.getenv("TILE_MATCH_THRESHOLD", "0.5"))
+BATCH_STREAM_WINDOW = max(1, int(os.getenv("BATCH_STREAM_WINDOW", "0")) or 2 * BATCH_MAX_SIZE)
+BATCH_MAX_FILES = max(1, int(os.getenv("BATCH_MAX_FILES", "10000")))
+BATCH_MAX_MEMBER_BYTES = max(1, int(os.getenv("BATCH_MAX_MEMBER_BYTES", str(50 * 1024 * 1024))))
+RESULT_CACHE_MAX_BYTES = max(0, int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+RESULT_CACHE_TTL_S = max(0.0, float(os.getenv("RESULT_CACHE_TTL_S", "600")))
+RESULT_CACHE_PHASH = os.getenv("RESULT_CACHE_PHASH", "0").strip().lower() in ("1", "true", "yes")
+RESULT_CACHE_PHASH_DISTANCE = max(0, int(os.getenv("RESULT_CACHE_PHASH_DISTANCE", "4")))
+DECODE_FAST = os.getenv("DECODE_FAST", "1").strip().lower() in ("1", "true", "yes")
+DECODE_BUFFER_POOL = max(0, int(os.getenv("DECODE_BUFFER_POOL", "32")))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0").strip().lower() in ("1", "true", "yes")
+MODEL_DIR = Path(os.getenv("MODEL_DIR", "") or Path(MODEL_PATH).parent)
+MODEL_MEMORY_BUDGET_MB = max(0, int(os.getenv("MODEL_MEMORY_BUDGET_MB", "2048")))
+MODEL_WATCH_INTERVAL_S = max(0.0, float(os.getenv("MODEL_WATCH_INTERVAL_S", "10")))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Warm-up runs every batch size at every imgsz on each inference worker before
+# /ready reports ready. An empty list disables warm-up.
+WARMUP_BATCH_SIZES = [int(v) for v in os.getenv("WARMUP_BATCH_SIZES", "1").split(",") if v.strip() and int(v) > 0]
+WARMUP_IMGSZ = [int(v) for v in os.getenv("WARMUP_IMGSZ", str(DEFAULT_IMGSZ)).split(",") if v.strip()]
+
+# vCPU split: INFERENCE_WORKERS parallel model.predict calls, each using
+# TORCH_THREADS intra-op threads (torch, ONNX Runtime or OpenVINO, depending on
+# MODEL_BACKEND). 0 means derive from the available cores.
+CPU_COUNT = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0")) or max(1, CPU_COUNT // 2)
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0")) or max(1, CPU_COUNT // INFERENCE_WORKERS)
+INFERENCE_QUEUE_LIMIT = max(1, int(os.getenv("INFERENCE_QUEUE_LIMIT", "64")))
+RETRY_AFTER_SECONDS = max(1, int(os.getenv("RETRY_AFTER_SECONDS", "2")))
 
 BLOB_CONNECTION_STRING = os.getenv("BLOB_CONNECTION_STRING", "")
 BLOB_CONTAINER_IMAGES = os.getenv("BLOB_CONTAINER_IMAGES", "aphid-images")
+STORAGE_QUEUE_LIMIT = max(1, int(os.getenv("STORAGE_QUEUE_LIMIT", "256")))
+STORAGE_CONCURRENCY = max(1, int(os.getenv("STORAGE_CONCURRENCY", "4")))
+STORAGE_MAX_RETRIES = max(0, int(os.getenv("STORAGE_MAX_RETRIES", "4")))
+STORAGE_RETRY_BASE_S = max(0.0, float(os.getenv("STORAGE_RETRY_BASE_S", "0.5")))
+STORAGE_DRAIN_TIMEOUT_S = max(0.0, float(os.getenv("STORAGE_DRAIN_TIMEOUT_S", "10")))
+STORAGE_SPILL_DIR = os.getenv("STORAGE_SPILL_DIR", "")
+
+MODEL_BACKENDS = ("torch", "onnx", "openvino")
+
+
+class StartupTimeline:
+    # Seconds since the process started, taken from /proc so interpreter
+    # start-up and imports are included. Each step is printed as it finishes.
+
+    def __init__(self) -> None:
+        self.events: list[tuple[str, float]] = []
+        self._t0 = time.perf_counter()
+
+    def elapsed(self) -> float:
+        try:
+            with open("/proc/self/stat") as f:
+                start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+            with open("/proc/uptime") as f:
+                uptime = float(f.read().split()[0])
+            return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return time.perf_counter() - self._t0
+
+    def mark(self, event: str) -> None:
+        elapsed = round(self.elapsed(), 3)
+        self.events.append((event, elapsed))
+        print(f"[startup] {elapsed:8.3f}s {event}", flush=True)
+
+    def as_list(self) -> list[dict[str, Any]]:
+        return [{"event": event, "t_s": elapsed} for event, elapsed in self.events]
+
+
+startup = StartupTimeline()
+startup.mark("imports done")
 
 if not os.path.exists(MODEL_PATH):
     raise FileNotFoundError(f"Model not found: {MODEL_PATH}")
+if MODEL_BACKEND not in MODEL_BACKENDS:
+    raise ValueError(f"Unsupported MODEL_BACKEND: {MODEL_BACKEND} (expected one of {', '.join(MODEL_BACKENDS)})")
+
+# MODEL_PATH is the default model; any other <name>.pt in MODEL_DIR can be
+# selected per request with ?model=<name>.
+DEFAULT_MODEL = Path(MODEL_PATH).stem
+MODEL_NAME_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+# <_utc_stamp()>_<10 hex>, as generated for every /predict response.
+REQUEST_ID_RE = re.compile(r"\d{8}T\d{12}Z_[0-9a-f]{10}")
+
+# Prometheus metrics. Stage and detection histograms are observed once per
+# image; batcher, cache and storage counters are read at scrape time by
+# _ServerCollector below.
+METRIC_ENDPOINTS = ("/predict", "/predict/batch", "/ws/predict", "/edge/detections")
+STAGE_SECONDS = Histogram(
+    "aphid_stage_seconds",
+    "Per-image time spent in each request stage.",
+    ["stage", "model", "backend"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+DETECTIONS_PER_IMAGE = Histogram(
+    "aphid_detections_per_image",
+    "Detections returned per image.",
+    ["model", "backend"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "aphid_inference_batch_size",
+    "Images per model.predict call.",
+    ["model", "backend"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+REQUEST_SECONDS = Histogram(
+    "aphid_request_seconds",
+    "End-to-end request time, including streamed bodies.",
+    ["endpoint", "status"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+BLOB_UPLOAD_SECONDS = Histogram(
+    "aphid_blob_upload_seconds",
+    "Background blob upload time per image (successful attempts).",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS_IN_FLIGHT = Gauge("aphid_requests_in_flight", "Requests (or WebSocket sessions) being served.", ["endpoint"])
+MODEL_INFO = Gauge("aphid_model_info", "Loaded model versions; the value is always 1.", ["model", "backend", "version"])
+
+
+def _file_version(path: Path) -> str:
+    # Part of every result cache key, so a replaced .pt never serves stale results.
+    stat = path.stat()
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _exported_model_path(pt_path: Path, backend: str) -> Path:
+    # Same locations ultralytics' exporter writes to, so artifacts produced at
+    # packaging time (package_yolo26_container.py --export) are picked up as-is.
+    if backend == "onnx":
+        return pt_path.with_suffix(".onnx")
+    return pt_path.parent / f"{pt_path.stem}_openvino_model" / f"{pt_path.stem}.xml"
+
+
+def _onnx_runner(path: Path) -> Callable[[np.ndarray], np.ndarray]:
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = TORCH_THREADS
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if INFERENCE_WORKERS > 1:
+        # Busy-waiting pool threads would steal cores from the other workers.
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    return lambda batch: session.run(None, {input_name: batch})[0]
+
+
+def _openvino_runner(path: Path) -> Callable[[np.ndarray], np.ndarray]:
+    import openvino as ov
+
+    core = ov.Core()
+    config = {
+        "PERFORMANCE_HINT": "LATENCY",
+        "INFERENCE_NUM_THREADS": str(TORCH_THREADS),
+        # Pinning only helps when a single worker owns all cores.
+        "ENABLE_CPU_PINNING": "YES" if INFERENCE_WORKERS == 1 else "NO",
+        # CPUs with AMX/AVX-512 BF16 otherwise default to bf16, which moves
+        # scores by ~0.01 and flips boxes near the conf threshold.
+        "INFERENCE_PRECISION_HINT": "f32",
+    }
+    compiled = core.compile_model(core.read_model(str(path)), "CPU", config)
+    request = compiled.create_infer_request()
+    return lambda batch: np.array(request.infer({0: batch})[0])
+
+
+class ExportedYOLO:
+    # Runs an ONNX / OpenVINO export of a .pt model with a tuned runtime session
+    # and returns ultralytics Results, so callers see the same boxes/names API
+    # as the torch backend. Pre- and post-processing reuse ultralytics helpers
+    # (letterbox, NMS, box scaling) to keep detections in parity.
+
+    def __init__(self, backend: str, path: Path, names: dict[int, str], stride: int, end2end: bool) -> None:
+        self.backend = backend
+        self.names = names
+        self.stride = stride
+        self.end2end = end2end
+        self._run = _onnx_runner(path) if backend == "onnx" else _openvino_runner(path)
+
+    def predict(
+        self,
+        source: ImageInput | list[ImageInput],
+        conf: float,
+        iou: float,
+        imgsz: int,
+        max_det: int,
+        **_: Any,
+    ) -> list[Results]:
+        images = source if isinstance(source, list) else [source]
+        # ultralytics treats PIL input as RGB and arrays as BGR (the fast decode path).
+        originals = [
+            np.ascontiguousarray(np.asarray(img)[:, :, ::-1]) if isinstance(img, Image.Image) else img
+            for img in images
+        ]
+        same_shapes = len({im.shape for im in originals}) == 1
+        letterbox = LetterBox((imgsz, imgsz), auto=same_shapes, stride=self.stride)
+        batch = np.stack([letterbox(image=im) for im in originals])
+        batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+        preds = torch.from_numpy(self._run(batch))
+        if self.end2end:
+            dets = [p[p[:, 4] > conf][:max_det] for p in preds]
+        else:
+            dets = non_max_suppression(preds, conf, iou, max_det=max_det)
+
+        results = []
+        for det, orig in zip(dets, originals):
+            det[:, :4] = ops.scale_boxes(batch.shape[2:], det[:, :4], orig.shape)
+            results.append(Results(orig, path="", names=self.names, boxes=det))
+        return results
+
+
+_exported_cache: dict[tuple[str, str, str], dict[str, Any]] = {}
+
+
+def _prepare_exported(backend: str, pt_path: Path) -> dict[str, Any]:
+    source = YOLO(str(pt_path))
+    target = _exported_model_path(pt_path, backend)
+    # Re-export when the .pt was replaced after the artifact was written.
+    if not target.exists() or target.stat().st_mtime_ns < pt_path.stat().st_mtime_ns:
+        source.export(format=backend, dynamic=True, imgsz=DEFAULT_IMGSZ, verbose=False)
+        if not target.exists():
+            raise FileNotFoundError(f"{backend} export did not produce {target}")
+    head = source.model.model[-1]
+    return {
+        "path": target,
+        "names": dict(source.names),
+        "stride": int(source.model.stride.max()),
+        "end2end": bool(getattr(head, "end2end", False)),
+    }
+
+
+def load_model(backend: str = MODEL_BACKEND, path: str | Path = MODEL_PATH) -> Any:
+    pt_path = Path(path)
+    if backend == "torch":
+        return YOLO(str(pt_path))
+    key = (backend, str(pt_path), _file_version(pt_path))
+    if key not in _exported_cache:
+        _exported_cache[key] = _prepare_exported(backend, pt_path)
+    return ExportedYOLO(backend, **_exported_cache[key])
+
+
+def _weight_bytes(instance: Any, pt_path: Path, backend: str) -> int:
+    if backend == "torch":
+        module = instance.model
+        return sum(t.numel() * t.element_size() for t in (*module.parameters(), *module.buffers()))
+    # The exported file itself, plus the .bin weights next to an OpenVINO .xml;
+    # a glob on the stem would also count best.pt and other best.* files.
+    artifact = _exported_model_path(pt_path, backend)
+    files = [artifact]
+    if backend == "openvino":
+        files.append(artifact.with_suffix(".bin"))
+    return sum(f.stat().st_size for f in files if f.is_file())
+
+
+class ModelHandle:
+    # One loaded version of a named model. Ultralytics predictors keep per-call
+    # state, so every concurrent batch needs its own instance: instances are
+    # pooled and created on demand, at most one per inference worker. Once the
+    # .pt on disk changes, no new instances are built from it (they would be a
+    # different version); batches wait for a pooled one until the registry
+    # swaps in the new handle.
+
+    def __init__(self, name: str, path: Path, backend: str) -> None:
+        self.name = name
+        self.path = path
+        self.backend = backend
+        self.version = _file_version(path)
+        first = load_model(backend, path)
+        self.names: dict[int, str] = dict(first.names)
+        self.weight_bytes = _weight_bytes(first, path, backend)
+        self.loaded_at = time.time()
+        self.last_used = time.time()
+        self.instances = 1
+        self._free = [first]
+        self._available = threading.Condition()
+
+    def footprint(self) -> int:
+        return self.weight_bytes * self.instances
+
+    def acquire(self, block: bool = True) -> Any | None:
+        # block=False returns None instead of waiting for a busy instance.
+        with self._available:
+            while not self._free:
+                if self.instances < INFERENCE_WORKERS and self._unchanged():
+                    self.instances += 1
+                    break
+                if not block:
+                    return None
+                self._available.wait()
+            else:
+                return self._free.pop()
+        try:
+            return load_model(self.backend, self.path)
+        except BaseException:
+            with self._available:
+                self.instances -= 1
+                self._available.notify()
+            raise
+
+    def release(self, instance: Any) -> None:
+        with self._available:
+            self._free.append(instance)
+            self._available.notify()
+
+    def _unchanged(self) -> bool:
+        try:
+            return _file_version(self.path) == self.version
+        except OSError:
+            return False
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "path": str(self.path),
+            "backend": self.backend,
+            "instances": self.instances,
+            "weight_mb": round(self.weight_bytes / 2**20, 1),
+            "loaded_at": datetime.fromtimestamp(self.loaded_at, timezone.utc).isoformat(timespec="seconds"),
+            "last_used": datetime.fromtimestamp(self.last_used, timezone.utc).isoformat(timespec="seconds"),
+        }
+
+
+class ModelRegistry:
+    # Named models from MODEL_DIR (<name>.pt), loaded on first use and evicted
+    # least-recently-used while their estimated weights exceed
+    # MODEL_MEMORY_BUDGET_MB (the default model is never evicted). A reload
+    # builds the new version completely before swapping it in; requests that
+    # already hold the old handle finish on it, and it is freed afterwards.
+
+    def __init__(self, model_dir: Path, default: str, backend: str, budget_bytes: int) -> None:
+        self.model_dir = model_dir
+        self.default = default
+        self.backend = backend
+        self.budget_bytes = budget_bytes
+        self.reloads = 0
+        self.evictions = 0
+        self.errors: dict[str, str] = {}
+        self._models: OrderedDict[str, ModelHandle] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._pending: dict[str, str] = {}
+        self._failed: dict[str, str] = {}
+        self._watch_task: asyncio.Task | None = None
+
+    def path_for(self, name: str) -> Path:
+        if not MODEL_NAME_RE.fullmatch(name):
+            raise KeyError(name)
+        if name == self.default:
+            return Path(MODEL_PATH)
+        path = self.model_dir / f"{name}.pt"
+        if not path.is_file():
+            raise KeyError(name)
+        return path
+
+    def available(self) -> list[str]:
+        names = {p.stem for p in self.model_dir.glob("*.pt") if MODEL_NAME_RE.fullmatch(p.stem)}
+        return sorted(names | {self.default})
+
+    def load_default(self) -> None:
+        self._install(ModelHandle(self.default, self.path_for(self.default), self.backend))
+
+    async def get(self, name: str | None = None) -> ModelHandle:
+        # Raises KeyError for names without a .pt in MODEL_DIR.
+        name = name or self.default
+        handle = self._models.get(name)
+        if handle is None:
+            handle = await self._load(name, force=False)
+        self._models.move_to_end(name)
+        handle.last_used = time.time()
+        return handle
+
+    async def reload(self, name: str) -> ModelHandle:
+        return await self._load(name, force=True)
+
+    async def _load(self, name: str, force: bool) -> ModelHandle:
+        path = self.path_for(name)
+        async with self._locks.setdefault(name, asyncio.Lock()):
+            current = self._models.get(name)
+            if current is not None and (not force or current.version == _file_version(path)):
+                return current
+            try:
+                handle = await asyncio.to_thread(ModelHandle, name, path, self.backend)
+            except Exception as exc:
+                self.errors[name] = str(exc)
+                raise
+            self.errors.pop(name, None)
+            if current is not None:
+                self.reloads += 1
+            self._install(handle)
+            return handle
+
+    def _install(self, handle: ModelHandle) -> None:
+        previous = self._models.get(handle.name)
+        if previous is not None:
+            MODEL_INFO.remove(previous.name, previous.backend, previous.version)
+        self._models[handle.name] = handle
+        self._models.move_to_end(handle.name)
+        MODEL_INFO.labels(handle.name, handle.backend, handle.version).set(1)
+        self._evict(keep=handle.name)
+
+    def memory_used(self) -> int:
+        return sum(handle.footprint() for handle in list(self._models.values()))
+
+    def _evict(self, keep: str) -> None:
+        while self.budget_bytes and self.memory_used() > self.budget_bytes:
+            victim = next((n for n in self._models if n not in (keep, self.default)), None)
+            if victim is None:
+                return
+            handle = self._models.pop(victim)
+            MODEL_INFO.remove(handle.name, handle.backend, handle.version)
+            self.evictions += 1
+
+    def start(self, interval_s: float) -> None:
+        if interval_s > 0:
+            self._watch_task = asyncio.create_task(self._watch(interval_s))
+
+    async def stop(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+
+    async def _watch(self, interval_s: float) -> None:
+        # A changed .pt is reloaded once two scans in a row see the same size
+        # and mtime, so a file still being copied in is not loaded half-written.
+        # Copy to a temp name and rename over <name>.pt for an atomic swap.
+        while True:
+            await asyncio.sleep(interval_s)
+            for name, handle in list(self._models.items()):
+                try:
+                    version = _file_version(handle.path)
+                except OSError:
+                    continue
+                if version == handle.version or self._failed.get(name) == version:
+                    self._pending.pop(name, None)
+                elif self._pending.get(name) != version:
+                    self._pending[name] = version
+                else:
+                    self._pending.pop(name, None)
+                    try:
+                        await self.reload(name)
+                    except Exception:
+                        # Reported in errors; retried once the file changes again.
+                        self._failed[name] = version
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "default": self.default,
+            "model_dir": str(self.model_dir),
+            "available": self.available(),
+            "loaded": {name: handle.status() for name, handle in list(self._models.items())},
+            "memory_budget_mb": round(self.budget_bytes / 2**20, 1),
+            "memory_used_mb": round(self.memory_used() / 2**20, 1),
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+torch.set_num_threads(TORCH_THREADS)
+registry = ModelRegistry(MODEL_DIR, DEFAULT_MODEL, MODEL_BACKEND, MODEL_MEMORY_BUDGET_MB * 2**20)
+registry.load_default()
+startup.mark(f"default model loaded ({MODEL_BACKEND})")
+
+
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+PredictParams = tuple[float, float, int, int]
+# PIL images are RGB; arrays are BGR letterboxes from _prepare_image.
+ImageInput = Image.Image | np.ndarray
+
+
+def _predict_params(conf: Any, iou: Any, imgsz: Any, max_det: Any) -> PredictParams:
+    # Shared by /predict, /predict/batch and /ws/predict; raises ValueError.
+    if isinstance(conf, bool) or isinstance(iou, bool) or isinstance(imgsz, bool) or isinstance(max_det, bool):
+        raise ValueError("conf, iou, imgsz and max_det must be numbers.")
+    try:
+        params = (float(conf), float(iou), int(imgsz), int(max_det))
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"conf, iou, imgsz and max_det must be numbers: {exc}") from exc
+    if not 0.0 <= params[0] <= 1.0:
+        raise ValueError("conf must be in [0, 1].")
+    if not 0.0 <= params[1] <= 1.0:
+        raise ValueError("iou must be in [0, 1].")
+    if not 32 <= params[2] <= MAX_IMGSZ:
+        raise ValueError(f"imgsz must be in [32, {MAX_IMGSZ}].")
+    if params[3] < 1:
+        raise ValueError("max_det must be at least 1.")
+    return params
+
+
+@dataclass
+class _BatchItem:
+    image: ImageInput
+    params: PredictParams
+    handle: ModelHandle
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    # Collects concurrent /predict calls for a short window and runs them as one
+    # model.predict batch. Items are grouped by model handle and predict params,
+    # because the model and conf/iou/imgsz/max_det apply to the whole batch. At
+    # most one batch per inference worker is in flight; while all workers are
+    # busy, requests keep queueing (and form larger batches) until the queue
+    # limit rejects new ones.
+
+    def __init__(self, max_size: int, max_wait_ms: float, workers: int, queue_limit: int) -> None:
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._queue: asyncio.Queue[_BatchItem] | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self.batches_run = 0
+        self.images_run = 0
+        self.last_batch_size = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_limit)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Inference batcher stopped."))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def busy_workers(self) -> int:
+        return len(self._inflight)
+
+    async def submit(
+        self,
+        image: ImageInput,
+        params: PredictParams,
+        handle: ModelHandle,
+    ) -> tuple[Any, dict[str, Any]]:
+        return (await self.submit_many([image], params, handle))[0]
+
+    async def submit_many(
+        self,
+        images: list[ImageInput],
+        params: PredictParams,
+        handle: ModelHandle,
+    ) -> list[tuple[Any, dict[str, Any]]]:
+        # All-or-nothing admission, so a tiled request never half-enters the queue.
+        if self._queue is None:
+            raise RuntimeError("Inference batcher is not running.")
+        if self.queue_limit - self._queue.qsize() < len(images):
+            self.rejected += 1
+            raise QueueFullError("Inference queue is full.")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for image in images:
+            future = loop.create_future()
+            self._queue.put_nowait(_BatchItem(image=image, params=params, handle=handle, future=future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self) -> list[_BatchItem]:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_size:
+            try:
+                items.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self) -> None:
+        assert self._slots is not None
+        while True:
+            await self._slots.acquire()
+            try:
+                items = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            groups: dict[tuple[ModelHandle, PredictParams], list[_BatchItem]] = {}
+            for item in items:
+                groups.setdefault((item.handle, item.params), []).append(item)
+            task = asyncio.create_task(self._run_groups(groups))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
 
-model = YOLO(MODEL_PATH)
-app = FastAPI(title="Aphid YOLO26 Inference API", version="1.2.0")
+    async def _run_groups(self, groups: dict[tuple[ModelHandle, PredictParams], list[_BatchItem]]) -> None:
+        assert self._slots is not None
+        try:
+            for (handle, params), group in groups.items():
+                await self._run_group(handle, params, group)
+        finally:
+            self._slots.release()
+
+    async def _run_group(self, handle: ModelHandle, params: PredictParams, group: list[_BatchItem]) -> None:
+        group = [item for item in group if not item.future.done()]
+        if not group:
+            return
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                inference_executor, _predict_batch, handle, [item.image for item in group], params
+            )
+        except Exception as exc:
+            for item in group:
+                if not item.future.done():
+                    item.future.set_exception(exc)
+            return
+        inference_ms = round((time.perf_counter() - started) * 1000.0, 3)
+
+        self.batches_run += 1
+        batch_id = self.batches_run
+        self.images_run += len(group)
+        self.last_batch_size = len(group)
+        INFERENCE_BATCH_SIZE.labels(handle.name, handle.backend).observe(len(group))
+        for item, result in zip(group, results):
+            if item.future.done():
+                continue
+            stats = {
+                "id": batch_id,
+                "size": len(group),
+                "queue_wait_ms": round((started - item.enqueued_at) * 1000.0, 3),
+                "inference_ms": inference_ms,
+            }
+            item.future.set_result((result, stats))
+
+
+def _predict_batch(handle: ModelHandle, images: list[ImageInput], params: PredictParams) -> list[Any]:
+    conf, iou, imgsz, max_det = params
+    instance = handle.acquire()
+    try:
+        return instance.predict(
+            source=images,
+            conf=conf,
+            iou=iou,
+            imgsz=imgsz,
+            max_det=max_det,
+            device="cpu",
+            verbose=False,
+        )
+    finally:
+        handle.release(instance)
+
+
+batcher = MicroBatcher(
+    max_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    workers=INFERENCE_WORKERS,
+    queue_limit=INFERENCE_QUEUE_LIMIT,
+)
+
+
+readiness: dict[str, Any] = {"ready": False, "warmup_error": None}
+
+
+def _warm_instance(instance: Any) -> None:
+    # Letterbox-shaped frames, the same shape the fast decode path feeds the
+    # model, so kernels and runtime buffers are built for the real shapes. Noise
+    # with a near-zero conf makes NMS run too; a blank frame would skip it.
+    rng = np.random.default_rng(0)
+    for imgsz in WARMUP_IMGSZ:
+        frame = rng.integers(0, 256, (imgsz, imgsz, 3), dtype=np.uint8)
+        for size in WARMUP_BATCH_SIZES:
+            instance.predict(
+                source=[frame] * size,
+                conf=0.001,
+                iou=DEFAULT_IOU,
+                imgsz=imgsz,
+                max_det=DEFAULT_MAX_DET,
+                device="cpu",
+                verbose=False,
+            )
+
+
+async def _warm_up() -> None:
+    # Builds one instance of the default model per inference worker (otherwise
+    # the first concurrent requests pay for loading them) and runs every
+    # warm-up shape on each, in parallel on warm-up threads of its own: a batch
+    # that arrives meanwhile holds an inference thread while it waits for an
+    # instance, so warm-up queued behind it would never run. Instances are
+    # taken without waiting: if best.pt changes meanwhile, no more can be built
+    # and warm-up goes on with the ones it already has.
+    handle = await registry.get()
+    instances: list[Any] = []
+    try:
+        if WARMUP_BATCH_SIZES and WARMUP_IMGSZ:
+            def take() -> None:
+                while len(instances) < INFERENCE_WORKERS:
+                    instance = handle.acquire(block=False)
+                    if instance is None:
+                        break
+                    instances.append(instance)
+
+            await asyncio.to_thread(take)
+            startup.mark(f"{len(instances)} model instance(s) ready")
+            if instances:
+                loop = asyncio.get_running_loop()
+                with ThreadPoolExecutor(max_workers=len(instances), thread_name_prefix="warmup") as pool:
+                    await asyncio.gather(*(loop.run_in_executor(pool, _warm_instance, i) for i in instances))
+            startup.mark(f"warm-up done (batch sizes {WARMUP_BATCH_SIZES}, imgsz {WARMUP_IMGSZ})")
+    except Exception as exc:
+        # Serve anyway; the first requests just pay the warm-up cost themselves.
+        readiness["warmup_error"] = str(exc)
+        startup.mark(f"warm-up failed: {exc}")
+    finally:
+        for instance in instances:
+            handle.release(instance)
+    readiness["ready"] = True
+    startup.mark("ready")
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    batcher.start()
+    registry.start(MODEL_WATCH_INTERVAL_S)
+    if BLOB_CONNECTION_STRING:
+        await persister.start(_create_blob_service())
+        startup.mark("blob storage connected" if persister.enabled else "blob storage unavailable")
+    else:
+        await persister.start(None)
+    # Warm-up runs in the background: /health (liveness) answers right away,
+    # /ready turns 200 once warm-up has finished.
+    warmup = asyncio.create_task(_warm_up())
+    startup.mark("accepting connections")
+    try:
+        yield
+    finally:
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+        await registry.stop()
+        await batcher.stop()
+        await persister.stop()
+
+
+app = FastAPI(title="Aphid YOLO26 Inference API", version="1.2.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -43,20 +843,6 @@ app.add_middleware(
     allow_credentials=False,
 )
 
-blob_service: BlobServiceClient | None = None
-blob_init_error = ""
-if BLOB_CONNECTION_STRING:
-    try:
-        blob_service = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
-        blob_service.get_container_client(BLOB_CONTAINER_IMAGES).create_container()
-    except Exception:
-        pass
-    try:
-        blob_service.get_container_client(BLOB_CONTAINER_IMAGES).get_container_properties()
-    except Exception as exc:
-        blob_init_error = str(exc)
-        blob_service = None
-
 
 def _utc_stamp() -> str:
     return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
@@ -67,88 +853,1061 @@ def _safe_filename(name: str) -> str:
     return cleaned or "image.jpg"
 
 
-def _upload_image_to_blob(blob_name: str, raw: bytes, content_type: str) -> str:
-    if blob_service is None:
-        raise RuntimeError("Blob service is not configured.")
-    blob_client = blob_service.get_blob_client(container=BLOB_CONTAINER_IMAGES, blob=blob_name)
-    blob_client.upload_blob(
-        raw,
-        overwrite=True,
-        content_settings=ContentSettings(content_type=content_type or "application/octet-stream"),
+@dataclass
+class _BlobJob:
+    blob_name: str
+    raw: bytes
+    content_type: str
+    spilled: bool = False
+
+
+class BlobPersister:
+    # Background image persistence. /predict only enqueues; STORAGE_CONCURRENCY
+    # upload tasks drain the queue through the async SDK with retry/backoff.
+    # When the in-memory queue is full, images spill to STORAGE_SPILL_DIR (if
+    # set) and are re-queued oldest-first once there is room, including after a
+    # restart. `service` is an aio BlobServiceClient or anything exposing the
+    # same get_container_client()/close() surface, e.g. the fake in
+    # tests/test_blob_persister.py.
+
+    def __init__(
+        self,
+        container: str,
+        queue_limit: int,
+        concurrency: int,
+        max_retries: int,
+        retry_base_s: float,
+        spill_dir: str,
+        drain_timeout_s: float,
+    ) -> None:
+        self.container = container
+        self.queue_limit = queue_limit
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_s = retry_base_s
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.drain_timeout_s = drain_timeout_s
+        self.init_error = ""
+        self._service: Any = None
+        self._container_client: Any = None
+        self._queue: asyncio.Queue[_BlobJob] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._spill_pending: set[str] = set()
+        self.uploaded = 0
+        self.failed = 0
+        self.retried = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.last_error = ""
+
+    @property
+    def enabled(self) -> bool:
+        return self._container_client is not None
+
+    async def start(self, service: Any) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_limit)
+        if service is None:
+            return
+        container_client = service.get_container_client(self.container)
+        try:
+            await container_client.create_container()
+        except Exception:
+            pass
+        try:
+            await container_client.get_container_properties()
+        except Exception as exc:
+            self.init_error = str(exc)
+            await service.close()
+            return
+
+        self._service = service
+        self._container_client = container_client
+        self._tasks = [asyncio.create_task(self._upload_loop()) for _ in range(self.concurrency)]
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            self._tasks.append(asyncio.create_task(self._spill_loop()))
+
+    async def stop(self) -> None:
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout_s)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            if job.spilled:
+                continue
+            if self.spill_dir is not None:
+                await asyncio.to_thread(self._write_spill, job)
+                self.spilled += 1
+            else:
+                self.dropped += 1
+        if self._service is not None:
+            await self._service.close()
+            self._service = None
+            self._container_client = None
+
+    def blob_url(self, blob_name: str) -> str:
+        return f"{self._container_client.url.rstrip('/')}/{blob_name}"
+
+    async def enqueue(self, blob_name: str, raw: bytes, content_type: str) -> str:
+        assert self._queue is not None
+        job = _BlobJob(blob_name=blob_name, raw=raw, content_type=content_type or "application/octet-stream")
+        try:
+            self._queue.put_nowait(job)
+            return "queued"
+        except asyncio.QueueFull:
+            pass
+        if self.spill_dir is None:
+            self.dropped += 1
+            return "dropped"
+        await asyncio.to_thread(self._write_spill, job)
+        self.spilled += 1
+        return "spilled"
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "init_error": self.init_error or None,
+            "container": self.container,
+            "queue_depth": self.queue_depth(),
+            "queue_limit": self.queue_limit,
+            "concurrency": self.concurrency,
+            "spill_dir": str(self.spill_dir) if self.spill_dir is not None else None,
+            "spill_depth": self._spill_depth(),
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "last_error": self.last_error or None,
+        }
+
+    async def _upload_loop(self) -> None:
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._upload_with_retry(job)
+            finally:
+                self._queue.task_done()
+
+    async def _upload_with_retry(self, job: _BlobJob) -> None:
+        from azure.storage.blob import ContentSettings
+
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self._container_client.upload_blob(
+                    name=job.blob_name,
+                    data=job.raw,
+                    overwrite=True,
+                    content_settings=ContentSettings(content_type=job.content_type),
+                )
+            except Exception as exc:
+                self.last_error = str(exc)
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    # A spilled job stays on disk and is retried on a later scan.
+                    self._spill_pending.discard(job.blob_name)
+                    return
+                self.retried += 1
+                await asyncio.sleep(self.retry_base_s * (2**attempt) * (0.5 + random.random()))
+            else:
+                self.uploaded += 1
+                BLOB_UPLOAD_SECONDS.observe(time.perf_counter() - started)
+                if job.spilled:
+                    await asyncio.to_thread(self._remove_spill, job.blob_name)
+                    self._spill_pending.discard(job.blob_name)
+                return
+
+    async def _spill_loop(self) -> None:
+        assert self._queue is not None and self.spill_dir is not None
+        while True:
+            for meta_path in await asyncio.to_thread(self._list_spill):
+                if self._queue.full():
+                    break
+                blob_name = meta_path.stem
+                if blob_name in self._spill_pending:
+                    continue
+                try:
+                    job = await asyncio.to_thread(self._read_spill, meta_path)
+                except Exception as exc:
+                    self.last_error = f"Spill read failed for {blob_name}: {exc}"
+                    continue
+                self._spill_pending.add(blob_name)
+                self._queue.put_nowait(job)
+            await asyncio.sleep(1.0)
+
+    # Spill layout: <blob_name> holds the bytes and <blob_name>.json the
+    # metadata. The metadata file is written last, so it marks a complete entry.
+
+    def _write_spill(self, job: _BlobJob) -> None:
+        assert self.spill_dir is not None
+        (self.spill_dir / job.blob_name).write_bytes(job.raw)
+        meta = {"blob_name": job.blob_name, "content_type": job.content_type}
+        (self.spill_dir / f"{job.blob_name}.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    def _read_spill(self, meta_path: Path) -> _BlobJob:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        raw = (meta_path.parent / meta["blob_name"]).read_bytes()
+        return _BlobJob(blob_name=meta["blob_name"], raw=raw, content_type=meta["content_type"], spilled=True)
+
+    def _remove_spill(self, blob_name: str) -> None:
+        assert self.spill_dir is not None
+        (self.spill_dir / f"{blob_name}.json").unlink(missing_ok=True)
+        (self.spill_dir / blob_name).unlink(missing_ok=True)
+
+    def _list_spill(self) -> list[Path]:
+        assert self.spill_dir is not None
+        return sorted(self.spill_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+
+    def _spill_depth(self) -> int:
+        if self.spill_dir is None or not self.spill_dir.exists():
+            return 0
+        return sum(1 for _ in self.spill_dir.glob("*.json"))
+
+
+def _create_blob_service() -> Any:
+    # One pooled aiohttp session shared by all upload tasks. Retries are handled
+    # by BlobPersister, so the SDK's own retry policy is disabled. The Azure SDK
+    # is imported here, so servers without blob storage never pay for it.
+    import aiohttp
+    from azure.core.pipeline.transport import AioHttpTransport
+    from azure.storage.blob.aio import BlobServiceClient
+
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=STORAGE_CONCURRENCY * 2))
+    return BlobServiceClient.from_connection_string(
+        BLOB_CONNECTION_STRING,
+        transport=AioHttpTransport(session=session, session_owner=True),
+        retry_total=0,
+    )
+
+
+persister = BlobPersister(
+    container=BLOB_CONTAINER_IMAGES,
+    queue_limit=STORAGE_QUEUE_LIMIT,
+    concurrency=STORAGE_CONCURRENCY,
+    max_retries=STORAGE_MAX_RETRIES,
+    retry_base_s=STORAGE_RETRY_BASE_S,
+    spill_dir=STORAGE_SPILL_DIR,
+    drain_timeout_s=STORAGE_DRAIN_TIMEOUT_S,
+)
+
+
+@dataclass
+class _CacheEntry:
+    value: dict[str, Any]
+    size: int
+    created: float
+    params_key: tuple
+    phash: int | None
+
+
+class ResultCache:
+    # LRU + TTL cache of /predict results keyed on the content digest of the
+    # raw upload and every parameter that changes the result. Entry sizes are
+    # estimated from the detection count and bounded by max_bytes. With phash
+    # enabled, a miss on the exact digest can still hit an entry whose 64-bit
+    # dHash is within phash_distance bits (same params only).
+
+    def __init__(self, max_bytes: int, ttl_s: float, phash: bool, phash_distance: int) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.phash = phash
+        self.phash_distance = phash_distance
+        self._entries: OrderedDict[tuple, _CacheEntry] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.phash_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, digest: str, params_key: tuple) -> tuple[dict[str, Any], float] | None:
+        key = (digest, params_key)
+        entry = self._entries.get(key)
+        if entry is None or self._expired(key, entry):
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value, time.monotonic() - entry.created
+
+    def get_similar(self, phash: int, params_key: tuple) -> tuple[dict[str, Any], float] | None:
+        best_key, best_distance = None, self.phash_distance + 1
+        for key, entry in self._entries.items():
+            if entry.phash is None or entry.params_key != params_key:
+                continue
+            distance = (entry.phash ^ phash).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        if best_key is None or self._expired(best_key, self._entries[best_key]):
+            return None
+        entry = self._entries[best_key]
+        self._entries.move_to_end(best_key)
+        self.phash_hits += 1
+        return entry.value, time.monotonic() - entry.created
+
+    def put(self, digest: str, params_key: tuple, value: dict[str, Any], phash: int | None) -> None:
+        size = 512 + 160 * len(value.get("detections", ()))
+        if size > self.max_bytes:
+            return
+        key = (digest, params_key)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.size
+        self._entries[key] = _CacheEntry(value, size, time.monotonic(), params_key, phash)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "phash": self.phash,
+            "hits": self.hits,
+            "phash_hits": self.phash_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _expired(self, key: tuple, entry: _CacheEntry) -> bool:
+        if self.ttl_s <= 0 or time.monotonic() - entry.created <= self.ttl_s:
+            return False
+        del self._entries[key]
+        self.bytes -= entry.size
+        self.expirations += 1
+        return True
+
+
+def _dhash(image: Image.Image) -> int:
+    # 64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail.
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+result_cache = ResultCache(
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    ttl_s=RESULT_CACHE_TTL_S,
+    phash=RESULT_CACHE_PHASH,
+    phash_distance=RESULT_CACHE_PHASH_DISTANCE,
+)
+
+
+def _build_detections(xyxy: list, confs: list, clss: list, names: dict[int, str]) -> list[dict[str, Any]]:
+    detections: list[dict[str, Any]] = []
+    for i in range(len(xyxy)):
+        cls_id = int(clss[i]) if i < len(clss) else -1
+        detections.append(
+            {
+                "class_id": cls_id,
+                "class_name": names.get(cls_id, str(cls_id)),
+                "confidence": float(confs[i]) if i < len(confs) else None,
+                "bbox_xyxy": [float(v) for v in xyxy[i]],
+            }
+        )
+    return detections
+
+
+def _result_arrays(result: Any) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    boxes = result.boxes
+    if boxes is None or boxes.xyxy is None:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return (
+        boxes.xyxy.detach().cpu().numpy(),
+        boxes.conf.detach().cpu().numpy(),
+        boxes.cls.detach().cpu().numpy(),
+    )
+
+
+@dataclass
+class DetectionArrays:
+    # Detections kept as the arrays they come out of the model as. Per-box
+    # dicts are only built when a client asks for the row layout.
+    xyxy: np.ndarray
+    conf: np.ndarray
+    cls: np.ndarray
+    names: dict[int, str]
+
+    @classmethod
+    def from_result(cls, result: Any) -> DetectionArrays:
+        return cls(*_result_arrays(result), result.names)
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+    def rows(self) -> list[dict[str, Any]]:
+        return _build_detections(self.xyxy.tolist(), self.conf.tolist(), self.cls.tolist(), self.names)
+
+    def columns(self, packed: bool) -> dict[str, Any]:
+        # Parallel arrays; bbox_xyxy is flattened to x1,y1,x2,y2 per box. With
+        # packed=True they are little-endian int32/float32 buffers for msgpack.
+        class_ids = self.cls.astype(np.int32)
+        names = {str(int(i)): self.names.get(int(i), str(int(i))) for i in np.unique(class_ids)}
+        if packed:
+            return {
+                "class_id": class_ids.astype("<i4").tobytes(),
+                "confidence": self.conf.astype("<f4").tobytes(),
+                "bbox_xyxy": self.xyxy.astype("<f4").tobytes(),
+                "class_names": names,
+            }
+        return {
+            "class_id": class_ids.tolist(),
+            "confidence": self.conf.tolist(),
+            "bbox_xyxy": self.xyxy.reshape(-1).tolist(),
+            "class_names": names,
+        }
+
+
+def _result_to_detections(result: Any) -> list[dict[str, Any]]:
+    boxes = result.boxes
+    names = result.names
+
+    if boxes is None:
+        return []
+    xyxy = boxes.xyxy.detach().cpu().tolist() if boxes.xyxy is not None else []
+    confs = boxes.conf.detach().cpu().tolist() if boxes.conf is not None else []
+    clss = boxes.cls.detach().cpu().tolist() if boxes.cls is not None else []
+    return _build_detections(xyxy, confs, clss, names)
+
+
+def _tile_starts(length: int, tile: int, overlap: float, count: int = 0) -> list[int]:
+    # Evenly spaced starts from 0 to length - tile. count=0 picks the fewest
+    # tiles that still overlap by at least `overlap`.
+    if length <= tile:
+        return [0]
+    if count < 1:
+        step = max(1.0, tile * (1.0 - overlap))
+        count = math.ceil((length - tile) / step) + 1
+    if count == 1:
+        return [0]
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def _tile_grid(
+    width: int,
+    height: int,
+    tile_w: int,
+    tile_h: int,
+    overlap: float,
+    cols: int = 0,
+    rows: int = 0,
+) -> list[tuple[int, int, int, int]]:
+    return [
+        (x, y, min(x + tile_w, width), min(y + tile_h, height))
+        for y in _tile_starts(height, tile_h, overlap, rows)
+        for x in _tile_starts(width, tile_w, overlap, cols)
+    ]
+
+
+def _plan_tiles(size: tuple[int, int], tiles: str, overlap: float, imgsz: int) -> list[tuple[int, int, int, int]]:
+    # tiles=auto keeps the native resolution per tile (TILE_SIZE px, or imgsz,
+    # grown if the grid would exceed TILE_MAX_TILES); tiles=COLSxROWS fixes the
+    # grid instead.
+    width, height = size
+    if not 0.0 <= overlap < 1.0:
+        raise ValueError("tile_overlap must be in [0, 1).")
+    if tiles == "auto":
+        tile = TILE_SIZE or imgsz
+        grid = _tile_grid(width, height, tile, tile, overlap)
+        while len(grid) > min(TILE_MAX_TILES, INFERENCE_QUEUE_LIMIT):
+            tile = int(tile * 1.25) + 1
+            grid = _tile_grid(width, height, tile, tile, overlap)
+        return grid
+
+    match = re.fullmatch(r"(\d+)x(\d+)", tiles)
+    if match is None:
+        raise ValueError("tiles must be 'off', 'auto' or COLSxROWS, e.g. 3x2.")
+    cols, rows = int(match.group(1)), int(match.group(2))
+    if cols < 1 or rows < 1 or cols * rows > min(TILE_MAX_TILES, INFERENCE_QUEUE_LIMIT):
+        raise ValueError(f"tiles grid must have between 1 and {min(TILE_MAX_TILES, INFERENCE_QUEUE_LIMIT)} tiles.")
+    tile_w = math.ceil(width / (cols - (cols - 1) * overlap))
+    tile_h = math.ceil(height / (rows - (rows - 1) * overlap))
+    return _tile_grid(width, height, tile_w, tile_h, overlap, cols, rows)
+
+
+def _merge_tile_boxes(
+    xyxy: np.ndarray,
+    conf: np.ndarray,
+    cls: np.ndarray,
+    threshold: float,
+    fuse: bool,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Greedy class-aware NMS across tiles. Overlap is measured as intersection
+    # over the smaller box, because an object cut by a tile edge yields a
+    # partial box that has low IoU with the full one. With fuse=True the kept
+    # box grows to the union of the boxes it suppressed.
+    order = np.argsort(-conf, kind="stable")
+    xyxy, conf, cls = xyxy[order].copy(), conf[order], cls[order]
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    suppressed = np.zeros(len(conf), dtype=bool)
+    keep: list[int] = []
+    for i in range(len(conf)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = np.nonzero(~suppressed[i + 1 :])[0] + i + 1
+        if len(rest) == 0:
+            continue
+        tl = np.maximum(xyxy[i, :2], xyxy[rest, :2])
+        br = np.minimum(xyxy[i, 2:], xyxy[rest, 2:])
+        inter = np.clip(br - tl, 0, None).prod(axis=1)
+        ios = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9)
+        matched = rest[(ios >= threshold) & (cls[rest] == cls[i])]
+        suppressed[matched] = True
+        if fuse and len(matched):
+            xyxy[i, :2] = np.minimum(xyxy[i, :2], xyxy[matched, :2].min(axis=0))
+            xyxy[i, 2:] = np.maximum(xyxy[i, 2:], xyxy[matched, 2:].max(axis=0))
+    return xyxy[keep], conf[keep], cls[keep]
+
+
+async def _predict_tiled(
+    pil_img: Image.Image,
+    tile_boxes: list[tuple[int, int, int, int]],
+    params: PredictParams,
+    handle: ModelHandle,
+    overlap: float,
+    merge: str,
+) -> tuple[DetectionArrays, dict[str, Any], dict[str, Any]]:
+    crops = await asyncio.to_thread(lambda: [pil_img.crop(box) for box in tile_boxes])
+    outputs = await batcher.submit_many(crops, params, handle)
+
+    merge_started = time.perf_counter()
+    all_xyxy, all_conf, all_cls = [], [], []
+    per_tile = []
+    for box, (result, stats) in zip(tile_boxes, outputs):
+        xyxy, conf, cls = _result_arrays(result)
+        all_xyxy.append(xyxy + np.array([box[0], box[1], box[0], box[1]], dtype=xyxy.dtype))
+        all_conf.append(conf)
+        all_cls.append(cls)
+        # A batch runs its tiles in one predict call, so there is no per-tile
+        # inference time; the tile only names the batch and that batch's time.
+        per_tile.append(
+            {
+                "box": list(box),
+                "count": int(len(conf)),
+                "queue_wait_ms": stats["queue_wait_ms"],
+                "batch": {"id": stats["id"], "size": stats["size"], "inference_ms": stats["inference_ms"]},
+            }
+        )
+    xyxy, conf, cls = _merge_tile_boxes(
+        np.concatenate(all_xyxy),
+        np.concatenate(all_conf),
+        np.concatenate(all_cls),
+        threshold=TILE_MATCH_THRESHOLD,
+        fuse=merge == "fusion",
     )
-    return blob_client.url
+    max_det = params[3]
+    xyxy, conf, cls = xyxy[:max_det], conf[:max_det], cls[:max_det]
+    detections = DetectionArrays(xyxy, conf, cls, outputs[0][0].names)
+
+    tiles_info = {
+        "count": len(tile_boxes),
+        "overlap": overlap,
+        "merge": merge,
+        "raw_detections": int(sum(t["count"] for t in per_tile)),
+        "merge_ms": round((time.perf_counter() - merge_started) * 1000.0, 3),
+        "per_tile": per_tile,
+    }
+    batches = {stats["id"]: stats["inference_ms"] for _, stats in outputs}
+    batch_stats = {
+        "batches": len(batches),
+        "size": max(stats["size"] for _, stats in outputs),
+        "queue_wait_ms": max(stats["queue_wait_ms"] for _, stats in outputs),
+        "inference_ms": round(sum(batches.values()), 3),
+    }
+    return detections, tiles_info, batch_stats
+
+
+@app.get("/ready")
+def ready() -> JSONResponse:
+    # Readiness probe: 503 until the default model is warmed up. /health is
+    # the liveness probe and answers as soon as the server is up.
+    body = {
+        "status": "ready" if readiness["ready"] else "starting",
+        "warmup_error": readiness["warmup_error"],
+        "startup": startup.as_list(),
+    }
+    return JSONResponse(body, status_code=200 if readiness["ready"] else 503)
 
 
 @app.get("/health")
 def health() -> dict[str, Any]:
     return {
         "status": "ok",
+        "ready": readiness["ready"],
         "model_path": MODEL_PATH,
-        "blob_enabled": blob_service is not None,
-        "blob_init_error": blob_init_error or None,
+        "model_backend": MODEL_BACKEND,
+        "models": registry.status(),
+        "blob_enabled": persister.enabled,
+        "blob_init_error": persister.init_error or None,
+        "batching": {
+            "max_size": batcher.max_size,
+            "max_wait_ms": BATCH_MAX_WAIT_MS,
+            "queue_depth": batcher.queue_depth(),
+            "batches_run": batcher.batches_run,
+            "images_run": batcher.images_run,
+            "last_batch_size": batcher.last_batch_size,
+            "rejected": batcher.rejected,
+        },
+        "executor": {
+            "cpu_count": CPU_COUNT,
+            "inference_workers": INFERENCE_WORKERS,
+            "busy_workers": batcher.busy_workers(),
+            "torch_threads": TORCH_THREADS,
+            "queue_limit": INFERENCE_QUEUE_LIMIT,
+        },
+        "result_cache": result_cache.stats(),
     }
 
 
+@app.get("/storage/status")
+def storage_status() -> dict[str, Any]:
+    return persister.status()
+
+
+@app.get("/models")
+def list_models() -> dict[str, Any]:
+    return registry.status()
+
+
+def _check_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set).")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+@app.post("/models/{name}/reload")
+async def reload_model(request: Request, name: str, weights: UploadFile | None = File(None)) -> dict[str, Any]:
+    # Without a file, loads the current <name>.pt from MODEL_DIR if it changed.
+    # With a file, the upload is checked to load as a YOLO model, then renamed
+    # over <name>.pt and swapped in. In-flight requests finish on the old version.
+    _check_admin(request)
+    if not MODEL_NAME_RE.fullmatch(name):
+        raise HTTPException(status_code=400, detail="Invalid model name.")
+    if weights is not None:
+        target = registry.path_for(name) if name == registry.default else registry.model_dir / f"{name}.pt"
+        staging = target.with_name(f".{name}.{uuid.uuid4().hex[:8]}.upload.pt")
+        try:
+            await asyncio.to_thread(staging.write_bytes, await weights.read())
+            await asyncio.to_thread(YOLO, str(staging))
+            await asyncio.to_thread(os.replace, staging, target)
+        except Exception as exc:
+            staging.unlink(missing_ok=True)
+            raise HTTPException(status_code=422, detail=f"Invalid model file: {exc}") from exc
+    try:
+        handle = await registry.reload(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}") from None
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Model load failed: {exc}") from exc
+    return {"model": name, **handle.status()}
+
+
+async def _resolve_model(name: str | None) -> ModelHandle:
+    try:
+        return await registry.get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}") from None
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Model load failed: {exc}") from exc
+
+
+class _ServerCollector:
+    # Exposes the counters the batcher, model registry, result cache and blob
+    # persister already keep, read at scrape time instead of duplicating them.
+
+    def collect(self) -> Iterator[Any]:
+        labels = ["backend"]
+        values = [MODEL_BACKEND]
+
+        def counter(name: str, doc: str, value: float) -> CounterMetricFamily:
+            family = CounterMetricFamily(name, doc, labels=labels)
+            family.add_metric(values, value)
+            return family
+
+        def gauge(name: str, doc: str, value: float) -> GaugeMetricFamily:
+            family = GaugeMetricFamily(name, doc, labels=labels)
+            family.add_metric(values, value)
+            return family
+
+        yield gauge("aphid_inference_queue_depth", "Images waiting for an inference worker.", batcher.queue_depth())
+        yield gauge("aphid_inference_busy_workers", "Inference workers running a batch.", batcher.busy_workers())
+        yield counter("aphid_inference_batches", "model.predict calls.", batcher.batches_run)
+        yield counter("aphid_inference_images", "Images run through the model.", batcher.images_run)
+        yield counter("aphid_rejected", "Requests rejected with 503 because the queue was full.", batcher.rejected)
+        yield gauge("aphid_models_memory_bytes", "Estimated weight memory of loaded models.", registry.memory_used())
+        yield counter("aphid_model_reloads", "Hot reloads of a changed model.", registry.reloads)
+        yield counter("aphid_model_evictions", "Models evicted to stay within the memory budget.", registry.evictions)
+        yield counter("aphid_result_cache_hits", "Exact-match result cache hits.", result_cache.hits)
+        yield counter("aphid_result_cache_phash_hits", "Near-duplicate result cache hits.", result_cache.phash_hits)
+        yield counter("aphid_result_cache_misses", "Result cache misses.", result_cache.misses)
+        yield gauge("aphid_blob_queue_depth", "Images waiting for blob upload.", persister.queue_depth())
+        yield counter("aphid_blob_uploaded", "Images uploaded to blob storage.", persister.uploaded)
+        yield counter("aphid_blob_failed", "Images that failed blob upload after retries.", persister.failed)
+        yield counter("aphid_blob_dropped", "Images dropped because the upload queue was full.", persister.dropped)
+
+
+REGISTRY.register(_ServerCollector())
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next: Callable[..., Any]) -> Any:
+    # In-flight gauge and latency per endpoint; the body iterator is wrapped so
+    # streamed /predict/batch responses count until their last line is sent.
+    endpoint = request.url.path
+    if endpoint not in METRIC_ENDPOINTS:
+        return await call_next(request)
+    in_flight = REQUESTS_IN_FLIGHT.labels(endpoint)
+    in_flight.inc()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        in_flight.dec()
+        REQUEST_SECONDS.labels(endpoint, "500").observe(time.perf_counter() - started)
+        raise
+    body = response.body_iterator
+
+    async def finish() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            in_flight.dec()
+            REQUEST_SECONDS.labels(endpoint, str(response.status_code)).observe(time.perf_counter() - started)
+
+    response.body_iterator = finish()
+    return response
+
+
+def _decode_image(raw: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(raw)).convert("RGB")
+
+
+class _BufferPool:
+    # Reuses imgsz x imgsz x 3 letterbox buffers across requests instead of
+    # allocating a fresh array per image. A buffer goes back to the pool once
+    # its inference batch has been built.
+
+    def __init__(self, keep: int) -> None:
+        self.keep = keep
+        self._free: dict[int, list[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, imgsz: int) -> np.ndarray:
+        with self._lock:
+            free = self._free.get(imgsz)
+            if free:
+                return free.pop()
+        return np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+
+    def release(self, buffer: np.ndarray) -> None:
+        with self._lock:
+            free = self._free.setdefault(buffer.shape[0], [])
+            if len(free) < self.keep:
+                free.append(buffer)
+
+
+letterbox_pool = _BufferPool(DECODE_BUFFER_POOL)
+
+
+@dataclass
+class PreparedImage:
+    array: np.ndarray
+    size: tuple[int, int]
+    scale: tuple[float, float]
+    pad: tuple[int, int]
+    phash: int | None = None
+
+    def restore(self, result: Any) -> Any:
+        # Map boxes from letterbox pixels back to the original upload.
+        width, height = self.size
+        result.orig_shape = (height, width)
+        if result.boxes is not None:
+            data = result.boxes.data.clone()
+            data[:, [0, 2]] = (data[:, [0, 2]] - self.pad[0]) / self.scale[0]
+            data[:, [1, 3]] = (data[:, [1, 3]] - self.pad[1]) / self.scale[1]
+            result.update(boxes=data)
+        # orig_img is the pooled buffer, which is reused after this request.
+        result.orig_img = None
+        return result
+
+
+def _prepare_image(raw: bytes, imgsz: int, with_phash: bool = False) -> PreparedImage:
+    # JPEG DCT scaling (draft) decodes 1/2, 1/4 or 1/8 size straight from the
+    # bitstream, never below imgsz, so a 12MP frame is not decoded in full only
+    # to be shrunk to 640px. The letterbox matches ultralytics' (same rounding,
+    # pad value 114), so the model's own letterbox is a no-op.
+    img = Image.open(io.BytesIO(raw))
+    size = img.size
+    if img.format == "JPEG":
+        img.draft("RGB", (imgsz, imgsz))
+    img = img.convert("RGB")
+    phash = _dhash(img) if with_phash else None
+
+    gain = min(imgsz / size[0], imgsz / size[1])
+    new_w, new_h = max(1, round(size[0] * gain)), max(1, round(size[1] * gain))
+    if img.size != (new_w, new_h):
+        img = img.resize((new_w, new_h), Image.Resampling.BILINEAR)
+    left = round((imgsz - new_w) / 2 - 0.1)
+    top = round((imgsz - new_h) / 2 - 0.1)
+
+    buffer = letterbox_pool.acquire(imgsz)
+    buffer.fill(114)
+    buffer[top : top + new_h, left : left + new_w] = np.asarray(img)[:, :, ::-1]
+    return PreparedImage(buffer, size, (new_w / size[0], new_h / size[1]), (left, top), phash)
+
+
+def _decode_input(raw: bytes, imgsz: int) -> PreparedImage | Image.Image:
+    return _prepare_image(raw, imgsz) if DECODE_FAST else _decode_image(raw)
+
+
+async def _infer_prepared(
+    prepared: PreparedImage,
+    params: PredictParams,
+    handle: ModelHandle,
+    submit: Callable[..., Any] | None = None,
+) -> tuple[Any, dict[str, Any]]:
+    try:
+        result, batch_stats = await (submit or batcher.submit)(prepared.array, params, handle)
+    finally:
+        letterbox_pool.release(prepared.array)
+    return prepared.restore(result), batch_stats
+
+
+async def _infer_input(
+    image: PreparedImage | Image.Image,
+    params: PredictParams,
+    handle: ModelHandle,
+    timer: StageTimer,
+    submit: Callable[..., Any] | None = None,
+) -> tuple[Any, dict[str, Any]]:
+    submit = submit or batcher.submit
+    if isinstance(image, PreparedImage):
+        result, batch_stats = await _infer_prepared(image, params, handle, submit)
+    else:
+        result, batch_stats = await submit(image, params, handle)
+    timer.add_batch(batch_stats)
+    return result, batch_stats
+
+
+class StageTimer:
+    # Per-request stage durations. Every stage is observed into
+    # aphid_stage_seconds; the totals can also be sent back as a Server-Timing
+    # header (SERVER_TIMING=1, or per request with "X-Server-Timing: 1").
+
+    def __init__(self, handle: ModelHandle) -> None:
+        self.labels = (handle.name, handle.backend)
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.labels(name, *self.labels).observe(seconds)
+
+    def add_batch(self, batch_stats: dict[str, Any]) -> None:
+        self.add("queue_wait", batch_stats["queue_wait_ms"] / 1000.0)
+        self.add("inference", batch_stats["inference_ms"] / 1000.0)
+
+    def detections(self, count: int) -> None:
+        DETECTIONS_PER_IMAGE.labels(*self.labels).observe(count)
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000.0:.2f}" for name, seconds in self.stages.items())
+
+
+def _wants_timing(request: Request) -> bool:
+    return SERVER_TIMING or request.headers.get("x-server-timing", "").strip().lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class ResponseFormat:
+    layout: str
+    msgpack: bool
+
+
+def _response_format(request: Request, layout: str, count_only: bool) -> ResponseFormat:
+    # layout picks how detections are laid out, the Accept header picks the
+    # encoding: rows (list of dicts, the default), columnar (parallel arrays,
+    # packed float32 buffers under msgpack) or count (no boxes at all).
+    if layout not in RESPONSE_LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RESPONSE_LAYOUTS)}.")
+    accept = request.headers.get("accept", "").lower()
+    packed = "application/x-msgpack" in accept or "application/msgpack" in accept
+    return ResponseFormat("count" if count_only else layout, packed)
+
+
+def _render_response(payload: dict[str, Any], fmt: ResponseFormat, timer: StageTimer, timing: bool) -> Response:
+    # Rendered here rather than by FastAPI so encoding is timed as part of the
+    # "serialize" stage.
+    with timer.stage("serialize"):
+        detections = payload.get("detections")
+        if isinstance(detections, DetectionArrays):
+            payload = dict(payload)
+            if fmt.layout == "count":
+                del payload["detections"]
+            elif fmt.layout == "columnar":
+                payload["detections"] = detections.columns(packed=fmt.msgpack)
+            else:
+                payload["detections"] = detections.rows()
+        if fmt.msgpack:
+            body = msgpack.packb(payload)
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    headers = {"Vary": "Accept"}
+    if timing:
+        headers["Server-Timing"] = timer.header()
+    media_type = "application/x-msgpack" if fmt.msgpack else "application/json"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Inference queue is full, retry later.",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+
 @app.post("/predict")
 async def predict(
+    request: Request,
     image: UploadFile = File(...),
     conf: float = DEFAULT_CONF,
     iou: float = DEFAULT_IOU,
     imgsz: int = DEFAULT_IMGSZ,
     max_det: int = DEFAULT_MAX_DET,
-) -> dict[str, Any]:
+    tiles: str = "off",
+    tile_overlap: float = TILE_OVERLAP,
+    tile_merge: str = "nms",
+    model: str | None = None,
+    response_format: str = Query("rows", alias="format"),
+    count_only: bool = False,
+) -> Response:
     if not image.filename:
         raise HTTPException(status_code=400, detail="Missing image filename.")
+    # Shed load before spending CPU on reading and decoding the upload.
+    if batcher.is_full():
+        batcher.rejected += 1
+        raise _overloaded()
 
-    raw = await image.read()
+    # The handle is pinned for the whole request, so a hot reload mid-request
+    # does not mix model versions.
+    handle = await _resolve_model(model)
+    timer = StageTimer(handle)
+    timing = _wants_timing(request)
+    fmt = _response_format(request, response_format, count_only)
+    with timer.stage("read"):
+        raw = await image.read()
     if not raw:
         raise HTTPException(status_code=400, detail="Empty image.")
+    if tile_merge not in ("nms", "fusion"):
+        raise HTTPException(status_code=400, detail="tile_merge must be 'nms' or 'fusion'.")
+    try:
+        params = _predict_params(conf, iou, imgsz, max_det)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    cache_key = (*params, tiles, float(tile_overlap), tile_merge, handle.name, handle.version)
+    digest = ""
+    phash = None
+    cached = None
+    if result_cache.enabled:
+        digest = await asyncio.to_thread(lambda: hashlib.blake2b(raw, digest_size=16).hexdigest())
+        cached = result_cache.get(digest, cache_key)
+        if cached is not None:
+            return _render_response(_cached_response(image.filename, cached), fmt, timer, timing)
 
+    # Tiling crops the full-resolution image; everything else takes the
+    # downscaled decode straight to a model-ready letterbox.
+    with_phash = result_cache.enabled and result_cache.phash
+    prepared = None
     try:
-        pil_img = Image.open(io.BytesIO(raw)).convert("RGB")
+        with timer.stage("decode"):
+            if DECODE_FAST and tiles == "off":
+                prepared = await asyncio.to_thread(_prepare_image, raw, params[2], with_phash)
+            else:
+                pil_img = await asyncio.to_thread(_decode_image, raw)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Invalid image: {exc}") from exc
 
-    results = model.predict(
-        source=pil_img,
-        conf=float(conf),
-        iou=float(iou),
-        imgsz=int(imgsz),
-        max_det=int(max_det),
-        device="cpu",
-        verbose=False,
-    )
+    if with_phash:
+        phash = prepared.phash if prepared is not None else await asyncio.to_thread(_dhash, pil_img)
+        cached = result_cache.get_similar(phash, cache_key)
+        if cached is not None:
+            if prepared is not None:
+                letterbox_pool.release(prepared.array)
+            return _render_response(_cached_response(image.filename, cached), fmt, timer, timing)
+    if result_cache.enabled:
+        result_cache.misses += 1
 
-    r0 = results[0]
-    boxes = r0.boxes
-    names = r0.names
-    detections: list[dict[str, Any]] = []
+    tile_boxes: list[tuple[int, int, int, int]] = []
+    if tiles != "off":
+        try:
+            tile_boxes = _plan_tiles(pil_img.size, tiles, float(tile_overlap), params[2])
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    if boxes is not None:
-        xyxy = boxes.xyxy.detach().cpu().tolist() if boxes.xyxy is not None else []
-        confs = boxes.conf.detach().cpu().tolist() if boxes.conf is not None else []
-        clss = boxes.cls.detach().cpu().tolist() if boxes.cls is not None else []
-        for i in range(len(xyxy)):
-            cls_id = int(clss[i]) if i < len(clss) else -1
-            detections.append(
-                {
-                    "class_id": cls_id,
-                    "class_name": names.get(cls_id, str(cls_id)),
-                    "confidence": float(confs[i]) if i < len(confs) else None,
-                    "bbox_xyxy": [float(v) for v in xyxy[i]],
-                }
+    tiles_info = None
+    try:
+        if len(tile_boxes) > 1:
+            detections, tiles_info, batch_stats = await _predict_tiled(
+                pil_img, tile_boxes, params, handle, float(tile_overlap), tile_merge
             )
+            timer.add_batch(batch_stats)
+            timer.add("tile_merge", tiles_info["merge_ms"] / 1000.0)
+        else:
+            r0, batch_stats = await _infer_input(prepared or pil_img, params, handle, timer)
+            detections = DetectionArrays.from_result(r0)
+    except QueueFullError:
+        raise _overloaded() from None
+    timer.detections(len(detections))
 
     request_id = f"{_utc_stamp()}_{uuid.uuid4().hex[:10]}"
     safe_name = _safe_filename(image.filename)
     image_blob_name = f"{request_id}_{safe_name}"
     storage_error = None
     image_url = None
-    if blob_service is not None:
-        try:
-            image_url = _upload_image_to_blob(image_blob_name, raw, image.content_type or "image/jpeg")
-        except Exception as exc:
-            storage_error = str(exc)
+    blob_status = None
+    if persister.enabled:
+        with timer.stage("blob"):
+            blob_status = await persister.enqueue(image_blob_name, raw, image.content_type or "image/jpeg")
+        if blob_status == "dropped":
+            storage_error = "Blob upload queue is full; image was not persisted."
+        else:
+            image_url = persister.blob_url(image_blob_name)
     else:
         storage_error = "Blob storage is not configured."
 
@@ -157,14 +1916,413 @@ async def predict(
         "filename": image.filename,
         "count": len(detections),
         "detections": detections,
+        "model": handle.name,
+        "model_version": handle.version,
         "blob_saved": storage_error is None,
+        "batch": batch_stats,
     }
+    if tiles_info is not None:
+        response["tiles"] = tiles_info
+    if blob_status:
+        response["blob_status"] = blob_status
     if image_url:
         response["image_blob_name"] = image_blob_name
         response["image_blob_url"] = image_url
     if storage_error:
         response["storage_error"] = storage_error
+
+    if result_cache.enabled:
+        cached_value = {k: v for k, v in response.items() if k not in ("request_id", "filename", "batch")}
+        result_cache.put(digest, cache_key, cached_value, phash)
+        response["cache"] = {"hit": False}
+    return _render_response(response, fmt, timer, timing)
+
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+
+
+def _iter_archive(fileobj: Any) -> Iterator[tuple[str, bytes | Exception]]:
+    # Yields one image member at a time; tar is read in streaming mode, zip via
+    # its central directory, so only the current member is held in memory.
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_SUFFIXES):
+                    continue
+                if info.file_size > BATCH_MAX_MEMBER_BYTES:
+                    yield info.filename, ValueError("Archive member is too large.")
+                    continue
+                yield info.filename, archive.read(info)
+        return
+
+    fileobj.seek(0)
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.lower().endswith(IMAGE_SUFFIXES):
+                continue
+            if member.size > BATCH_MAX_MEMBER_BYTES:
+                yield member.name, ValueError("Archive member is too large.")
+                continue
+            extracted = archive.extractfile(member)
+            yield member.name, extracted.read() if extracted is not None else ValueError("Unreadable member.")
+
+
+async def _iter_batch_inputs(form: Any) -> AsyncIterator[tuple[str, bytes | Exception]]:
+    for upload in form.getlist("images"):
+        if isinstance(upload, str):
+            continue
+        yield upload.filename or "image.jpg", await upload.read()
+    for upload in form.getlist("archive"):
+        if isinstance(upload, str):
+            continue
+        members = _iter_archive(upload.file)
+        while True:
+            member = await asyncio.to_thread(next, members, None)
+            if member is None:
+                break
+            yield member
+
+
+async def _submit_patiently(
+    image: ImageInput,
+    params: PredictParams,
+    handle: ModelHandle,
+) -> tuple[Any, dict[str, Any]]:
+    # Batch jobs yield to live /predict traffic: back off on a full queue
+    # instead of failing the image.
+    for attempt in range(20):
+        try:
+            return await batcher.submit(image, params, handle)
+        except QueueFullError:
+            await asyncio.sleep(min(1.0, 0.05 * 2**attempt))
+    raise QueueFullError("Inference queue stayed full.")
+
+
+async def _batch_item(
+    index: int,
+    filename: str,
+    raw: bytes | Exception,
+    params: PredictParams,
+    handle: ModelHandle,
+    store: bool,
+) -> dict[str, Any]:
+    line: dict[str, Any] = {"index": index, "filename": filename}
+    if isinstance(raw, Exception):
+        return {**line, "error": str(raw)}
+    if not raw:
+        return {**line, "error": "Empty image."}
+    timer = StageTimer(handle)
+    try:
+        with timer.stage("decode"):
+            image = await asyncio.to_thread(_decode_input, raw, params[2])
+    except Exception as exc:
+        return {**line, "error": f"Invalid image: {exc}"}
+
+    result, batch_stats = await _infer_input(image, params, handle, timer, _submit_patiently)
+    with timer.stage("serialize"):
+        detections = _result_to_detections(result)
+    timer.detections(len(detections))
+    line.update({"count": len(detections), "detections": detections, "batch": batch_stats})
+    if store and persister.enabled:
+        blob_name = f"{_utc_stamp()}_{uuid.uuid4().hex[:10]}_{_safe_filename(Path(filename).name)}"
+        with timer.stage("blob"):
+            blob_status = await persister.enqueue(blob_name, raw, "image/jpeg")
+        line["blob_status"] = blob_status
+        if blob_status != "dropped":
+            line["image_blob_name"] = blob_name
+    return line
+
+
+async def _stream_batch(
+    form: Any,
+    params: PredictParams,
+    handle: ModelHandle,
+    store: bool,
+) -> AsyncIterator[bytes]:
+    # At most BATCH_STREAM_WINDOW images are read, decoded, in inference or
+    # waiting to be sent at once. A slot is freed only after its line has been
+    # yielded, so a slow reader stalls decoding and memory does not grow with
+    # input size. Lines are emitted in completion order and carry the input index.
+    started = time.perf_counter()
+    window = asyncio.Semaphore(BATCH_STREAM_WINDOW)
+    lines: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+    totals = {"images": 0, "errors": 0, "detections": 0}
+
+    async def run_one(index: int, filename: str, raw: bytes | Exception) -> None:
+        try:
+            line = await _batch_item(index, filename, raw, params, handle, store)
+        except Exception as exc:
+            line = {"index": index, "filename": filename, "error": str(exc)}
+        await lines.put(line)
+
+    async def produce() -> None:
+        tasks: set[asyncio.Task] = set()
+        try:
+            index = 0
+            async for filename, raw in _iter_batch_inputs(form):
+                await window.acquire()
+                task = asyncio.create_task(run_one(index, filename, raw))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                index += 1
+        except Exception as exc:
+            await lines.put({"error": f"Failed to read batch input: {exc}"})
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            await lines.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (line := await lines.get()) is not None:
+            if "index" in line:
+                totals["images"] += 1
+                totals["errors"] += int("error" in line)
+                totals["detections"] += line.get("count", 0)
+            yield (json.dumps(line) + "\n").encode("utf-8")
+            if "index" in line:
+                window.release()
+        summary = {
+            **totals,
+            "model": handle.name,
+            "model_version": handle.version,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 3),
+        }
+        yield (json.dumps({"summary": summary}) + "\n").encode("utf-8")
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        await form.close()
+
+
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    conf: float = DEFAULT_CONF,
+    iou: float = DEFAULT_IOU,
+    imgsz: int = DEFAULT_IMGSZ,
+    max_det: int = DEFAULT_MAX_DET,
+    store: bool = False,
+    model: str | None = None,
+) -> StreamingResponse:
+    try:
+        params = _predict_params(conf, iou, imgsz, max_det)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    handle = await _resolve_model(model)
+    # The multipart form is parsed here rather than through File() params:
+    # FastAPI closes those uploads as soon as the endpoint returns, before the
+    # streamed body is produced. Starlette spools large parts to disk.
+    try:
+        form = await request.form(max_files=BATCH_MAX_FILES)
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid multipart body: {exc}") from exc
+    if not form.getlist("images") and not form.getlist("archive"):
+        await form.close()
+        raise HTTPException(status_code=400, detail="Send 'images' files and/or an 'archive' (zip/tar).")
+
+    return StreamingResponse(_stream_batch(form, params, handle, store), media_type="application/x-ndjson")
+
+
+class _LatestFrame:
+    # Single-slot mailbox: a new frame replaces one that was not picked up
+    # yet, so a client that outruns inference only ever waits for its newest frame.
+
+    def __init__(self) -> None:
+        self._item: tuple[int, bytes, float] | None = None
+        self._event = asyncio.Event()
+        self._closed = False
+
+    def put(self, item: tuple[int, bytes, float]) -> bool:
+        replaced = self._item is not None
+        self._item = item
+        self._event.set()
+        return replaced
+
+    def close(self) -> None:
+        self._closed = True
+        self._event.set()
+
+    async def get(self) -> tuple[int, bytes, float] | None:
+        while self._item is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        item, self._item = self._item, None
+        return item
+
+
+@app.post("/edge/detections")
+async def edge_detections(report: dict[str, Any] = Body(...)) -> dict[str, Any]:
+    # Detections computed on the device (raspberry_pi_client.py --edge-model).
+    # No image is involved; the report itself is queued for blob upload as
+    # <request_id>_edge.jsonl (not .json, which the spill dir uses for metadata).
+    # A frame that was also sent to /predict (ambiguous or audited) carries that
+    # request's id, so its edge report is stored next to the cloud upload.
+    count = report.get("count")
+    if not isinstance(count, int) or count < 0:
+        raise HTTPException(status_code=400, detail="Report needs a non-negative integer 'count'.")
+    request_id = report.get("request_id")
+    if request_id is None:
+        request_id = f"{_utc_stamp()}_{uuid.uuid4().hex[:10]}"
+    elif not isinstance(request_id, str) or not REQUEST_ID_RE.fullmatch(request_id):
+        raise HTTPException(status_code=400, detail="'request_id' must be an id returned by /predict.")
+    response: dict[str, Any] = {"request_id": request_id, "count": count, "blob_saved": False}
+    if not persister.enabled:
+        response["storage_error"] = "Blob storage is not configured."
+        return response
+    blob_name = f"{request_id}_edge.jsonl"
+    raw = (json.dumps({**report, "request_id": request_id}) + "\n").encode("utf-8")
+    blob_status = await persister.enqueue(blob_name, raw, "application/x-ndjson")
+    response["blob_status"] = blob_status
+    if blob_status == "dropped":
+        response["storage_error"] = "Blob upload queue is full; report was not persisted."
+    else:
+        response["blob_saved"] = True
+        response["report_blob_name"] = blob_name
     return response
+
+
+def _compact_boxes(result: Any) -> list[list[float]]:
+    xyxy, conf, cls = _result_arrays(result)
+    rows = np.concatenate([np.round(xyxy, 1), np.round(conf[:, None], 3), cls[:, None]], axis=1)
+    return rows.tolist()
+
+
+@app.websocket("/ws/predict")
+async def ws_predict(
+    websocket: WebSocket,
+    conf: float = DEFAULT_CONF,
+    iou: float = DEFAULT_IOU,
+    imgsz: int = DEFAULT_IMGSZ,
+    max_det: int = DEFAULT_MAX_DET,
+    boxes: bool = True,
+    store: bool = False,
+    model: str | None = None,
+) -> None:
+    # Binary messages are JPEG frames; text messages are JSON param updates
+    # such as {"conf": 0.3}. Replies are compact JSON: boxes are
+    # [x1, y1, x2, y2, conf, class_id] rows, class names are sent once in "hello".
+    await websocket.accept()
+    try:
+        initial = _predict_params(conf, iou, imgsz, max_det)
+        handle = await registry.get(model)
+    except Exception as exc:
+        if isinstance(exc, ValueError):
+            error = f"Invalid params: {exc}"
+        elif isinstance(exc, KeyError):
+            error = f"Unknown model: {model}"
+        else:
+            error = f"Model load failed: {exc}"
+        await websocket.send_json({"type": "error", "error": error})
+        await websocket.close(code=1008)
+        return
+    settings: dict[str, Any] = dict(zip(("conf", "iou", "imgsz", "max_det"), initial))
+    mailbox = _LatestFrame()
+    counters = {"received": 0, "dropped": 0, "processed": 0}
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict[str, Any]) -> None:
+        # The receive task (params, errors) and the frame loop (results) both
+        # reply; one lock keeps their messages from interleaving on the socket.
+        async with send_lock:
+            await websocket.send_json(message)
+
+    await send(
+        {
+            "type": "hello",
+            "model": handle.name,
+            "model_version": handle.version,
+            "names": handle.names,
+            "params": settings,
+            "boxes": boxes,
+        }
+    )
+
+    async def receive() -> None:
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes"):
+                    counters["received"] += 1
+                    if mailbox.put((counters["received"], message["bytes"], time.perf_counter())):
+                        counters["dropped"] += 1
+                elif message.get("text"):
+                    # An invalid update is rejected as a whole and the session
+                    # keeps its current settings.
+                    try:
+                        update = json.loads(message["text"])
+                        if not isinstance(update, dict):
+                            raise ValueError("expected a JSON object such as {\"conf\": 0.3}.")
+                        merged = {**settings, **{key: update[key] for key in settings.keys() & update.keys()}}
+                        settings.update(zip(merged, _predict_params(**merged)))
+                    except ValueError as exc:
+                        await send({"type": "error", "error": f"Invalid params: {exc}"})
+                        continue
+                    await send({"type": "params", "params": settings})
+        finally:
+            mailbox.close()
+
+    sessions = REQUESTS_IN_FLIGHT.labels("/ws/predict")
+    sessions.inc()
+    receiver = asyncio.create_task(receive())
+    try:
+        while (frame := await mailbox.get()) is not None:
+            seq, raw, received_at = frame
+            params = (settings["conf"], settings["iou"], settings["imgsz"], settings["max_det"])
+            try:
+                # Looked up per frame, so long sessions pick up hot reloads.
+                handle = await registry.get(handle.name)
+                timer = StageTimer(handle)
+                with timer.stage("decode"):
+                    image = await asyncio.to_thread(_decode_input, raw, params[2])
+                result, batch_stats = await _infer_input(image, params, handle, timer)
+            except QueueFullError:
+                await send({"type": "error", "seq": seq, "error": "busy"})
+                continue
+            except Exception as exc:
+                await send({"type": "error", "seq": seq, "error": str(exc)})
+                continue
+
+            counters["processed"] += 1
+            count = len(result.boxes) if result.boxes is not None else 0
+            timer.detections(count)
+            message: dict[str, Any] = {
+                "type": "result",
+                "seq": seq,
+                "count": count,
+                "latency_ms": round((time.perf_counter() - received_at) * 1000.0, 1),
+                "dropped": counters["dropped"],
+            }
+            if boxes:
+                message["boxes"] = _compact_boxes(result)
+            if store and persister.enabled:
+                blob_name = f"{_utc_stamp()}_{uuid.uuid4().hex[:10]}_stream_{seq}.jpg"
+                message["blob_status"] = await persister.enqueue(blob_name, raw, "image/jpeg")
+            await send(message)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+        sessions.dec()
+
+
+def _cached_response(filename: str, cached: tuple[dict[str, Any], float]) -> dict[str, Any]:
+    # The image bytes were already persisted by the original request, so a hit
+    # returns that request's blob name/url instead of uploading again.
+    value, age_s = cached
+    return {
+        "request_id": f"{_utc_stamp()}_{uuid.uuid4().hex[:10]}",
+        "filename": filename,
+        **value,
+        "cache": {"hit": True, "age_s": round(age_s, 3)},
+    }
 '''
 
 
@@ -184,10 +2342,11 @@ COPY requirements.txt /app/requirements.txt
 RUN pip install --no-cache-dir -r /app/requirements.txt
 
 COPY server.py /app/server.py
-COPY model/best.pt /app/model/best.pt
+COPY model/ /app/model/
 
 EXPOSE 8000
 ENV MODEL_PATH=/app/model/best.pt
+ENV MODEL_BACKEND=torch
 CMD ["uvicorn", "server:app", "--host", "0.0.0.0", "--port", "8000"]
 """
 
@@ -198,6 +2357,11 @@ python-multipart==0.0.20
 pillow==11.0.0
 ultralytics==8.3.50
 azure-storage-blob==12.24.0
+aiohttp==3.11.11
+onnxruntime==1.20.1
+openvino==2024.6.0
+prometheus-client==0.21.1
+msgpack==1.1.0
 """
 
 
@@ -231,7 +2395,52 @@ def parse_args() -> argparse.Namespace:
         default="linux/amd64",
         help="Docker build platform.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--export",
+        nargs="*",
+        default=[],
+        choices=["onnx", "openvino"],
+        help="Export the model for these MODEL_BACKEND runtimes and bundle the artifacts.",
+    )
+    parser.add_argument(
+        "--export-imgsz",
+        type=int,
+        default=640,
+        help="Reference image size for exported models (exports use dynamic shapes).",
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=["int8"],
+        default=None,
+        help="Run static post-training quantization of the ONNX export.",
+    )
+    parser.add_argument(
+        "--calib-images",
+        default="",
+        help="Image folder used to calibrate quantization ranges.",
+    )
+    parser.add_argument(
+        "--calib-count",
+        type=int,
+        default=200,
+        help="Max calibration images (0 means all).",
+    )
+    parser.add_argument(
+        "--eval-images",
+        default="",
+        help="Image folder for the FP32 vs INT8 report (defaults to --calib-images).",
+    )
+    parser.add_argument(
+        "--ship-quantized",
+        action="store_true",
+        help="Serve the INT8 model as model/best.onnx with MODEL_BACKEND=onnx (FP32 kept as model/best_fp32.onnx).",
+    )
+    args = parser.parse_args()
+    if args.quantize and not args.calib_images:
+        parser.error("--quantize requires --calib-images")
+    if args.ship_quantized and not args.quantize:
+        parser.error("--ship-quantized requires --quantize")
+    return args
 
 
 def _write_text(path: Path, text: str) -> None:
@@ -250,6 +2459,15 @@ def _resolve_model_path(model_path: Path) -> Path:
     raise FileNotFoundError(f"Model not found: {model_path}")
 
 
+def _export_model(model_path: Path, backend: str, imgsz: int) -> Path:
+    from ultralytics import YOLO
+
+    # Matches the dynamic-shape export server.py performs at startup when no
+    # bundled artifact is found, and lands where server.py looks for it.
+    exported = YOLO(str(model_path)).export(format=backend, dynamic=True, imgsz=imgsz, verbose=False)
+    return Path(exported)
+
+
 def main() -> None:
     args = parse_args()
     model_path = _resolve_model_path(Path(args.model))
@@ -259,7 +2477,11 @@ def main() -> None:
         shutil.rmtree(context_dir)
 
     _write_text(context_dir / "server.py", API_SERVER_CODE)
-    _write_text(context_dir / "Dockerfile", DOCKERFILE_CODE)
+    dockerfile = DOCKERFILE_CODE
+    if args.ship_quantized:
+        # The shipped INT8 model is model/best.onnx, which only the onnx backend serves.
+        dockerfile = dockerfile.replace("ENV MODEL_BACKEND=torch", "ENV MODEL_BACKEND=onnx")
+    _write_text(context_dir / "Dockerfile", dockerfile)
     _write_text(context_dir / "requirements.txt", REQUIREMENTS_CODE)
     (context_dir / "model").mkdir(parents=True, exist_ok=True)
     shutil.copy2(model_path, context_dir / "model" / "best.pt")
@@ -267,6 +2489,40 @@ def main() -> None:
     print(f"[ok] Docker context generated at: {context_dir.resolve()}")
     print(f"[ok] Model copied from: {model_path.resolve()}")
 
+    for backend in args.export:
+        exported = _export_model(context_dir / "model" / "best.pt", backend, args.export_imgsz)
+        print(f"[ok] Exported {backend} model: {exported.resolve()}")
+
+    if args.quantize == "int8":
+        from model_quantization import run_int8_stage
+
+        report_path = context_dir / "quantization_report.json"
+        report = run_int8_stage(
+            model_dir=context_dir / "model",
+            calib_dir=Path(args.calib_images),
+            eval_dir=Path(args.eval_images or args.calib_images),
+            report_path=report_path,
+            imgsz=args.export_imgsz,
+            calib_count=args.calib_count,
+            conf=0.25,
+            iou=0.45,
+            max_det=1000,
+            ship=args.ship_quantized,
+        )
+        latency = report["latency"]
+        print(f"[ok] INT8 model: {context_dir / 'model' / report['int8_model']}")
+        print(
+            f"[ok] count MAE vs FP32={report['count_mae_vs_fp32']}, "
+            f"mAP50-95 delta={report['map_delta']['map50_95']} (reference: {report['reference']})"
+        )
+        print(
+            f"[ok] p50/p95 latency FP32={latency['fp32']['p50_ms']}/{latency['fp32']['p95_ms']} ms, "
+            f"INT8={latency['int8']['p50_ms']}/{latency['int8']['p95_ms']} ms"
+        )
+        print(f"[ok] Quantization report: {report_path.resolve()}")
+        if args.ship_quantized:
+            print("[ok] Dockerfile sets MODEL_BACKEND=onnx to serve the INT8 model")
+
     if not args.build:
         print("[skip] Docker build disabled.")
         return
@@ -2,15 +2,24 @@ from __future__ import annotations
 
 import argparse
 import json
+import queue
+import random
+import socket
+import sqlite3
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
 
 import cv2
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 
 DEFAULT_CONFIDENCE = 0.25
 DEFAULT_TIMEOUT = 30
+DEFAULT_STREAM_FPS = 5.0
+DEFAULT_JPEG_QUALITY = 85
 
 
 def normalize_predict_url(url: str) -> str:
@@ -20,69 +29,719 @@ def normalize_predict_url(url: str) -> str:
     return f"{u}/predict"
 
 
-def capture_image(camera_index: int = 0, save_path: str = "capture.jpg") -> Path | None:
-    cap = cv2.VideoCapture(camera_index)
-    if not cap.isOpened():
-        print(f"Error: cannot open camera index {camera_index}")
-        return None
+def normalize_ws_url(url: str) -> str:
+    u = url.strip().rstrip("/")
+    for suffix in ("/ws/predict", "/predict"):
+        if u.endswith(suffix):
+            u = u[: -len(suffix)]
+            break
+    if u.startswith("https://"):
+        u = "wss://" + u[len("https://") :]
+    elif u.startswith("http://"):
+        u = "ws://" + u[len("http://") :]
+    return f"{u}/ws/predict"
+
+
+class CameraSession:
+    # Keeps the camera open for the whole run. A background thread reads
+    # continuously, so the driver buffer never goes stale and latest() always
+    # returns the newest frame without paying for open/warm-up per shot.
+
+    def __init__(self, camera_index: int = 0, width: int = 0, height: int = 0, warmup_frames: int = 5) -> None:
+        self.cap = cv2.VideoCapture(camera_index)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"cannot open camera index {camera_index}")
+        if width > 0:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height > 0:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.warmup_frames = warmup_frames
+        self._frame = None
+        self._seq = 0
+        self._failed = False
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._grab, daemon=True)
+        self._thread.start()
+
+    def _grab(self) -> None:
+        # Warm-up frames reduce black/unstable first frame on some USB camera drivers.
+        skip = self.warmup_frames
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            with self._cond:
+                if not ret:
+                    self._failed = True
+                    self._cond.notify_all()
+                    return
+                if skip > 0:
+                    skip -= 1
+                    continue
+                self._frame = frame
+                self._seq += 1
+                self._cond.notify_all()
+
+    def latest(self, after: int = 0, timeout: float = 10.0) -> tuple[int, object | None]:
+        # Newest frame with a sequence number above `after` (0 = any frame).
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after or self._failed, timeout=timeout)
+            if self._seq <= after:
+                return after, None
+            return self._seq, self._frame
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self.cap.release()
+
+
+def encode_jpeg(frame, quality: int = DEFAULT_JPEG_QUALITY, max_width: int = 0) -> bytes | None:
+    # Encoded in memory; nothing touches the SD card unless --output is set.
+    if max_width > 0 and frame.shape[1] > max_width:
+        height = round(frame.shape[0] * max_width / frame.shape[1])
+        frame = cv2.resize(frame, (max_width, height), interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    return jpeg.tobytes() if ok else None
+
+
+class ChangeGate:
+    # Skips frames that barely differ from the last one sent. Frames are
+    # compared as 64x48 greyscale thumbnails (INTER_AREA averages out sensor
+    # noise) by mean absolute grey-level difference. Comparing against the
+    # last *sent* frame means slow changes still add up to an upload.
+
+    def __init__(self, threshold: float, max_age_s: float, size: tuple[int, int] = (64, 48)) -> None:
+        self.threshold = threshold
+        self.max_age_s = max_age_s
+        self.size = size
+        self.checked = 0
+        self.skipped = 0
+        self.sent_bytes = 0
+        self._reference = None
+        self._reference_at = 0.0
+
+    def check(self, frame) -> tuple[bool, float]:
+        # Returns (send, score). A disabled gate (threshold <= 0) sends everything.
+        self.checked += 1
+        if self.threshold <= 0:
+            return True, 0.0
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), self.size, interpolation=cv2.INTER_AREA)
+        now = time.monotonic()
+        if self._reference is None:
+            score = float("inf")
+        else:
+            score = float(cv2.absdiff(thumb, self._reference).mean())
+        stale = self.max_age_s > 0 and now - self._reference_at >= self.max_age_s
+        if score < self.threshold and not stale:
+            self.skipped += 1
+            return False, score
+        self._reference = thumb
+        self._reference_at = now
+        return True, score
+
+    def sent(self, size: int) -> None:
+        self.sent_bytes += size
+
+    def summary(self) -> str:
+        # Bytes saved is estimated from the mean size of the frames that were sent.
+        sent = self.checked - self.skipped
+        saved = self.skipped * self.sent_bytes / sent if sent else 0.0
+        rate = 100.0 * self.skipped / self.checked if self.checked else 0.0
+        return f"skipped {self.skipped}/{self.checked} ({rate:.0f}%), ~{saved / 1e6:.1f} MB saved"
+
+
+def create_http_session() -> requests.Session:
+    # One pooled keep-alive connection, so each upload skips the TCP/TLS handshake.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def send_for_inference(
+    session: requests.Session,
+    jpeg: bytes,
+    api_url: str,
+    conf: float,
+    timeout: int,
+    count_only: bool = False,
+    filename: str = "capture.jpg",
+) -> dict:
+    files = {"image": (filename, jpeg, "image/jpeg")}
+    params = {"conf": conf}
+    if count_only:
+        params["count_only"] = "true"
+    response = session.post(api_url, files=files, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def send_edge_report(session: requests.Session, report: dict, edge_url: str, timeout: int) -> dict:
+    response = session.post(edge_url, json=report, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def send_batch(
+    session: requests.Session, frames: list[tuple[str, bytes]], batch_url: str, conf: float, timeout: int
+) -> list[dict]:
+    # One multipart request to /predict/batch; returns its NDJSON lines.
+    files = [("images", (name, jpeg, "image/jpeg")) for name, jpeg in frames]
+    response = session.post(batch_url, files=files, params={"conf": conf, "store": "true"}, timeout=timeout)
+    response.raise_for_status()
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+def is_retryable(exc: Exception) -> bool:
+    # Network loss, timeouts and server overload are worth retrying later; a
+    # 4xx answer (e.g. an unreadable image) would fail again.
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, "response", None)
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+def is_missing_endpoint(exc: Exception) -> bool:
+    # 404/405: the server has no /predict/batch (an older build).
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code in (404, 405)
+
+
+def is_rejected_frame(exc: Exception) -> bool:
+    # The server read the frame and refused it (unreadable, too large, ...);
+    # sending the same bytes again would fail the same way.
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code in (400, 413, 415, 422)
+
+
+class FrameSpool:
+    # Durable on-device backlog of frames whose upload failed, in one SQLite
+    # file (JPEG bytes + capture metadata). The total size is capped; the
+    # oldest frames are evicted first.
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS frames ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, seq INTEGER, captured_at TEXT, size INTEGER, jpeg BLOB)"
+        )
+        self._db.commit()
+
+    def add(self, seq: int, captured_at: str, jpeg: bytes) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO frames (seq, captured_at, size, jpeg) VALUES (?, ?, ?, ?)",
+                (seq, captured_at, len(jpeg), jpeg),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM frames").fetchone()[0]
+            for frame_id, size in self._db.execute("SELECT id, size FROM frames ORDER BY id").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM frames WHERE id = ?", (frame_id,))
+                total -= size
+                self.evicted += 1
+
+    def oldest(self, limit: int) -> list[tuple[int, int, str, bytes]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, seq, captured_at, jpeg FROM frames ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+
+    def remove(self, ids: list[int]) -> None:
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM frames WHERE id = ?", [(i,) for i in ids])
 
-    # Warm-up frames reduce black/unstable first frame on some USB camera drivers.
-    for _ in range(5):
-        cap.read()
-    ret, frame = cap.read()
-    cap.release()
+    def stats(self) -> tuple[int, int]:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM frames").fetchone()
 
-    if not ret:
-        print("Error: failed to capture frame.")
-        return None
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
 
-    out = Path(save_path)
-    cv2.imwrite(str(out), frame)
-    return out
 
+def _print_stream_results(ws) -> None:
+    while True:
+        try:
+            message = json.loads(ws.recv())
+        except Exception:
+            return
+        kind = message.get("type")
+        if kind == "hello":
+            print(f"Stream connected, params: {message.get('params')}")
+        elif kind == "result":
+            print(
+                f"[{datetime.now().isoformat(timespec='seconds')}] frame {message['seq']}: "
+                f"aphids={message['count']} latency={message['latency_ms']} ms dropped={message['dropped']}"
+            )
+        elif kind == "error":
+            print(f"Server error (frame {message.get('seq')}): {message.get('error')}")
+
+
+def stream_inference(
+    camera: CameraSession,
+    ws_url: str,
+    conf: float,
+    fps: float,
+    quality: int,
+    max_width: int,
+    timeout: int,
+    gate: ChangeGate,
+) -> None:
+    # One WebSocket for the whole session; the server keeps only the newest
+    # unprocessed frame, so sending faster than it infers just drops frames.
+    import websocket
+
+    ws = websocket.create_connection(f"{ws_url}?conf={conf}&boxes=false", timeout=timeout)
+    ws.settimeout(None)
+    reader = threading.Thread(target=_print_stream_results, args=(ws,), daemon=True)
+    reader.start()
+
+    period = 1.0 / fps if fps > 0 else 0.0
+    seq = 0
+    try:
+        while reader.is_alive():
+            started = time.monotonic()
+            seq, frame = camera.latest(after=seq)
+            if frame is None:
+                print("Error: failed to capture frame.")
+                break
+            send, _ = gate.check(frame)
+            jpeg = encode_jpeg(frame, quality, max_width) if send else None
+            if jpeg is not None:
+                ws.send_binary(jpeg)
+                gate.sent(len(jpeg))
+            time.sleep(max(0.0, period - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ws.close()
+        if gate.threshold > 0:
+            print(f"Change gate: {gate.summary()}")
+
+
+class EdgeDetector:
+    # Runs an export of best.pt on the Pi (ONNX, TFLite, NCNN or OpenVINO,
+    # whatever ultralytics can load). The session is created once and reused.
+    # Detections are made down to the low end of the ambiguous band. Any box
+    # inside the band [low, high) marks the frame as ambiguous, and the
+    # caller then sends it to the cloud model.
+
+    def __init__(self, path: str, imgsz: int, conf: float, band: tuple[float, float]) -> None:
+        from ultralytics import YOLO
+
+        self.path = Path(path)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.band = band
+        self.model = YOLO(str(self.path), task="detect")
+        self.latencies_ms: list[float] = []
+        # The first call builds the session; keep it out of the per-frame numbers.
+        self.model.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+
+    def detect(self, frame) -> dict:
+        started = time.perf_counter()
+        result = self.model.predict(frame, conf=min(self.band[0], self.conf), imgsz=self.imgsz, verbose=False)[0]
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        self.latencies_ms.append(latency_ms)
+        boxes = result.boxes
+        xyxy = boxes.xyxy.cpu().numpy()
+        conf = boxes.conf.cpu().numpy()
+        cls = boxes.cls.cpu().numpy()
+        keep = conf >= self.conf
+        rows = np.concatenate([np.round(xyxy[keep], 1), np.round(conf[keep, None], 3), cls[keep, None]], axis=1)
+        return {
+            "model": self.path.name,
+            "count": int(keep.sum()),
+            "boxes": rows.tolist(),
+            "latency_ms": round(latency_ms, 1),
+            "ambiguous": bool(((conf >= self.band[0]) & (conf < self.band[1])).any()),
+        }
+
+    def summary(self) -> str:
+        if not self.latencies_ms:
+            return "no frames"
+        ordered = sorted(self.latencies_ms)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return f"{len(ordered)} frame(s), mean {sum(ordered) / len(ordered):.0f} ms, p95 {p95:.0f} ms"
+
+
+class UploadPipeline:
+    # Upload and result stages behind the capture loop, joined by bounded
+    # queues. Up to `in_flight` uploads run at once, each on its own
+    # keep-alive session, so a slow round-trip does not hold up the next
+    # capture. When the upload queue is full the oldest waiting shot is
+    # dropped, which keeps what is sent as fresh as possible.
+    #
+    # With a spool, frames whose upload fails for a retryable reason are
+    # stored on disk instead of lost. A catch-up thread sends them oldest
+    # first to /predict/batch, one batch at a time and only while no live
+    # frame is waiting.
+    #
+    # A shot carrying an edge report posts only the report to /edge/detections;
+    # the JPEG is kept only for spooling if that fails. A shot with a fallback
+    # reason (ambiguous or audit) goes to /predict first, and its edge report
+    # follows with the cloud request id, count and image blob, so the server
+    # stores both results side by side.
+
+    def __init__(self, api_url: str, args: argparse.Namespace, spool: FrameSpool | None = None) -> None:
+        self.api_url = api_url
+        self.batch_url = f"{api_url}/batch"
+        # Cleared when the server has no /predict/batch; catch-up then sends
+        # spooled frames one at a time through /predict.
+        self.use_batch = True
+        self.edge_url = f"{api_url[: -len('/predict')]}/edge/detections"
+        self.args = args
+        self.spool = spool
+        self.uploads: queue.Queue = queue.Queue(maxsize=max(1, args.queue_size))
+        self.results: queue.Queue = queue.Queue(maxsize=max(1, args.queue_size))
+        self.captured = 0
+        self.dropped = 0
+        self.ok = 0
+        self.failed = 0
+        self.spooled = 0
+        self.caught_up = 0
+        self._stop = threading.Event()
+        self._drain = threading.Event()
+        self._wake = threading.Event()
+        self._uploaders = [threading.Thread(target=self._upload, daemon=True) for _ in range(max(1, args.in_flight))]
+        self._printer = threading.Thread(target=self._print_results, daemon=True)
+        self._catcher = threading.Thread(target=self._catch_up, daemon=True) if spool is not None else None
+
+    def start(self) -> None:
+        for thread in self._uploaders:
+            thread.start()
+        self._printer.start()
+        if self._catcher is not None:
+            self._catcher.start()
+
+    def submit(self, seq: int, jpeg: bytes, report: dict | None = None, fallback: str = "") -> None:
+        # Only the capture loop puts, so after taking one out there is room.
+        self.captured += 1
+        captured_at = datetime.now().isoformat(timespec="seconds")
+        if report is not None:
+            report = {**report, "device": self.args.device_id, "seq": seq, "captured_at": captured_at}
+        item = (seq, captured_at, jpeg, report, fallback)
+        try:
+            self.uploads.put_nowait(item)
+        except queue.Full:
+            try:
+                dropped_seq = self.uploads.get_nowait()[0]
+                self.dropped += 1
+                print(f"Upload queue full, dropped frame {dropped_seq}")
+            except queue.Empty:
+                pass
+            self.uploads.put_nowait(item)
+
+    def _upload(self) -> None:
+        session = create_http_session()
+        while True:
+            item = self.uploads.get()
+            if item is None:
+                break
+            seq, captured_at, jpeg, report, fallback = item
+            started = time.monotonic()
+            result, error = None, None
+            try:
+                if report is not None and not fallback:
+                    result = send_edge_report(session, report, self.edge_url, self.args.timeout)
+                else:
+                    result = send_for_inference(
+                        session,
+                        jpeg,
+                        api_url=self.api_url,
+                        conf=self.args.conf,
+                        timeout=self.args.timeout,
+                        count_only=self.args.count_only,
+                    )
+            except (requests.RequestException, ValueError) as exc:
+                error = str(exc)
+                if self.spool is not None and is_retryable(exc):
+                    self.spool.add(seq, captured_at, jpeg)
+                    self.spooled += 1
+                    error += " (spooled)"
+            label = f"frame {seq}"
+            if fallback:
+                label += f" ({fallback}, edge={report['count']})"
+                edge_error = self._send_fallback_report(session, report, fallback, result)
+                if edge_error:
+                    label += f" [edge report failed: {edge_error}]"
+            elif report is not None:
+                label += " (edge)"
+            self.results.put((label, captured_at, time.monotonic() - started, result, error))
+        session.close()
 
-def send_for_inference(image_path: Path, api_url: str, conf: float, timeout: int) -> dict | None:
+    def _send_fallback_report(self, session: requests.Session, report: dict, fallback: str, cloud: dict | None) -> str:
+        # Sent even when the cloud upload failed, so no edge result is lost; it
+        # then just gets an id of its own. Returns an error message or "".
+        report = {**report, "fallback": fallback}
+        if cloud is not None:
+            report.update(
+                request_id=cloud.get("request_id"),
+                cloud_count=cloud.get("count"),
+                image_blob_name=cloud.get("image_blob_name"),
+            )
+        try:
+            send_edge_report(session, report, self.edge_url, self.args.timeout)
+        except (requests.RequestException, ValueError) as exc:
+            return str(exc)
+        return ""
+
+    def _catch_up(self) -> None:
+        assert self.spool is not None
+        session = create_http_session()
+        delay = 0.0
+        backoff = 1.0
+        while True:
+            self._wake.wait(delay)
+            if self._stop.is_set():
+                break
+            if not self.uploads.empty():
+                delay = 0.5
+                continue
+            frames = self.spool.oldest(max(1, self.args.catchup_batch))
+            if not frames:
+                if self._drain.is_set():
+                    break
+                delay = 5.0
+                continue
+            named = [(f"{captured_at.replace(':', '')}_{seq}.jpg", jpeg) for _, seq, captured_at, jpeg in frames]
+            started = time.monotonic()
+            try:
+                if self.use_batch:
+                    lines = send_batch(session, named, self.batch_url, self.args.conf, self.args.timeout)
+                else:
+                    lines = self._send_singly(session, named)
+            except (requests.RequestException, ValueError) as exc:
+                if self.use_batch and is_missing_endpoint(exc):
+                    print(f"Catch-up batch endpoint missing ({exc}), falling back to single /predict uploads")
+                    self.use_batch = False
+                    delay = 0.0
+                    continue
+                # Any other refusal (400, 401, 413, ...) does not say which
+                # frame is at fault, so all of them stay spooled and the batch
+                # is retried after the backoff.
+                print(f"Catch-up paused ({exc}), {self.spool.stats()[0]} frame(s) spooled")
+                if self._drain.is_set():
+                    break
+                delay = backoff
+                backoff = min(60.0, backoff * 2)
+                continue
+            elapsed = time.monotonic() - started
+            done = []
+            for line in lines:
+                index = line.get("index")
+                if index is None or not 0 <= index < len(frames):
+                    continue
+                frame_id, seq, captured_at, _ = frames[index]
+                done.append(frame_id)
+                error = line.get("error")
+                self.results.put((f"spooled frame {seq}", captured_at, elapsed, None if error else line, error))
+            # Frames missing from a cut-off response stay spooled for the next round.
+            self.spool.remove(done)
+            self.caught_up += len(done)
+            delay, backoff = (0.0, 1.0) if done else (backoff, min(60.0, backoff * 2))
+        session.close()
+
+    def _send_singly(self, session: requests.Session, named: list[tuple[str, bytes]]) -> list[dict]:
+        # Same line shape as send_batch. Only frames the server refused get an
+        # error line (and leave the spool); any other failure stops the round,
+        # keeping the rest spooled.
+        lines: list[dict] = []
+        for index, (name, jpeg) in enumerate(named):
+            try:
+                result = send_for_inference(session, jpeg, self.api_url, self.args.conf, self.args.timeout, filename=name)
+            except (requests.RequestException, ValueError) as exc:
+                if not is_rejected_frame(exc):
+                    if lines:
+                        return lines
+                    raise
+                lines.append({"index": index, "error": str(exc)})
+                continue
+            lines.append({**result, "index": index})
+        return lines
+
+    def _print_results(self) -> None:
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            label, captured_at, elapsed, result, error = item
+            if result is None:
+                self.failed += 1
+                print(f"[{captured_at}] {label}: upload failed after {elapsed * 1000:.0f} ms: {error}")
+                continue
+            self.ok += 1
+            print(f"[{captured_at}] {label}: aphids={result.get('count', 0)} round-trip={elapsed * 1000:.0f} ms")
+            if "detections" in result and not label.startswith("spooled"):
+                print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    def close(self, drain: bool = False) -> None:
+        # Lets queued and in-flight uploads finish, then stops the stages.
+        # With drain=True (single-shot runs) the spool is first sent until it
+        # is empty or the server is unreachable; whatever is left is picked up
+        # by the next run.
+        for _ in self._uploaders:
+            self.uploads.put(None)
+        for thread in self._uploaders:
+            thread.join()
+        if drain:
+            self._drain.set()
+        else:
+            self._stop.set()
+        self._wake.set()
+        if self._catcher is not None:
+            self._catcher.join()
+        self.results.put(None)
+        self._printer.join()
+        summary = f"Captured {self.captured}, uploaded {self.ok}, failed {self.failed}, dropped {self.dropped}"
+        if self.spool is not None:
+            backlog, size = self.spool.stats()
+            summary += (
+                f", spooled {self.spooled}, caught up {self.caught_up}, evicted {self.spool.evicted}, "
+                f"backlog {backlog} frame(s) / {size / 1e6:.1f} MB"
+            )
+        print(summary)
+
+
+def run_periodic(camera: CameraSession, args: argparse.Namespace) -> None:
+    api_url = normalize_predict_url(args.url)
+    print(f"Using endpoint: {api_url}")
+    spool = FrameSpool(args.spool, int(args.spool_max_mb * 1024 * 1024)) if args.spool else None
+    pipeline = UploadPipeline(api_url, args, spool)
+    pipeline.start()
+    gate = ChangeGate(args.change_threshold, args.max_staleness)
+    edge = None
+    if args.edge_model:
+        edge = EdgeDetector(args.edge_model, args.edge_imgsz, args.conf, (args.ambiguous_low, args.ambiguous_high))
+        print(f"Edge model: {edge.path} (ambiguous band {args.ambiguous_low}-{args.ambiguous_high})")
+    fallbacks = {"ambiguous": 0, "audit": 0}
+    seq = 0
+    slot = 0
+    start = time.monotonic()
     try:
-        with image_path.open("rb") as f:
-            files = {"image": (image_path.name, f, "image/jpeg")}
-            params = {"conf": conf}
-            response = requests.post(api_url, files=files, params=params, timeout=timeout)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as exc:
-        print(f"HTTP error: {exc}")
-        return None
-    except ValueError as exc:
-        print(f"JSON parse error: {exc}")
-        return None
+        while True:
+            # Take a frame newer than the previous shot so the same image is
+            # never sent twice.
+            seq, frame = camera.latest(after=seq)
+            if frame is None:
+                print("Error: failed to capture frame.")
+                break
+            send, score = gate.check(frame)
+            jpeg = encode_jpeg(frame, args.jpeg_quality, args.max_width) if send else None
+            if jpeg is not None:
+                gate.sent(len(jpeg))
+                line = f"[{datetime.now().isoformat(timespec='seconds')}] Captured frame {seq} ({len(jpeg)} bytes)"
+                if gate.threshold > 0:
+                    line += f" change={score:.1f} | {gate.summary()}"
+                print(line)
+                if args.output:
+                    Path(args.output).write_bytes(jpeg)
+                report, fallback = None, ""
+                if edge is not None:
+                    report = edge.detect(frame)
+                    # Ambiguous frames and a random audit sample also go to
+                    # the cloud model; their edge report is still sent, tagged
+                    # with the reason, for comparison.
+                    if report["ambiguous"]:
+                        fallback = "ambiguous"
+                    elif random.random() < args.audit_rate:
+                        fallback = "audit"
+                    print(
+                        f"  edge: aphids={report['count']} latency={report['latency_ms']} ms"
+                        + (f" -> cloud ({fallback})" if fallback else "")
+                    )
+                    if fallback:
+                        fallbacks[fallback] += 1
+                pipeline.submit(seq, jpeg, report, fallback)
+
+            if args.interval <= 0:
+                break
+            # Shots are due at start + n * interval on the monotonic clock, so
+            # capture and encode time never add up to drift. Slots that have
+            # already passed are skipped instead of being shot in a burst.
+            slot += 1
+            missed = int((time.monotonic() - start) / args.interval) - slot
+            if missed > 0:
+                print(f"Capture fell behind, skipped {missed} slot(s)")
+                slot += missed
+            time.sleep(max(0.0, start + slot * args.interval - time.monotonic()))
+    finally:
+        pipeline.close(drain=args.interval <= 0)
+        if spool is not None:
+            spool.close()
+        if gate.threshold > 0:
+            print(f"Change gate: {gate.summary()}")
+        if edge is not None:
+            print(
+                f"Edge inference: {edge.summary()}; cloud fallbacks: "
+                f"{fallbacks['ambiguous']} ambiguous, {fallbacks['audit']} audit"
+            )
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Raspberry Pi camera client for YOLO aphid detection.")
     parser.add_argument("--url", required=True, help="Container App base URL or /predict URL.")
     parser.add_argument("--camera", type=int, default=0, help="OpenCV camera index.")
-    parser.add_argument("--interval", type=int, default=0, help="Seconds between captures. 0 means single shot.")
+    parser.add_argument("--interval", type=float, default=0, help="Seconds between captures. 0 means single shot.")
     parser.add_argument("--conf", type=float, default=DEFAULT_CONFIDENCE, help="Confidence threshold.")
     parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="HTTP timeout in seconds.")
-    parser.add_argument("--output", default="capture.jpg", help="Local capture image path.")
+    parser.add_argument("--in-flight", type=int, default=2, help="Max concurrent /predict uploads.")
+    parser.add_argument("--queue-size", type=int, default=4, help="Captured frames waiting for upload before the oldest is dropped.")
+    parser.add_argument("--spool", default="", help="SQLite file that keeps frames whose upload failed (off by default).")
+    parser.add_argument("--spool-max-mb", type=float, default=512.0, help="Spool size cap; oldest frames are evicted first.")
+    parser.add_argument("--catchup-batch", type=int, default=16, help="Spooled frames sent per /predict/batch request.")
+    parser.add_argument(
+        "--change-threshold",
+        type=float,
+        default=0.0,
+        help="Only upload frames whose mean grey-level change from the last sent frame is at least this (0 = off, try 3-6).",
+    )
+    parser.add_argument("--max-staleness", type=float, default=300.0, help="Upload anyway after this many seconds without one.")
+    parser.add_argument("--edge-model", default="", help="Run this export of best.pt on the device and send only detections.")
+    parser.add_argument("--edge-imgsz", type=int, default=640, help="Input size of the edge model.")
+    parser.add_argument("--ambiguous-low", type=float, default=0.15, help="Edge boxes at or above this confidence ...")
+    parser.add_argument("--ambiguous-high", type=float, default=0.45, help="... and below this one send the frame to the cloud model.")
+    parser.add_argument("--audit-rate", type=float, default=0.05, help="Fraction of edge frames also sent to the cloud for auditing.")
+    parser.add_argument("--device-id", default=socket.gethostname(), help="Device name attached to edge reports.")
+    parser.add_argument("--output", default="", help="Also save each captured JPEG to this path (off by default).")
+    parser.add_argument("--count-only", action="store_true", help="Ask the server for the count only, without boxes.")
+    parser.add_argument("--stream", action="store_true", help="Stream frames over the /ws/predict WebSocket.")
+    parser.add_argument("--fps", type=float, default=DEFAULT_STREAM_FPS, help="Max frames/s sent in stream mode (0 = camera rate).")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY, help="JPEG quality of uploaded frames.")
+    parser.add_argument("--width", type=int, default=0, help="Requested camera frame width (0 = driver default).")
+    parser.add_argument("--height", type=int, default=0, help="Requested camera frame height (0 = driver default).")
+    parser.add_argument("--max-width", type=int, default=0, help="Downscale frames wider than this before encoding (0 = off).")
     args = parser.parse_args()
+    if args.stream and args.edge_model:
+        parser.error("--edge-model is not supported in --stream mode.")
 
-    api_url = normalize_predict_url(args.url)
-    print(f"Using endpoint: {api_url}")
-
-    while True:
-        image_path = capture_image(camera_index=args.camera, save_path=args.output)
-        if image_path is not None:
-            print(f"[{datetime.now().isoformat(timespec='seconds')}] Captured: {image_path}")
-            result = send_for_inference(image_path=image_path, api_url=api_url, conf=args.conf, timeout=args.timeout)
-            if result is not None:
-                count = result.get("count", 0)
-                print(f"Detected aphids: {count}")
-                print(json.dumps(result, indent=2, ensure_ascii=False))
+    try:
+        camera = CameraSession(args.camera, args.width, args.height)
+    except RuntimeError as exc:
+        print(f"Error: {exc}")
+        return
 
-        if args.interval <= 0:
-            break
-        time.sleep(args.interval)
+    try:
+        if args.stream:
+            ws_url = normalize_ws_url(args.url)
+            print(f"Streaming to: {ws_url}")
+            gate = ChangeGate(args.change_threshold, args.max_staleness)
+            stream_inference(
+                camera, ws_url, args.conf, args.fps, args.jpeg_quality, args.max_width, args.timeout, gate
+            )
+            return
+        run_periodic(camera, args)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        camera.close()
 
 
 if __name__ == "__main__":
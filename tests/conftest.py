@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+CONTEXT_DIR = REPO_DIR / ".container_yolo26"
+
+
+@pytest.fixture(scope="session")
+def checkpoint(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    # A randomly initialised YOLO26n built from its yaml: no download and no
+    # trained weights needed. TEST_MODEL_PATH points the tests at a real one.
+    if os.getenv("TEST_MODEL_PATH"):
+        return Path(os.environ["TEST_MODEL_PATH"])
+    ultralytics = pytest.importorskip("ultralytics")
+    path = tmp_path_factory.mktemp("model") / "best.pt"
+    ultralytics.YOLO("yolo26n.yaml").save(str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def server(checkpoint: Path):
+    # server.py reads its configuration from the environment at import time.
+    pytest.importorskip("fastapi")
+    os.environ["MODEL_PATH"] = str(checkpoint)
+    os.environ["MODEL_BACKEND"] = "torch"
+    if str(CONTEXT_DIR) not in sys.path:
+        sys.path.insert(0, str(CONTEXT_DIR))
+    return importlib.import_module("server")
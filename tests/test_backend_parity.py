@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from conftest import REPO_DIR
+
+sys.path.insert(0, str(REPO_DIR))
+from check_backend_parity import compare_backends, synthetic_frames  # noqa: E402
+
+IMGSZ = 320
+# Python modules each backend needs to export and to run.
+BACKEND_MODULES = {"onnx": ("onnx", "onnxruntime"), "openvino": ("openvino",)}
+
+
+@pytest.fixture(scope="module")
+def frames() -> list[tuple[str, object]]:
+    # Square, so the predictor's letterbox is a plain resize to IMGSZ, the same
+    # input the checkpoint below was calibrated on.
+    return [(f"synthetic_{i}", img) for i, img in enumerate(synthetic_frames(count=4, size=2 * IMGSZ))]
+
+
+@pytest.fixture(scope="module")
+def detector_checkpoint(tmp_path_factory: pytest.TempPathFactory, frames) -> Path:
+    # A freshly initialised YOLO26n detects nothing: its activations fade out
+    # through the untrained BatchNorm layers. BatchNorm statistics are taken
+    # from the frames, and the class-0 logits are rescaled so a few dozen
+    # boxes per frame land above conf=0.25, with input-dependent scores and
+    # boxes for the backends to agree on.
+    torch = pytest.importorskip("torch")
+    ultralytics = pytest.importorskip("ultralytics")
+
+    torch.manual_seed(0)
+    yolo = ultralytics.YOLO("yolo26n.yaml")
+    net = yolo.model
+    head = net.model[-1]
+    batch = np.stack([np.asarray(img.resize((IMGSZ, IMGSZ))) for _, img in frames])
+    batch = torch.from_numpy(batch).permute(0, 3, 1, 2).float() / 255.0
+
+    for module in net.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.momentum = 1.0
+    net.train()
+    with torch.no_grad():
+        net(batch)
+    net.eval()
+
+    stats = {}
+    hooks = [
+        branch[-1].register_forward_hook(
+            lambda _, __, out, level=level: stats.__setitem__(level, (out[:, 0].mean().item(), out[:, 0].std().item()))
+        )
+        for level, branch in enumerate(head.cv3)
+    ]
+    with torch.no_grad():
+        net(batch)
+    for hook in hooks:
+        hook.remove()
+    for branches in (head.cv3, head.one2one_cv3):
+        for level, branch in enumerate(branches):
+            conv = branch[-1]
+            mean, std = stats[level]
+            conv.weight.data[1:] = 0.0
+            conv.bias.data[1:] = -20.0
+            conv.weight.data[0] /= std
+            conv.bias.data[0] = (conv.bias.data[0] - mean) / std - 3.6
+
+    path = tmp_path_factory.mktemp("parity") / "best.pt"
+    yolo.save(str(path))
+    return path
+
+
+@pytest.mark.parametrize("backend", ["onnx", "openvino"])
+def test_exported_backend_matches_torch(server, detector_checkpoint: Path, frames, backend: str) -> None:
+    for module in BACKEND_MODULES[backend]:
+        pytest.importorskip(module)
+    rows = compare_backends(server, detector_checkpoint, frames, [backend], conf=0.25, imgsz=IMGSZ, box_tol=2.0)
+
+    assert len(rows) == len(frames)
+    assert all(row["torch_count"] > 0 for row in rows), "fixture model should detect something on every frame"
+    for row in rows:
+        assert row["count"] == row["torch_count"], row
+        assert row["box_delta"] <= 2.0, row
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+pytest.importorskip("azure.storage.blob")
+
+# Kept before any test patches asyncio.sleep to record backoff delays.
+_sleep = asyncio.sleep
+
+
+class FakeContainerClient:
+    # Async stand-in for the aio ContainerClient. The first `failures` uploads
+    # raise; `gate`, when set, holds every upload until it is opened.
+
+    def __init__(self, failures: int = 0, gate: asyncio.Event | None = None, latency_s: float = 0.0) -> None:
+        self.url = "http://fake-blob.invalid/aphid-images"
+        self.failures = failures
+        self.gate = gate
+        self.latency_s = latency_s
+        self.attempts: list[str] = []
+        self.blobs: dict[str, bytes] = {}
+
+    async def create_container(self) -> None:
+        return None
+
+    async def get_container_properties(self) -> dict[str, Any]:
+        return {}
+
+    async def upload_blob(self, name: str, data: bytes, **_: Any) -> None:
+        self.attempts.append(name)
+        if self.gate is not None:
+            await self.gate.wait()
+        await asyncio.sleep(self.latency_s)
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("upload failed")
+        self.blobs[name] = data
+
+
+class FakeBlobService:
+    def __init__(self, client: FakeContainerClient) -> None:
+        self.client = client
+        self.closed = False
+
+    def get_container_client(self, _: str) -> FakeContainerClient:
+        return self.client
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _persister(server: Any, **overrides: Any) -> Any:
+    options = {
+        "container": "aphid-images",
+        "queue_limit": 8,
+        "concurrency": 1,
+        "max_retries": 2,
+        "retry_base_s": 0.0,
+        "spill_dir": "",
+        "drain_timeout_s": 5.0,
+    }
+    options.update(overrides)
+    return server.BlobPersister(**options)
+
+
+async def _until(condition, timeout_s: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout_s
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await _sleep(0.01)
+
+
+def test_enqueue_uploads_in_background(server) -> None:
+    async def scenario() -> None:
+        client = FakeContainerClient()
+        service = FakeBlobService(client)
+        persister = _persister(server)
+        await persister.start(service)
+        assert persister.enabled
+        assert await persister.enqueue("a.jpg", b"a", "image/jpeg") == "queued"
+        assert await persister.enqueue("b.jpg", b"b", "") == "queued"
+        await _until(lambda: persister.uploaded == 2)
+        assert client.blobs == {"a.jpg": b"a", "b.jpg": b"b"}
+        assert persister.blob_url("a.jpg") == "http://fake-blob.invalid/aphid-images/a.jpg"
+        await persister.stop()
+        assert service.closed
+
+    asyncio.run(scenario())
+
+
+def test_start_without_service_disables_uploads(server) -> None:
+    async def scenario() -> None:
+        persister = _persister(server)
+        await persister.start(None)
+        assert not persister.enabled
+        await persister.stop()
+
+    asyncio.run(scenario())
+
+
+def test_failed_upload_retries_with_exponential_backoff(server, monkeypatch: pytest.MonkeyPatch) -> None:
+    delays: list[float] = []
+
+    async def recording_sleep(delay: float, *args: Any) -> Any:
+        if delay:
+            delays.append(delay)
+        return await _sleep(0, *args)
+
+    # Jitter factor 0.5 + 0.5 = 1, so the delays are exactly base * 2**attempt.
+    monkeypatch.setattr(server.random, "random", lambda: 0.5)
+    monkeypatch.setattr(server.asyncio, "sleep", recording_sleep)
+
+    async def scenario() -> None:
+        client = FakeContainerClient(failures=2)
+        persister = _persister(server, max_retries=3, retry_base_s=0.1)
+        await persister.start(FakeBlobService(client))
+        await persister.enqueue("a.jpg", b"a", "image/jpeg")
+        await _until(lambda: persister.uploaded == 1)
+        assert client.attempts == ["a.jpg"] * 3
+        assert persister.retried == 2
+        assert persister.failed == 0
+        assert persister.last_error == "upload failed"
+        await persister.stop()
+
+    asyncio.run(scenario())
+    assert delays == pytest.approx([0.1, 0.2])
+
+
+def test_upload_gives_up_after_max_retries(server) -> None:
+    async def scenario() -> None:
+        client = FakeContainerClient(failures=10)
+        persister = _persister(server, max_retries=2)
+        await persister.start(FakeBlobService(client))
+        await persister.enqueue("a.jpg", b"a", "image/jpeg")
+        await _until(lambda: persister.failed == 1)
+        assert len(client.attempts) == 3
+        assert persister.retried == 2
+        assert persister.uploaded == 0
+        await persister.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_drops_without_spill_dir(server) -> None:
+    async def scenario() -> None:
+        gate = asyncio.Event()
+        persister = _persister(server, queue_limit=1)
+        await persister.start(FakeBlobService(FakeContainerClient(gate=gate)))
+        assert await persister.enqueue("a.jpg", b"a", "image/jpeg") == "queued"
+        await _until(lambda: persister.queue_depth() == 0)  # taken by the upload task
+        assert await persister.enqueue("b.jpg", b"b", "image/jpeg") == "queued"
+        assert await persister.enqueue("c.jpg", b"c", "image/jpeg") == "dropped"
+        assert persister.dropped == 1
+        gate.set()
+        await persister.stop()
+        assert persister.uploaded == 2
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_spills_to_disk_and_requeues(server, tmp_path: Path) -> None:
+    spill_dir = tmp_path / "spill"
+
+    async def scenario() -> None:
+        gate = asyncio.Event()
+        client = FakeContainerClient(gate=gate)
+        persister = _persister(server, queue_limit=1, spill_dir=str(spill_dir))
+        await persister.start(FakeBlobService(client))
+        assert await persister.enqueue("a.jpg", b"a", "image/jpeg") == "queued"
+        await _until(lambda: persister.queue_depth() == 0)
+        assert await persister.enqueue("b.jpg", b"b", "image/jpeg") == "queued"
+        assert await persister.enqueue("c.jpg", b"c", "image/png") == "spilled"
+        assert (spill_dir / "c.jpg").read_bytes() == b"c"
+        assert (spill_dir / "c.jpg.json").exists()
+        assert persister.status()["spill_depth"] == 1
+
+        # Once the queue has room, the spill scan re-queues the entry and the
+        # upload removes it from disk.
+        gate.set()
+        await _until(lambda: persister.uploaded == 3)
+        assert client.blobs["c.jpg"] == b"c"
+        assert not any(spill_dir.iterdir())
+        await persister.stop()
+
+    asyncio.run(scenario())
+
+
+def test_spilled_entries_survive_a_restart(server, tmp_path: Path) -> None:
+    spill_dir = tmp_path / "spill"
+
+    async def scenario() -> None:
+        # A previous process spilled an image but never uploaded it.
+        first = _persister(server, spill_dir=str(spill_dir))
+        spill_dir.mkdir()
+        first._write_spill(server._BlobJob(blob_name="old.jpg", raw=b"old", content_type="image/jpeg"))
+
+        client = FakeContainerClient()
+        persister = _persister(server, spill_dir=str(spill_dir))
+        await persister.start(FakeBlobService(client))
+        await _until(lambda: persister.uploaded == 1)
+        assert client.blobs == {"old.jpg": b"old"}
+        assert not any(spill_dir.iterdir())
+        await persister.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stop_drains_the_queue_before_closing(server) -> None:
+    async def scenario() -> None:
+        client = FakeContainerClient(latency_s=0.02)
+        service = FakeBlobService(client)
+        persister = _persister(server, concurrency=2)
+        await persister.start(service)
+        for i in range(6):
+            await persister.enqueue(f"{i}.jpg", b"x", "image/jpeg")
+        await persister.stop()
+        assert persister.uploaded == 6
+        assert persister.queue_depth() == 0
+        assert service.closed
+        assert not persister.enabled
+
+    asyncio.run(scenario())
+
+
+def test_stop_spills_what_the_drain_timeout_leaves(server, tmp_path: Path) -> None:
+    spill_dir = tmp_path / "spill"
+
+    async def scenario() -> None:
+        gate = asyncio.Event()
+        persister = _persister(server, spill_dir=str(spill_dir), drain_timeout_s=0.05)
+        await persister.start(FakeBlobService(FakeContainerClient(gate=gate)))
+        for i in range(3):
+            await persister.enqueue(f"{i}.jpg", b"x", "image/jpeg")
+        await _until(lambda: persister.queue_depth() == 2)
+        await persister.stop()
+        # The in-flight upload is cancelled; the two still queued go to disk.
+        assert persister.spilled == 2
+        assert sorted(p.name for p in spill_dir.glob("*.json")) == ["1.jpg.json", "2.jpg.json"]
+
+    asyncio.run(scenario())